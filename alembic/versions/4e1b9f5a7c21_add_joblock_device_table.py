@@ -0,0 +1,38 @@
+"""add joblock_device table
+
+Revision ID: 4e1b9f5a7c21
+Revises: d93fd9fa6c88
+Create Date: 2026-10-18 10:12:31.402113
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4e1b9f5a7c21"
+down_revision = "d93fd9fa6c88"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "joblock_device",
+        sa.Column("hostname", sa.String(length=64), nullable=False),
+        sa.Column("job_id", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.DateTime(), nullable=True),
+        sa.Column("expires", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["job_id"],
+            ["job.id"],
+        ),
+        sa.PrimaryKeyConstraint("hostname"),
+    )
+    op.create_index(op.f("ix_joblock_device_job_id"), "joblock_device", ["job_id"], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_joblock_device_job_id"), table_name="joblock_device")
+    op.drop_table("joblock_device")
@@ -38,6 +38,7 @@ from cnaas_nms.api.plugins import api as plugins_api
 from cnaas_nms.api.repository import api as repository_api
 from cnaas_nms.api.settings import api as settings_api
 from cnaas_nms.api.system import api as system_api
+from cnaas_nms.api.websocket_events import EventFilter, batch_room, event_fanout
 from cnaas_nms.app_settings import api_settings, auth_settings
 from cnaas_nms.tools.log import get_logger
 from cnaas_nms.tools.security import get_oauth_token_info, oauth_required
@@ -215,7 +216,30 @@ def socketio_on_events(data):
     else:
         return False  # TODO: how to send error message to client?
 
-    join_room(room)
+    # Clients with options are handled by event_fanout instead of socketio rooms
+    if any(key in data for key in ["compact", "job_id", "hostname", "device_type", "last_id"]):
+        try:
+            event_filter = EventFilter.from_data(data)
+        except (TypeError, ValueError):
+            return False
+        event_fanout.subscribe(
+            request.sid,
+            room,
+            event_filter,
+            batch=bool(data.get("batch")),
+            compact=bool(data.get("compact")),
+            last_id=data.get("last_id"),
+        )
+    elif data.get("batch"):
+        join_room(batch_room(room))
+    else:
+        # Legacy rooms get one message per event, unbatched for compatibility
+        join_room(room)
+
+
+@socketio.on("disconnect")
+def socketio_on_disconnect():
+    event_fanout.unsubscribe(request.sid)
 
 
 # Log all requests, include username etc
@@ -1,11 +1,10 @@
 import datetime
 import json
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from flask import make_response, request
 from flask_restx import Namespace, Resource, fields, marshal
 from pydantic import ValidationError
-from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 
 import cnaas_nms.devicehandler.get
@@ -13,7 +12,7 @@ import cnaas_nms.devicehandler.init_device
 import cnaas_nms.devicehandler.sync_devices
 import cnaas_nms.devicehandler.underlay
 import cnaas_nms.devicehandler.update
-from cnaas_nms.api.generic import build_filter, empty_result, pagination_headers, parse_pydantic_error
+from cnaas_nms.api.generic import empty_result, parse_pydantic_error, query_page
 from cnaas_nms.api.models.stackmembers_model import StackmembersModel
 from cnaas_nms.app_settings import api_settings
 from cnaas_nms.db.device import Device, DeviceState, DeviceType
@@ -29,7 +28,7 @@ from cnaas_nms.db.settings import (
     update_device_primary_groups,
 )
 from cnaas_nms.db.stackmember import Stackmember
-from cnaas_nms.devicehandler.nornir_helper import cnaas_init, inventory_selector
+from cnaas_nms.devicehandler.nornir_helper import select_hostnames
 from cnaas_nms.devicehandler.sync_history import (
     NewSyncEventModel,
     SyncHistory,
@@ -126,6 +125,7 @@ device_syncto_model = device_syncto_api.model(
         "force": fields.Boolean(required=False),
         "auto_push": fields.Boolean(required=False),
         "resync": fields.Boolean(required=False),
+        "verify_cached": fields.Boolean(required=False),
         "confirm_mode": fields.Integer(required=False),
     },
 )
@@ -133,14 +133,20 @@ device_syncto_model = device_syncto_api.model(
 device_update_facts_model = device_syncto_api.model(
     "device_update_facts",
     {
-        "hostname": fields.String(required=True),
+        "hostname": fields.String(required=False),
+        "hostnames": fields.List(fields.String, required=False),
+        "device_type": fields.String(required=False),
+        "group": fields.String(required=False),
     },
 )
 
 device_update_interfaces_model = device_syncto_api.model(
     "device_update_interfaces",
     {
-        "hostname": fields.String(required=True),
+        "hostname": fields.String(required=False),
+        "hostnames": fields.List(fields.String, required=False),
+        "device_type": fields.String(required=False),
+        "group": fields.String(required=False),
         "replace": fields.Boolean(required=False),
         "delete_all": fields.Boolean(required=False),
     },
@@ -390,22 +396,16 @@ class DevicesApi(Resource):
     def get(self):
         """Get all devices"""
         logger.info("started get devices")
-        device_list: List[Device] = []
-        total_count = 0
         with sqla_session() as session:
-            query = session.query(Device, func.count(Device.id).over().label("total"))
             try:
-                query = build_filter(Device, query)
+                device_list, headers = query_page(session, Device)
             except Exception as e:
                 return empty_result(status="error", data="Unable to filter devices: {}".format(e)), 400
-            for instance in query:
-                device_list.append(instance.Device)
-                total_count = instance.total
             data = {"devices": device_data_postprocess(device_list)}
 
         resp = make_response(json.dumps(empty_result(status="success", data=data)), 200)
         resp.headers["Content-Type"] = "application/json"
-        resp.headers = {**resp.headers, **pagination_headers(total_count)}
+        resp.headers = {**resp.headers, **headers}
         return resp
 
 
@@ -666,6 +666,8 @@ class DeviceSyncApi(Resource):
             kwargs["auto_push"] = json_data["auto_push"]
         if "resync" in json_data and isinstance(json_data["resync"], bool):
             kwargs["resync"] = json_data["resync"]
+        if "verify_cached" in json_data and isinstance(json_data["verify_cached"], bool):
+            kwargs["verify_cached"] = json_data["verify_cached"]
         if "comment" in json_data and isinstance(json_data["comment"], str):
             kwargs["job_comment"] = json_data["comment"]
         if "ticket_ref" in json_data and isinstance(json_data["ticket_ref"], str):
@@ -682,13 +684,12 @@ class DeviceSyncApi(Resource):
                 )
 
         total_count: Optional[int] = None
-        nr = cnaas_init()
 
         if "hostname" in json_data:
             hostname = str(json_data["hostname"])
             if not Device.valid_hostname(hostname):
                 return empty_result(status="error", data=f"Hostname '{hostname}' is not a valid hostname"), 400
-            _, total_count, _ = inventory_selector(nr, hostname=hostname)
+            total_count = len(select_hostnames(hostname=hostname).hostnames)
             if total_count != 1:
                 return (
                     empty_result(status="error", data=f"Hostname '{hostname}' not found or is not a managed device"),
@@ -706,17 +707,17 @@ class DeviceSyncApi(Resource):
                     400,
                 )
             what = f"{json_data['device_type']} devices"
-            _, total_count, _ = inventory_selector(nr, resync=kwargs["resync"], device_type=devtype_str)
+            total_count = len(select_hostnames(resync=kwargs["resync"], device_type=devtype_str).hostnames)
         elif "group" in json_data:
             group_name = str(json_data["group"])
             if group_name not in get_groups():
                 return empty_result(status="error", data="Could not find a group with name {}".format(group_name))
             kwargs["group"] = group_name
             what = "group {}".format(group_name)
-            _, total_count, _ = inventory_selector(nr, resync=kwargs["resync"], group=group_name)
+            total_count = len(select_hostnames(resync=kwargs["resync"], group=group_name).hostnames)
         elif "all" in json_data and isinstance(json_data["all"], bool) and json_data["all"]:
             what = "all devices"
-            _, total_count, _ = inventory_selector(nr, resync=kwargs["resync"])
+            total_count = len(select_hostnames(resync=kwargs["resync"]).hostnames)
         else:
             return empty_result(status="error", data="No devices to synchronize were specified"), 400
         scheduler = Scheduler()
@@ -734,6 +735,44 @@ class DeviceSyncApi(Resource):
         return resp
 
 
+def parse_update_selection(json_data: dict) -> Tuple[dict, str, int]:
+    """Parse selection of many devices for update jobs: list of hostnames, device_type or group.
+
+    Returns:
+        Job kwargs for the selection, description of selected devices and number of selected devices
+
+    Raises:
+        ValueError
+    """
+    if "hostnames" in json_data:
+        if not isinstance(json_data["hostnames"], list) or not json_data["hostnames"]:
+            raise ValueError("hostnames must be a list of hostnames")
+        hostnames = [str(hostname) for hostname in json_data["hostnames"]]
+        for hostname in hostnames:
+            if not Device.valid_hostname(hostname):
+                raise ValueError(f"Hostname '{hostname}' is not a valid hostname")
+        return (
+            {"hostname": hostnames},
+            "{} devices".format(len(hostnames)),
+            len(select_hostnames(hostname=hostnames).hostnames),
+        )
+    elif "device_type" in json_data:
+        devtype_str = str(json_data["device_type"]).upper()
+        if not DeviceType.has_name(devtype_str):
+            raise ValueError(f"Invalid device type '{json_data['device_type']}' specified")
+        return (
+            {"device_type": devtype_str},
+            f"{json_data['device_type']} devices",
+            len(select_hostnames(device_type=devtype_str).hostnames),
+        )
+    elif "group" in json_data:
+        group_name = str(json_data["group"])
+        if group_name not in get_groups():
+            raise ValueError("Could not find a group with name {}".format(group_name))
+        return {"group": group_name}, "group {}".format(group_name), len(select_hostnames(group=group_name).hostnames)
+    raise ValueError("No target to be updated was specified")
+
+
 class DeviceUpdateFactsApi(Resource):
     @login_required
     @device_update_facts_api.expect(device_update_facts_model)
@@ -756,16 +795,21 @@ class DeviceUpdateFactsApi(Resource):
                         400,
                     )
             kwargs["hostname"] = hostname
+            what = hostname
             total_count = 1
         else:
-            return empty_result(status="error", data="No target to be updated was specified"), 400
+            try:
+                selection, what, total_count = parse_update_selection(json_data)
+            except ValueError as e:
+                return empty_result(status="error", data=str(e)), 400
+            kwargs.update(selection)
 
         scheduler = Scheduler()
         job_id = scheduler.add_onetime_job(
             "cnaas_nms.devicehandler.update:update_facts", when=1, scheduled_by=get_identity(), kwargs=kwargs
         )
 
-        res = empty_result(data=f"Scheduled job to update facts for {hostname}")
+        res = empty_result(data=f"Scheduled job to update facts for {what}")
         res["job_id"] = job_id
 
         resp = make_response(json.dumps(res), 200)
@@ -804,9 +848,21 @@ class DeviceUpdateInterfacesApi(Resource):
                         400,
                     )
             kwargs["hostname"] = hostname
+            what = hostname
             total_count = 1
         else:
-            return empty_result(status="error", data="No target to be updated was specified"), 400
+            try:
+                selection, what, total_count = parse_update_selection(json_data)
+            except ValueError as e:
+                return empty_result(status="error", data=str(e)), 400
+            if "mlag_peer_hostname" in json_data or json_data.get("delete_all"):
+                return (
+                    empty_result(
+                        status="error", data="mlag_peer_hostname and delete_all can only be used with a single hostname"
+                    ),
+                    400,
+                )
+            kwargs.update(selection)
 
         if "mlag_peer_hostname" in json_data:
             mlag_peer_hostname = str(json_data["mlag_peer_hostname"])
@@ -844,7 +900,7 @@ class DeviceUpdateInterfacesApi(Resource):
             "cnaas_nms.devicehandler.update:update_interfacedb", when=1, scheduled_by=get_identity(), kwargs=kwargs
         )
 
-        res = empty_result(data=f"Scheduled job to update interfaces for {hostname}")
+        res = empty_result(data=f"Scheduled job to update interfaces for {what}")
         res["job_id"] = job_id
 
         resp = make_response(json.dumps(res), 200)
@@ -1074,13 +1130,12 @@ class DeviceCertApi(Resource):
             kwargs["job_ticket_ref"] = json_data["ticket_ref"]
 
         total_count: Optional[int] = None
-        nr = cnaas_init()
 
         if "hostname" in json_data:
             hostname = str(json_data["hostname"])
             if not Device.valid_hostname(hostname):
                 return empty_result(status="error", data=f"Hostname '{hostname}' is not a valid hostname"), 400
-            _, total_count, _ = inventory_selector(nr, hostname=hostname)
+            total_count = len(select_hostnames(hostname=hostname).hostnames)
             if total_count != 1:
                 return (
                     empty_result(status="error", data=f"Hostname '{hostname}' not found or is not a managed device"),
@@ -1092,7 +1147,7 @@ class DeviceCertApi(Resource):
             if group_name not in get_groups():
                 return empty_result(status="error", data="Could not find a group with name {}".format(group_name))
             kwargs["group"] = group_name
-            _, total_count, _ = inventory_selector(nr, group=group_name)
+            total_count = len(select_hostnames(group=group_name).hostnames)
         else:
             return empty_result(status="error", data="No devices were specified"), 400
 
@@ -10,7 +10,7 @@ from cnaas_nms.api.generic import empty_result
 from cnaas_nms.app_settings import api_settings
 from cnaas_nms.db.device import Device
 from cnaas_nms.db.settings import get_groups
-from cnaas_nms.devicehandler.nornir_helper import cnaas_init, inventory_selector
+from cnaas_nms.devicehandler.nornir_helper import select_hostnames
 from cnaas_nms.scheduler.scheduler import Scheduler
 from cnaas_nms.scheduler.wrapper import job_wrapper
 from cnaas_nms.tools.log import get_logger
@@ -231,13 +231,12 @@ class FirmwareUpgradeApi(Resource):
                 return empty_result(status="error", data="filename should be a string")
 
         total_count: Optional[int] = None
-        nr = cnaas_init()
 
         if "hostname" in json_data:
             hostname = str(json_data["hostname"])
             if not Device.valid_hostname(hostname):
                 return empty_result(status="error", data=f"Hostname '{hostname}' is not a valid hostname"), 400
-            _, total_count, _ = inventory_selector(nr, hostname=hostname)
+            total_count = len(select_hostnames(hostname=hostname).hostnames)
             if total_count != 1:
                 return (
                     empty_result(status="error", data=f"Hostname '{hostname}' not found or is not a managed device"),
@@ -249,7 +248,7 @@ class FirmwareUpgradeApi(Resource):
             if group_name not in get_groups():
                 return empty_result(status="error", data="Could not find a group with name {}".format(group_name))
             kwargs["group"] = group_name
-            _, total_count, _ = inventory_selector(nr, group=group_name)
+            total_count = len(select_hostnames(group=group_name).hostnames)
             kwargs["group"] = group_name
         else:
             return empty_result(status="error", data="No devices to upgrade were specified"), 400
@@ -1,16 +1,18 @@
 import math
 import re
 import urllib
-from typing import List
+from typing import Callable, List, Optional, Tuple
 
 import sqlalchemy
 from flask import request
+from sqlalchemy import func, text
 
 from cnaas_nms.db.settings import get_pydantic_error_value, get_pydantic_field_descr
 
 FILTER_RE = re.compile(r"^filter\[([a-zA-Z0-9_.]+)\](\[[a-z]+\])?$")
 DEFAULT_PER_PAGE = 50
 MAX_PER_PAGE = 1000
+COUNT_MODES = ["exact", "estimate", "none"]
 
 
 def limit_results() -> int:
@@ -55,15 +57,79 @@ def offset_results() -> int:
     return offset
 
 
-def pagination_headers(total_count) -> dict:
+def after_results() -> Optional[int]:
+    """Find id to continue listing results after, for keyset pagination."""
+    args = request.args
+    if "after" not in args:
+        return None
+    try:
+        return int(args["after"])
+    except ValueError:
+        raise ValueError("after argument must be an integer id")
+
+
+def count_mode() -> str:
+    """Find how total count of results should be calculated: exact, estimate or none."""
+    mode = request.args.get("count", "exact")
+    if mode not in COUNT_MODES:
+        raise ValueError("count argument must be one of: {}".format(", ".join(COUNT_MODES)))
+    return mode
+
+
+def id_sort_order(f_class) -> Optional[Callable]:
+    """Return sqlalchemy asc or desc if results are sorted by id, or None if
+    sorted by another column."""
+    sort_arg = request.args.get("sort")
+    if not isinstance(sort_arg, str):
+        return sqlalchemy.asc
+    order_by_field = sort_arg.lower()
+    order = sqlalchemy.asc
+    if order_by_field.startswith("-"):
+        order_by_field = order_by_field.lstrip("-")
+        order = sqlalchemy.desc
+    if order_by_field == "id":
+        return order
+    elif order_by_field in f_class.__table__._columns.keys():
+        return None
+    # Unknown sort fields are ignored and results are sorted by id
+    return sqlalchemy.asc
+
+
+def estimated_count(session, f_class) -> int:
+    """Return estimated number of rows in table of f_class, from postgres statistics."""
+    count = session.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"), {"table": f_class.__tablename__}
+    ).scalar()
+    return max(int(count or 0), 0)
+
+
+def pagination_headers(total_count: Optional[int], next_after: Optional[int] = None) -> dict:
+    """Return headers with total count and links to next (and last) page.
+
+    Args:
+        total_count: Total number of results, or None if not counted
+        next_after: id of last result on this page if there might be more
+            results, used for keyset pagination links
+    """
     per_page = DEFAULT_PER_PAGE
     page_arg = 1
     links = []
-    headers = {
-        "X-Total-Count": total_count,
-    }
+    headers = {}
+    if total_count is not None:
+        headers["X-Total-Count"] = total_count
 
     args = request.args
+    if "after" in args or total_count is None:
+        if next_after is not None:
+            query = {k: v for k, v in args.items() if k != "page"}
+            links.append(
+                '<{}>; rel="next"'.format(
+                    request.base_url + "?" + urllib.parse.urlencode({**query, "after": next_after})
+                )
+            )
+            headers["Link"] = ",".join(links)
+        return headers
+
     if "per_page" in args:
         try:
             per_page_arg = int(args["per_page"])
@@ -98,9 +164,10 @@ def pagination_headers(total_count) -> dict:
     return headers
 
 
-def build_filter(f_class, query: sqlalchemy.orm.query.Query):
+def build_filter(f_class, query: sqlalchemy.orm.query.Query, paginate: bool = True):
     """Generate SQLalchemy filter based on query string and return
-    filtered query.
+    filtered query. If paginate is False, sorting, limit, offset and
+    the after cursor are not applied.
     Raises:
         ValueError
     """
@@ -151,6 +218,9 @@ def build_filter(f_class, query: sqlalchemy.orm.query.Query):
 
         query = query.filter(f_class_op(value))
 
+    if not paginate:
+        return query
+    after = after_results()
     if f_class_order_by_field:
         query = query.order_by(order(f_class_order_by_field))
     else:
@@ -158,11 +228,64 @@ def build_filter(f_class, query: sqlalchemy.orm.query.Query):
             order = sqlalchemy.asc
             f_class_order_by_field = getattr(f_class, "id")
             query = query.order_by(order(f_class_order_by_field))
+    if after is not None:
+        # Keyset pagination, continue after given id instead of skipping rows with offset
+        id_order = id_sort_order(f_class)
+        if id_order is None or "id" not in f_class.__table__._columns.keys():
+            raise ValueError("after argument can only be used when sorting by id")
+        if id_order is sqlalchemy.desc:
+            query = query.filter(f_class.id < after)
+        else:
+            query = query.filter(f_class.id > after)
+        return query.limit(limit_results())
     query = query.limit(limit_results())
     query = query.offset(offset_results())
     return query
 
 
+def query_page(session, f_class) -> Tuple[list, dict]:
+    """Get one page of filtered results for a list API.
+
+    The total count of results is calculated according to the count
+    argument: exact (default), estimate (from table statistics, unfiltered)
+    or none. The exact count is the number of results matching the filters,
+    also when continuing after an id.
+
+    Returns:
+        List of f_class instances and dict of pagination headers
+    Raises:
+        ValueError
+    """
+    mode = count_mode()
+    # With after, a window count would only count rows after the cursor
+    window_count = mode == "exact" and after_results() is None
+    if window_count:
+        query = session.query(f_class, func.count(f_class.id).over().label("total"))
+    else:
+        query = session.query(f_class)
+    rows = build_filter(f_class, query).all()
+    if window_count:
+        instances = [row[0] for row in rows]
+        total_count = rows[0].total if rows else 0
+    else:
+        instances = rows
+        if mode == "exact":
+            # Count all rows matching the filters, not only those after the cursor
+            total_count = build_filter(f_class, session.query(func.count(f_class.id)), paginate=False).scalar()
+        elif mode == "estimate":
+            total_count = estimated_count(session, f_class)
+        else:
+            total_count = None
+
+    next_after = None
+    if instances and len(instances) == limit_results() and id_sort_order(f_class) is not None:
+        next_after = instances[-1].id
+    headers = pagination_headers(total_count, next_after)
+    if mode == "estimate":
+        headers["X-Total-Count-Estimated"] = "true"
+    return instances, headers
+
+
 def empty_result(status="success", data=None):
     if status == "success":
         return {"status": status, "data": data}
@@ -6,7 +6,7 @@ from flask_restx import Namespace, Resource
 from cnaas_nms.api.generic import empty_result
 from cnaas_nms.db.device import Device, DeviceState
 from cnaas_nms.db.session import sqla_session
-from cnaas_nms.db.settings import get_group_regex, get_group_settings, get_groups
+from cnaas_nms.db.settings import get_group_index, get_group_regex, get_group_settings, get_groups
 from cnaas_nms.tools.security import login_required
 from cnaas_nms.version import __api_version__
 
@@ -14,18 +14,12 @@ api = Namespace("groups", description="API for handling groups", prefix="/api/{}
 
 
 def groups_populate(group_name: Optional[str] = None) -> dict:
+    group_index = get_group_index(with_devices=True)
     if group_name:
-        tmpgroups: dict = {group_name: []}
+        group_names = [group_name]
     else:
-        tmpgroups: dict = {key: [] for key in get_groups()}
-    with sqla_session() as session:
-        devices: List[Device] = session.query(Device).all()
-        for dev in devices:
-            groups = get_groups(dev.hostname)
-            for group in groups:
-                if group in tmpgroups:
-                    tmpgroups[group].append(dev.hostname)
-    return tmpgroups
+        group_names = group_index.group_names
+    return {name: sorted(group_index.get_hostnames(name)) for name in group_names}
 
 
 def groups_settings_populate(group_name: Optional[str] = None) -> dict:
@@ -1,14 +1,16 @@
 import json
 import time
+from typing import Optional
 
 from flask import make_response, request
 from flask_restx import Namespace, Resource, fields
-from sqlalchemy import func
 
-from cnaas_nms.api.generic import build_filter, empty_result, pagination_headers
+from cnaas_nms.api.generic import empty_result, query_page
 from cnaas_nms.db.job import Job, JobStatus
-from cnaas_nms.db.joblock import Joblock
+from cnaas_nms.db.joblock import Joblock, JoblockDevice
 from cnaas_nms.db.session import sqla_session
+from cnaas_nms.scheduler.job_queue import get_queue_state
+from cnaas_nms.scheduler.progress import get_finished_devices, get_progress
 from cnaas_nms.scheduler.scheduler import Scheduler
 from cnaas_nms.tools.log import get_logger
 from cnaas_nms.tools.security import get_identity, login_required
@@ -20,7 +22,10 @@ jobs_api = Namespace("jobs", description="API for handling jobs", prefix="/api/{
 
 joblock_api = Namespace("joblocks", description="API for handling jobs", prefix="/api/{}".format(__api_version__))
 
-job_model = job_api.model("jobs", {"name": fields.String(required=True)})
+# Maximum number of seconds to wait for a job to finish in long poll requests
+JOB_WAIT_MAX = 300
+
+job_model = job_api.model("jobs", {"name": fields.String(required=False), "job_id": fields.Integer(required=False)})
 
 
 def filter_job_dict(job_dict: dict, args: dict) -> dict:
@@ -57,28 +62,56 @@ def filter_job_dict(job_dict: dict, args: dict) -> dict:
     return job_dict
 
 
+def add_job_progress(job_dict: dict) -> dict:
+    """Add live progress and finished devices from redis to running jobs."""
+    if job_dict.get("status") != JobStatus.RUNNING.name or "id" not in job_dict:
+        return job_dict
+    progress = get_progress(job_dict["id"])
+    if progress:
+        job_dict["progress"] = progress
+        job_dict["finished_devices"] = get_finished_devices(job_dict["id"])
+    return job_dict
+
+
+def add_job_queue_info(job_dict: dict, queue_state: Optional[dict]) -> dict:
+    """Add priority, position and wait time to scheduled jobs that are waiting in the job queue."""
+    if not queue_state or job_dict.get("status") != JobStatus.SCHEDULED.name:
+        return job_dict
+    position = {}
+    for queued_job in queue_state["queued_jobs"]:
+        position[queued_job["priority"]] = position.get(queued_job["priority"], 0) + 1
+        if queued_job["job_id"] == job_dict.get("id"):
+            job_dict["queue"] = {
+                "priority": queued_job["priority"],
+                "position": position[queued_job["priority"]],
+                "wait_time": queued_job["wait_time"],
+            }
+            break
+    return job_dict
+
+
 class JobsApi(Resource):
     @login_required
     def get(self):
         """Get one or more jobs"""
         data = {"jobs": []}
-        total_count = 0
         args = request.args
         with sqla_session() as session:
-            query = session.query(Job, func.count(Job.id).over().label("total"))
             try:
-                query = build_filter(Job, query)
+                jobs, headers = query_page(session, Job)
             except Exception as e:
                 return empty_result(status="error", data="Unable to filter jobs: {}".format(e)), 400
-            for instance in query:
-                job_dict = instance.Job.as_dict()
+            queue_state = None
+            if any(job.status == JobStatus.SCHEDULED for job in jobs):
+                queue_state = get_queue_state()
+            for job in jobs:
+                job_dict = add_job_queue_info(add_job_progress(job.as_dict()), queue_state)
                 filtered_job_dict = filter_job_dict(job_dict, args)
                 data["jobs"].append(filtered_job_dict)
-                total_count = instance.total
 
         resp = make_response(json.dumps(empty_result(status="success", data=data)), 200)
         resp.headers["Content-Type"] = "application/json"
-        resp.headers = {**resp.headers, **pagination_headers(total_count)}
+        resp.headers = {**resp.headers, **headers}
         return resp
 
 
@@ -87,10 +120,23 @@ class JobByIdApi(Resource):
     def get(self, job_id):
         """Get job information by ID"""
         args = request.args
+        try:
+            wait = min(max(int(args.get("wait", 0)), 0), JOB_WAIT_MAX)
+        except ValueError:
+            return empty_result(status="error", data="wait must be an integer number of seconds"), 400
+        if wait:
+            # Long poll, return when job has finished or wait seconds has passed. Job status
+            # is checked in short sessions, so no database connection is held while waiting.
+            try:
+                Job.wait_for_job_completion(None, job_id, timeout=wait)
+            except TimeoutError:
+                pass
         with sqla_session() as session:
             job = session.query(Job).filter(Job.id == job_id).one_or_none()
             if job:
-                job_dict = job.as_dict()
+                job_dict = add_job_progress(job.as_dict())
+                if job.status == JobStatus.SCHEDULED:
+                    job_dict = add_job_queue_info(job_dict, get_queue_state())
                 filtered_job_dict = filter_job_dict(job_dict, args)
                 return empty_result(data={"jobs": [filtered_job_dict]})
             else:
@@ -143,21 +189,42 @@ class JobByIdApi(Resource):
             return empty_result(status="error", data="Unknown action: {}".format(action)), 400
 
 
+class JobQueueApi(Resource):
+    @login_required
+    def get(self):
+        """Get depth of job queues and jobs waiting to start"""
+        queue_state = get_queue_state()
+        if queue_state is None:
+            return empty_result(status="error", data="No job queue state found"), 404
+        return empty_result(data={"queue": queue_state})
+
+
 class JobLockApi(Resource):
     @login_required
     def get(self):
         """Get job locks"""
         locks = []
+        device_locks = []
         with sqla_session() as session:
             for lock in session.query(Joblock).all():
                 locks.append(lock.as_dict())
-        return empty_result("success", data={"locks": locks})
+            for device_lock in session.query(JoblockDevice).order_by(JoblockDevice.hostname):
+                device_locks.append(device_lock.as_dict())
+        return empty_result("success", data={"locks": locks, "device_locks": device_locks})
 
     @login_required
     @job_api.expect(job_model)
     def delete(self):
         """Remove job locks"""
         json_data = request.get_json()
+        if "job_id" in json_data:
+            if not isinstance(json_data["job_id"], int):
+                return empty_result("error", "job_id must be an integer"), 400
+            with sqla_session() as session:
+                released = JoblockDevice.release_locks(session, job_id=json_data["job_id"])
+            if not released:
+                return empty_result("error", "No device locks found for job"), 404
+            return empty_result("success", data={"job_id": json_data["job_id"], "device_locks_released": released})
         if "name" not in json_data or not json_data["name"]:
             return empty_result("error", "No lock name specified"), 400
 
@@ -172,5 +239,6 @@ class JobLockApi(Resource):
 
 
 jobs_api.add_resource(JobsApi, "")
+jobs_api.add_resource(JobQueueApi, "/queue")
 job_api.add_resource(JobByIdApi, "/<int:job_id>")
 joblock_api.add_resource(JobLockApi, "")
@@ -8,6 +8,7 @@ import pytest
 import yaml
 
 import cnaas_nms.api.app
+from cnaas_nms.api.groups import groups_settings_populate
 from cnaas_nms.api.tests.app_wrapper import TestAppWrapper
 from cnaas_nms.app_settings import app_settings
 
@@ -41,6 +42,24 @@ def test_get_last_job(client):
     assert len(result.json["data"]["jobs"]) == 1
 
 
+def test_get_jobs_after(client):
+    result = client.get("/api/v1.0/jobs?sort=-id&per_page=1&count=none")
+    assert result.status_code == 200
+    assert "X-Total-Count" not in result.headers
+    last_id = result.json["data"]["jobs"][0]["id"]
+    assert "after={}".format(last_id) in result.headers["Link"]
+
+    result = client.get("/api/v1.0/jobs?sort=-id&per_page=1&after={}".format(last_id))
+    assert result.status_code == 200
+    assert all(job["id"] < last_id for job in result.json["data"]["jobs"])
+    # Total count is the same with and without after
+    total_count = client.get("/api/v1.0/jobs?per_page=1").headers["X-Total-Count"]
+    assert result.headers["X-Total-Count"] == total_count
+
+    result = client.get("/api/v1.0/jobs?sort=status&after={}".format(last_id))
+    assert result.status_code == 400
+
+
 def test_filter_job(client):
     result = client.get("/api/v1.0/jobs?filter[function.name][contains]=sync&filter_jobresult=config")
     print(result.json)
@@ -347,6 +366,19 @@ def test_get_groups(client, testdata):
     assert len(result.json["data"]["groups"][groupname]) >= 1, f"No devices found in group '{groupname}'"
 
 
+def test_groups_settings_populate_twice(client):
+    # Returned group settings are modified, which must not affect cached settings
+    first = groups_settings_populate()
+    second = groups_settings_populate()
+    assert first, "No group settings found"
+    assert first == second
+    groupname = next(iter(first))
+    assert groups_settings_populate(groupname) == {groupname: first[groupname]}
+    result = client.get("/api/v1.0/groups")
+    assert result.status_code == 200
+    assert result.json["data"]["group_settings"] == first
+
+
 def test_get_groups_osversion(client, testdata):
     groupname = testdata["groupname"]
     result = client.get(f"/api/v1.0/groups/{groupname}/os_version")
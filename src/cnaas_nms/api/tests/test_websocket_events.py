@@ -0,0 +1,101 @@
+import json
+import unittest
+
+import pytest
+
+from cnaas_nms.api.websocket_events import EventFanout, EventFilter, batch_room, event_rooms, parse_event
+from cnaas_nms.db.session import redis_session
+from cnaas_nms.tools.event import add_event
+
+
+class RecordingSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data, room=None, to=None, callback=None):
+        self.emitted.append((event, data, room or to, callback))
+
+
+class WebsocketEventsTests(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def requirements(self, redis):
+        """Ensures the required pytest fixtures are loaded implicitly for all these tests"""
+        pass
+
+    def test_event_rooms(self):
+        self.assertEqual(event_rooms({"type": "log", "level": "INFO"}), ["DEBUG", "INFO"])
+        self.assertEqual(event_rooms({"type": "update", "update_type": "job"}), ["update_job"])
+        self.assertEqual(event_rooms({"type": "log", "level": "UNKNOWN"}), [])
+
+    @pytest.mark.integration
+    def test_batch_and_resume(self):
+        fanout = EventFanout()
+        socketio = RecordingSocketIO()
+        with redis_session() as redis:
+            fanout.read(redis)
+            add_event("test message 1", level="INFO")
+            add_event("test message 2", level="DEBUG")
+            fanout.subscribe("sid1", "INFO")
+            fanout.emit_clients(socketio, redis, fanout.read(redis))
+            batches = [data for event, data, to, _ in socketio.emitted if event == "events_batch"]
+            self.assertEqual(len(batches), 1)
+            self.assertEqual([e["message"] for e in batches[0]["events"]], ["test message 1"])
+            self.assertEqual(fanout.get_lag(), {"sid1": 1})
+
+            # Reconnecting client gets events after the last id it has seen
+            fanout.unsubscribe("sid1")
+            fanout.subscribe("sid2", "DEBUG", last_id=batches[0]["events"][0]["id"])
+            socketio.emitted.clear()
+            fanout.emit_clients(socketio, redis, fanout.read(redis))
+            self.assertEqual([e["message"] for e in socketio.emitted[0][1]["events"]], ["test message 2"])
+
+    @pytest.mark.integration
+    def test_filter_and_compact(self):
+        fanout = EventFanout()
+        socketio = RecordingSocketIO()
+        with redis_session() as redis:
+            fanout.read(redis)
+            for hostname in ["eosaccess", "eosdist1"]:
+                update_data = {
+                    "action": "UPDATED",
+                    "hostname": hostname,
+                    "object": {"hostname": hostname, "device_type": "ACCESS", "synchronized": False},
+                    "changed": {"synchronized": False},
+                }
+                add_event(json_data=json.dumps(update_data), event_type="update", update_type="device")
+            add_event(json_data=json.dumps({"job_id": 1, "status": "RUNNING"}), event_type="update", update_type="job")
+            fanout.subscribe("sid1", "update_device", EventFilter.from_data({"hostname": "eosaccess"}), compact=True)
+            fanout.subscribe("sid1", "update_job", EventFilter.from_data({"job_id": [1, 2]}), compact=True)
+            fanout.emit_clients(socketio, redis, fanout.read(redis))
+        events = socketio.emitted[0][1]["events"]
+        self.assertEqual(len(events), 2)
+        self.assertEqual(
+            events[0]["json"], {"action": "UPDATED", "hostname": "eosaccess", "changed": {"synchronized": False}}
+        )
+        self.assertEqual(events[1]["json"]["job_id"], 1)
+
+
+class EmitRoomsTests(unittest.TestCase):
+    def test_emit_rooms(self):
+        socketio = RecordingSocketIO()
+        events = [
+            parse_event("1-0", {"type": "log", "level": "INFO", "message": "test message 1"}),
+            parse_event("2-0", {"type": "log", "level": "DEBUG", "message": "test message 2"}),
+        ]
+        EventFanout().emit_rooms(socketio, events)
+        # Legacy rooms get one message per event and room
+        self.assertEqual(
+            [(room, data) for event, data, room, _ in socketio.emitted if event == "events"],
+            [("DEBUG", "test message 1"), ("INFO", "test message 1"), ("DEBUG", "test message 2")],
+        )
+        # Batch rooms get one message per room
+        batches = {room: data for event, data, room, _ in socketio.emitted if event == "events_batch"}
+        self.assertEqual(set(batches.keys()), {batch_room("DEBUG"), batch_room("INFO")})
+        self.assertEqual(
+            [e["message"] for e in batches[batch_room("DEBUG")]["events"]], ["test message 1", "test message 2"]
+        )
+        self.assertEqual(batches[batch_room("DEBUG")]["last_id"], "2-0")
+
+
+if __name__ == "__main__":
+    unittest.main()
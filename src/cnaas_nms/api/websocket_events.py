@@ -0,0 +1,340 @@
+"""Fan out events from the redis events stream to websocket clients.
+
+Clients that join a room without options get one "events" message per event,
+emitted to the room. These legacy rooms are left unbatched for compatibility
+with existing clients. Clients that join with only batch enabled are put in a
+batch room instead, that gets all events for the room from one read of the
+stream in a single "events_batch" message, with one emit per room.
+
+Clients that subscribe with batch enabled and a last_id get their own
+"events_batch" messages, and can resume from the last event id they have
+seen after a reconnect. These batch messages should be acknowledged by the
+client; a client with too many unacknowledged events is skipped until it
+catches up, and then gets the events it missed from the stream.
+
+Subscriptions can also have filters on job_id, hostname or device_type, and
+ask for compact device updates that only contain changed attributes. Events
+are then filtered and sent per client instead of per room.
+"""
+
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from redis import StrictRedis
+
+from cnaas_nms.tools.log import get_logger
+
+EVENTS_STREAM = "events"
+# Maximum number of events to read from the stream at a time
+READ_COUNT = 500
+READ_BLOCK_MS = 200
+# Stop sending to batch clients that have this many unacknowledged events
+MAX_UNACKED_EVENTS = 2000
+LOGLEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+StreamEntry = Tuple[str, dict]
+
+
+def valid_event_id(event_id) -> bool:
+    return isinstance(event_id, str) and re.match(r"^[0-9]+-[0-9]+$", event_id) is not None
+
+
+def batch_room(room: str) -> str:
+    """Return name of the socketio room that gets batched events for room."""
+    return "batch_{}".format(room)
+
+
+def event_rooms(event: dict) -> List[str]:
+    """Return names of rooms that should get an event."""
+    if event.get("type") == "log":
+        # Rooms for lower log levels get messages of all higher levels
+        if event.get("level") not in LOGLEVELS:
+            return []
+        return LOGLEVELS[: LOGLEVELS.index(event["level"]) + 1]
+    elif event.get("type") == "update":
+        return ["update_{}".format(event.get("update_type"))]
+    elif event.get("type") == "sync":
+        return ["sync"]
+    return []
+
+
+class ParsedEvent(NamedTuple):
+    event_id: str
+    event: dict
+    rooms: List[str]
+    data: Any  # log message or decoded json data
+    attributes: dict  # values that subscriptions can filter on
+
+
+def event_attributes(event: dict, data: Any) -> dict:
+    """Return job_id, hostname and device_type of event, if known."""
+    attributes = {}
+    if event["type"] == "log":
+        if "job_id" in event:
+            attributes["job_id"] = int(event["job_id"])
+    elif event["type"] == "update" and event.get("update_type") == "job":
+        attributes["job_id"] = data.get("job_id")
+    elif event["type"] == "update" and event.get("update_type") == "device":
+        attributes["hostname"] = data.get("hostname")
+        attributes["device_type"] = (data.get("object") or {}).get("device_type")
+    elif event["type"] == "sync":
+        attributes["hostname"] = data.get("syncevent_hostname")
+        attributes["job_id"] = (data.get("syncevent_data") or {}).get("job_id")
+    return attributes
+
+
+def parse_event(event_id: str, event: dict) -> Optional[ParsedEvent]:
+    try:
+        if event["type"] == "log":
+            data = event["message"]
+        else:
+            data = json.loads(event["json"])
+        return ParsedEvent(event_id, event, event_rooms(event), data, event_attributes(event, data))
+    except Exception:
+        return None
+
+
+def event_payload(parsed: ParsedEvent, compact: bool = False):
+    """Return data of an event as emitted in "events" messages."""
+    if compact and parsed.event["type"] == "update" and "changed" in parsed.data:
+        return {k: v for k, v in parsed.data.items() if k != "object"}
+    return parsed.data
+
+
+def batch_event(parsed: ParsedEvent, compact: bool = False) -> dict:
+    """Return event as sent to batch clients, with id and decoded json data."""
+    ret = dict(parsed.event, id=parsed.event_id)
+    if "json" in ret:
+        ret["json"] = event_payload(parsed, compact)
+    return ret
+
+
+@dataclass
+class EventFilter:
+    job_ids: Optional[Set[int]] = None
+    hostnames: Optional[Set[str]] = None
+    device_types: Optional[Set[str]] = None
+
+    @classmethod
+    def from_data(cls, data: dict) -> "EventFilter":
+        """Create filter from a subscription message, filter values can be single values or lists.
+
+        Raises:
+            ValueError: Invalid filter value
+        """
+
+        def values(key: str, value_type: type) -> Optional[Set]:
+            if key not in data:
+                return None
+            value = data[key] if isinstance(data[key], list) else [data[key]]
+            return {value_type(v) for v in value}
+
+        device_types = values("device_type", str)
+        return cls(
+            job_ids=values("job_id", int),
+            hostnames=values("hostname", str),
+            device_types={v.upper() for v in device_types} if device_types is not None else None,
+        )
+
+    def match(self, attributes: dict) -> bool:
+        for key, values in (("job_id", self.job_ids), ("hostname", self.hostnames), ("device_type", self.device_types)):
+            if values is not None and attributes.get(key) not in values:
+                return False
+        return True
+
+
+@dataclass
+class WebsocketClient:
+    sid: str
+    # Filter per subscribed room
+    rooms: Dict[str, EventFilter] = field(default_factory=dict)
+    batch: bool = False
+    compact: bool = False
+    # Id of the last stream event that has been sent, or skipped because it did not match rooms
+    last_id: Optional[str] = None
+    # Resume from this event id on next send, set when reconnecting or after falling behind
+    resume_id: Optional[str] = None
+    unacked: int = 0
+    behind: bool = False
+
+    def match(self, parsed: ParsedEvent) -> bool:
+        return any(room in self.rooms and self.rooms[room].match(parsed.attributes) for room in parsed.rooms)
+
+
+class EventFanout:
+    def __init__(self):
+        self.clients: Dict[str, WebsocketClient] = {}
+        self.last_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        sid: str,
+        room: str,
+        event_filter: Optional[EventFilter] = None,
+        batch: bool = True,
+        compact: bool = False,
+        last_id: Optional[str] = None,
+    ):
+        """Subscribe client to get events for room.
+
+        Args:
+            sid: socketio session id of client
+            room: Name of room, same as for clients that join rooms
+            event_filter: Only send events for room that match filter
+            batch: Send events in "events_batch" messages
+            compact: Send only changed attributes in device updates
+            last_id: Resume after this event id, if it's still in the stream
+        """
+        with self._lock:
+            client = self.clients.setdefault(sid, WebsocketClient(sid))
+            client.rooms[room] = event_filter or EventFilter()
+            client.batch = batch
+            client.compact = compact
+            if valid_event_id(last_id):
+                client.resume_id = last_id
+                client.last_id = last_id
+
+    def unsubscribe(self, sid: str):
+        with self._lock:
+            self.clients.pop(sid, None)
+
+    def get_lag(self) -> Dict[str, int]:
+        """Return number of sent but unacknowledged events per client."""
+        with self._lock:
+            return {sid: client.unacked for sid, client in self.clients.items()}
+
+    def _ack(self, sid: str, count: int):
+        with self._lock:
+            client = self.clients.get(sid)
+            if client:
+                client.unacked = max(0, client.unacked - count)
+
+    @staticmethod
+    def _parse(result) -> List[StreamEntry]:
+        # [[stream, [(messageid, {datadict}), ...]]]
+        for stream, entries in result:
+            if stream == EVENTS_STREAM:
+                return list(entries)
+        return []
+
+    def read(self, redis: StrictRedis) -> List[StreamEntry]:
+        if self.last_id is None:
+            newest = redis.xrevrange(EVENTS_STREAM, count=1)
+            self.last_id = newest[0][0] if newest else "0-0"
+        entries = self._parse(redis.xread({EVENTS_STREAM: self.last_id}, count=READ_COUNT, block=READ_BLOCK_MS))
+        if entries:
+            self.last_id = entries[-1][0]
+        return entries
+
+    def _client_entries(
+        self, redis: StrictRedis, client: WebsocketClient, entries: List[StreamEntry]
+    ) -> Optional[List[StreamEntry]]:
+        """Return entries to send to client, or None if client is behind."""
+        logger = get_logger()
+        # Client state is also changed by subscribe, so it's only read and written under the lock
+        with self._lock:
+            if client.unacked >= MAX_UNACKED_EVENTS:
+                if not client.behind:
+                    logger.debug("Websocket client {} is behind, pausing events".format(client.sid))
+                    client.behind = True
+                    client.resume_id = client.last_id
+                return None
+            client.behind = False
+            resume_id = client.resume_id
+            last_id = client.last_id
+            client.resume_id = None
+        if not resume_id:
+            return entries
+        # Get missed events from the stream, up to and including the current batch
+        missed = redis.xrange(EVENTS_STREAM, min=resume_id, max=self.last_id)
+        if missed and missed[0][0] == last_id:
+            missed = missed[1:]
+        return missed
+
+    def _set_client_last_id(self, client: WebsocketClient, last_id: str):
+        with self._lock:
+            # Keep last_id set by subscribe if client resumes from another id
+            if not client.resume_id:
+                client.last_id = last_id
+
+    def emit_rooms(self, socketio, events: List[ParsedEvent]):
+        """Send events to clients that joined rooms.
+
+        Legacy rooms get one "events" message per event and room, unbatched
+        for compatibility with existing clients. Batch rooms get all events
+        for the room from one read of the stream in a single "events_batch"
+        message, regardless of the number of clients in the room.
+        """
+        batches: Dict[str, List[dict]] = {}
+        for parsed in events:
+            payload = event_payload(parsed)
+            for room in parsed.rooms:
+                socketio.emit("events", payload, room=room)
+                batches.setdefault(room, []).append(batch_event(parsed))
+        for room, room_events in batches.items():
+            socketio.emit(
+                "events_batch", {"last_id": room_events[-1]["id"], "events": room_events}, room=batch_room(room)
+            )
+
+    @staticmethod
+    def _parse_entries(entries: List[StreamEntry]) -> List[ParsedEvent]:
+        return [parsed for parsed in (parse_event(event_id, event) for event_id, event in entries) if parsed]
+
+    def emit_clients(
+        self,
+        socketio,
+        redis: StrictRedis,
+        entries: List[StreamEntry],
+        parsed_events: Optional[List[ParsedEvent]] = None,
+    ):
+        with self._lock:
+            clients = list(self.clients.values())
+        if parsed_events is None:
+            parsed_events = self._parse_entries(entries)
+        for client in clients:
+            client_entries = self._client_entries(redis, client, entries)
+            if not client_entries:
+                continue
+            if client_entries is entries:
+                client_events = parsed_events
+            else:
+                client_events = self._parse_entries(client_entries)
+            last_id = client_entries[-1][0]
+            self._set_client_last_id(client, last_id)
+            client_events = [parsed for parsed in client_events if client.match(parsed)]
+            if not client_events:
+                continue
+            if not client.batch:
+                for parsed in client_events:
+                    socketio.emit("events", event_payload(parsed, client.compact), to=client.sid)
+                continue
+            count = len(client_events)
+            with self._lock:
+                client.unacked += count
+            socketio.emit(
+                "events_batch",
+                {
+                    "last_id": last_id,
+                    "events": [batch_event(parsed, client.compact) for parsed in client_events],
+                },
+                to=client.sid,
+                callback=lambda *args, sid=client.sid, count=count: self._ack(sid, count),
+            )
+
+    def run(self, socketio, redis: StrictRedis, stop: Callable[[], bool]):
+        """Read events from stream and send them to clients until stop returns True."""
+        while not stop():
+            entries = self.read(redis)
+            parsed_events = self._parse_entries(entries)
+            self.emit_rooms(socketio, parsed_events)
+            with self._lock:
+                has_clients = bool(self.clients)
+            if has_clients:
+                self.emit_clients(socketio, redis, entries, parsed_events)
+
+
+event_fanout = EventFanout()
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 import yaml
 from pydantic import field_validator
@@ -17,6 +17,8 @@ class AppSettings(BaseSettings):
     CNAAS_DB_PORT: int = 5432
     REDIS_HOSTNAME: str = "127.0.0.1"
     REDIS_PORT: int = 6379
+    REDIS_MAX_CONNECTIONS: int = 100
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
     POSTGRES_DSN: str = (
         f"postgresql://{CNAAS_DB_USERNAME}:{CNAAS_DB_PASSWORD}@{CNAAS_DB_HOSTNAME}:{CNAAS_DB_PORT}/{CNAAS_DB_DATABASE}"
     )
@@ -57,6 +59,14 @@ class ApiSettings(BaseSettings):
     COMMIT_CONFIRMED_TIMEOUT: int = 300
     COMMIT_CONFIRMED_WAIT: int = 1
     SETTINGS_OVERRIDE: Optional[dict] = None
+    TEMPLATES_CACHE_DIR: Path = Path("/opt/cnaas/cache/templates/")
+    YAML_CACHE_DIR: Path = Path("/opt/cnaas/cache/yaml/")
+    EVENTS_STREAM_MAXLEN: int = 10000
+    DEVICE_LOCK_WAIT: int = 600
+    JOB_THREADS: int = 10
+    JOB_RESERVED_INTERACTIVE: int = 2
+    JOB_MAX_PER_USER: int = 0
+    JOB_FUNCTION_LIMITS: Optional[Dict[str, int]] = None
 
     @field_validator("MGMTDOMAIN_PRIMARY_IP_VERSION")
     @classmethod
@@ -118,6 +128,14 @@ def construct_api_settings() -> ApiSettings:
             COMMIT_CONFIRMED_TIMEOUT=config.get("commit_confirmed_timeout", 300),
             COMMIT_CONFIRMED_WAIT=config.get("commit_confirmed_wait", 1),
             SETTINGS_OVERRIDE=config.get("settings_override", None),
+            TEMPLATES_CACHE_DIR=config.get("templates_cache_dir", ApiSettings().TEMPLATES_CACHE_DIR),
+            YAML_CACHE_DIR=config.get("yaml_cache_dir", ApiSettings().YAML_CACHE_DIR),
+            EVENTS_STREAM_MAXLEN=config.get("events_stream_maxlen", 10000),
+            DEVICE_LOCK_WAIT=config.get("device_lock_wait", 600),
+            JOB_THREADS=config.get("job_threads", 10),
+            JOB_RESERVED_INTERACTIVE=config.get("job_reserved_interactive", 2),
+            JOB_MAX_PER_USER=config.get("job_max_per_user", 0),
+            JOB_FUNCTION_LIMITS=config.get("job_function_limits", None),
         )
     else:
         return ApiSettings()
@@ -135,6 +153,10 @@ def construct_app_settings() -> AppSettings:
         settings.CNAAS_DB_DATABASE = config["database"]
         settings.CNAAS_DB_PASSWORD = config["password"]
         settings.REDIS_HOSTNAME = config["redis_hostname"]
+        if "redis_max_connections" in config:
+            settings.REDIS_MAX_CONNECTIONS = config["redis_max_connections"]
+        if "redis_health_check_interval" in config:
+            settings.REDIS_HEALTH_CHECK_INTERVAL = config["redis_health_check_interval"]
         settings.POSTGRES_DSN = f"postgresql://{settings.CNAAS_DB_USERNAME}:{settings.CNAAS_DB_PASSWORD}@{settings.CNAAS_DB_HOSTNAME}:{settings.CNAAS_DB_PORT}/{settings.CNAAS_DB_DATABASE}"
 
     if db_config.is_file():
@@ -7,13 +7,15 @@ import json
 import re
 from typing import List, Optional, Set
 
-from sqlalchemy import Boolean, DateTime, Enum, ForeignKey, Integer, String, Unicode, UniqueConstraint, event
+from sqlalchemy import Boolean, DateTime, Enum, ForeignKey, Integer, String, Unicode, UniqueConstraint, event, inspect
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy_utils import IPAddressType
 
 import cnaas_nms.db.base
+import cnaas_nms.db.inventory_cache
 import cnaas_nms.db.linknet
 import cnaas_nms.db.site
+import cnaas_nms.db.topology
 from cnaas_nms.db.interface import Interface, InterfaceConfigType
 from cnaas_nms.db.site import Site
 from cnaas_nms.db.stackmember import Stackmember
@@ -117,7 +119,10 @@ class Device(cnaas_nms.db.base.Base):
 
     def get_neighbors(self, session, linknets: Optional[List[dict]] = None) -> Set[Device]:
         """Look up neighbors from cnaas_nms.db.linknet.Linknets and return them as a list of Device objects."""
+        topology = cnaas_nms.db.topology.get_topology_index(session)
         if not linknets:
+            if topology and topology.covers(self.id):
+                return set(topology.get_neighbors(self.id))
             linknets = self.get_linknets(session)
         ret: Set = set()
         for linknet in linknets:
@@ -127,14 +132,18 @@ class Device(cnaas_nms.db.base.Base):
             else:
                 device_a_id = linknet["device_a_id"]
                 device_b_id = linknet["device_b_id"]
-            if device_a_id == self.id:
-                ret.add(session.query(Device).filter(Device.id == device_b_id).one())
+            peer_device_id = device_b_id if device_a_id == self.id else device_a_id
+            if topology and peer_device_id in topology.devices:
+                ret.add(topology.devices[peer_device_id])
             else:
-                ret.add(session.query(Device).filter(Device.id == device_a_id).one())
+                ret.add(session.query(Device).filter(Device.id == peer_device_id).one())
         return ret
 
     def get_linknets(self, session) -> List[cnaas_nms.db.linknet.Linknet]:
         """Look up linknets and return a list of Linknet objects."""
+        topology = cnaas_nms.db.topology.get_topology_index(session)
+        if topology and topology.covers(self.id):
+            return topology.get_linknets(self.id)
         ret = []
         linknets = session.query(cnaas_nms.db.linknet.Linknet).filter(
             (cnaas_nms.db.linknet.Linknet.device_a_id == self.id)
@@ -159,6 +168,9 @@ class Device(cnaas_nms.db.base.Base):
     def get_linknet_localif_mapping(self, session) -> dict[str, str]:
         """Return a mapping with local interface name and what peer device hostname
         that interface is connected to."""
+        topology = cnaas_nms.db.topology.get_topology_index(session)
+        if topology and topology.covers(self.id):
+            return topology.get_linknet_localif_mapping(self.id)
         linknets: List[cnaas_nms.db.linknet.Linknet] = self.get_linknets(session)
         ret = {}
         for linknet in linknets:
@@ -172,6 +184,9 @@ class Device(cnaas_nms.db.base.Base):
 
     def get_links_to(self, session, peer_device: Device) -> List[cnaas_nms.db.linknet.Linknet]:
         """Return linknet connecting to device peer_device."""
+        topology = cnaas_nms.db.topology.get_topology_index(session)
+        if topology and topology.covers(self.id):
+            return topology.get_links_to(self.id, peer_device.id)
         return (
             session.query(cnaas_nms.db.linknet.Linknet)
             .filter(
@@ -247,12 +262,16 @@ class Device(cnaas_nms.db.base.Base):
             return linknet.device_a_ip
 
     def get_uplink_peer_hostnames(self, session) -> List[str]:
-        intfs = (
-            session.query(Interface)
-            .filter(Interface.device == self)
-            .filter(Interface.configtype == InterfaceConfigType.ACCESS_UPLINK)
-            .all()
-        )
+        topology = cnaas_nms.db.topology.get_topology_index(session)
+        if topology and topology.covers(self.id):
+            intfs = topology.get_interfaces(self.id, InterfaceConfigType.ACCESS_UPLINK)
+        else:
+            intfs = (
+                session.query(Interface)
+                .filter(Interface.device == self)
+                .filter(Interface.configtype == InterfaceConfigType.ACCESS_UPLINK)
+                .all()
+            )
         peer_hostnames = []
         intf: Interface = Interface()
         for intf in intfs:
@@ -261,12 +280,16 @@ class Device(cnaas_nms.db.base.Base):
         return peer_hostnames
 
     def get_mlag_peer(self, session) -> Optional[Device]:
-        intfs = (
-            session.query(Interface)
-            .filter(Interface.device == self)
-            .filter(Interface.configtype == InterfaceConfigType.MLAG_PEER)
-            .all()
-        )
+        topology = cnaas_nms.db.topology.get_topology_index(session)
+        if topology and topology.covers(self.id):
+            intfs = topology.get_interfaces(self.id, InterfaceConfigType.MLAG_PEER)
+        else:
+            intfs = (
+                session.query(Interface)
+                .filter(Interface.device == self)
+                .filter(Interface.configtype == InterfaceConfigType.MLAG_PEER)
+                .all()
+            )
         peers: Set[Device] = set()
         linknets = self.get_linknets(session)
         intf: Interface = Interface()
@@ -488,13 +511,31 @@ class Device(cnaas_nms.db.base.Base):
 
 @event.listens_for(Device, "after_update")
 def after_update_device(mapper, connection, target: Device):
-    update_data = {"action": "UPDATED", "device_id": target.id, "hostname": target.hostname, "object": target.as_dict()}
+    cnaas_nms.db.topology.invalidate_topology_index()
+    cnaas_nms.db.inventory_cache.device_changed(target)
+    changed = [attr.key for attr in inspect(target).attrs if attr.history.has_changes()]
+    add_device_update_event(target, changed)
+
+
+def add_device_update_event(target: Device, changed: List[str]):
+    """Send update event for device, changed is a list of names of changed attributes."""
+    device_data = target.as_dict()
+    update_data = {
+        "action": "UPDATED",
+        "device_id": target.id,
+        "hostname": target.hostname,
+        "object": device_data,
+        # Changed attributes, sent instead of the whole object to websocket clients that want compact updates
+        "changed": {key: device_data[key] for key in changed if key in device_data},
+    }
     json_data = json.dumps(update_data)
     add_event(json_data=json_data, event_type="update", update_type="device")
 
 
 @event.listens_for(Device, "before_delete")
 def before_delete_device(mapper, connection, target: Device):
+    cnaas_nms.db.topology.invalidate_topology_index()
+    cnaas_nms.db.inventory_cache.device_deleted(target)
     update_data = {"action": "DELETED", "device_id": target.id, "hostname": target.hostname, "object": target.as_dict()}
     json_data = json.dumps(update_data)
     add_event(json_data=json_data, event_type="update", update_type="device")
@@ -502,6 +543,8 @@ def before_delete_device(mapper, connection, target: Device):
 
 @event.listens_for(Device, "after_insert")
 def after_insert_device(mapper, connection, target: Device):
+    cnaas_nms.db.topology.invalidate_topology_index()
+    cnaas_nms.db.inventory_cache.device_changed(target)
     update_data = {"action": "CREATED", "device_id": target.id, "hostname": target.hostname, "object": target.as_dict()}
     json_data = json.dumps(update_data)
     add_event(json_data=json_data, event_type="update", update_type="device")
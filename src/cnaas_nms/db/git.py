@@ -5,8 +5,6 @@ import shutil
 from typing import Dict, Optional, Set, Tuple
 from urllib.parse import urldefrag
 
-import yaml
-
 from cnaas_nms.app_settings import app_settings
 from cnaas_nms.db.device import Device, DeviceType
 from cnaas_nms.db.exceptions import ConfigException, RepoStructureException
@@ -21,8 +19,10 @@ from cnaas_nms.db.settings import (
     get_groups,
     rebuild_settings_cache,
 )
+from cnaas_nms.devicehandler.nornir_helper import clear_template_cache
 from cnaas_nms.devicehandler.sync_history import add_sync_event
 from cnaas_nms.tools.log import get_logger
+from cnaas_nms.tools.yaml_store import load_yaml_file
 from git import InvalidGitRepositoryError, Repo
 from git.exc import GitCommandError, NoSuchPathError
 
@@ -164,6 +164,8 @@ def _refresh_repo_task(repo_type: RepoType = RepoType.TEMPLATES, job_id: Optiona
 
     ret = ""
     changed_files: Set[str] = set()
+    # Set to False if the working tree was changed by something else than the pull
+    changed_files_complete = True
     try:
         url, branch = parse_repo_url(remote_repo_path)
         local_repo = Repo(local_repo_path)
@@ -172,6 +174,7 @@ def _refresh_repo_task(repo_type: RepoType = RepoType.TEMPLATES, job_id: Optiona
         # Reset head if it's detached
         reset_head_failed = False
         if local_repo.head.is_detached:
+            changed_files_complete = False
             try:
                 reset_repo(local_repo, remote_repo_path)
             except Exception:
@@ -209,6 +212,7 @@ def _refresh_repo_task(repo_type: RepoType = RepoType.TEMPLATES, job_id: Optiona
             prev_commit = item.commit.hexsha
     except (InvalidGitRepositoryError, NoSuchPathError):  # noqa: S110
         logger.info("Local repository {} not found, cloning from remote".format(local_repo_path))
+        changed_files_complete = False
         try:
             local_repo = Repo.clone_from(url, local_repo_path, branch=branch)
         except (InvalidGitRepositoryError, NoSuchPathError) as e:
@@ -222,7 +226,7 @@ def _refresh_repo_task(repo_type: RepoType = RepoType.TEMPLATES, job_id: Optiona
 
     if repo_type == RepoType.SETTINGS:
         try:
-            rebuild_settings_cache()
+            rebuild_settings_cache(changed_files if changed_files_complete else None)
         except SettingsSyntaxError as e:
             logger.error("Error in settings repo configuration: {}".format(e))
             if repo_chekout_working(repo_type):
@@ -261,6 +265,7 @@ def _refresh_repo_task(repo_type: RepoType = RepoType.TEMPLATES, job_id: Optiona
                     logger.warn("Settings updated for unknown device: {}".format(hostname))
 
     if repo_type == RepoType.TEMPLATES:
+        clear_template_cache(keep_commit=local_repo.head.commit.hexsha)
         logger.debug("Files changed in template repository: {}".format(changed_files))
         updated_devtypes = template_syncstatus(updated_templates=changed_files)
         updated_list = ["{}:{}".format(platform, dt.name) for dt, platform in updated_devtypes]
@@ -289,8 +294,7 @@ def template_syncstatus(updated_templates: set) -> Set[Tuple[DeviceType, str]]:
         if not os.path.isfile(mapfile):
             raise RepoStructureException("File mapping.yml not found in template repo {}".format(path))
         try:
-            with open(mapfile, "r") as f:
-                mapping = yaml.safe_load(f)
+            mapping = load_yaml_file(mapfile)
         except Exception as e:
             logger.exception("Could not parse {}/mapping.yml in template repo: {}".format(path, str(e)))
             raise RepoStructureException("Could not parse {}/mapping.yml in template repo: {}".format(path, str(e)))
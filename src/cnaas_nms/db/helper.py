@@ -1,13 +1,14 @@
 import datetime
-from ipaddress import IPv4Address, IPv4Interface
+from ipaddress import IPv4Address, IPv6Address
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Union
 
 import netaddr
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
 
 from cnaas_nms.db.device import Device, DeviceType
 from cnaas_nms.db.mgmtdomain import Mgmtdomain
+from cnaas_nms.db.mgmtdomain_index import get_mgmtdomain_index
 
 
 def canonical_mac(mac):
@@ -113,14 +114,12 @@ def find_mgmtdomain(session, hostnames: List[str]) -> Optional[Mgmtdomain]:
     return mgmtdomain
 
 
-def find_mgmtdomain_by_ip(session, ipv4_address: IPv4Address) -> Optional[Mgmtdomain]:
-    mgmtdomains = session.query(Mgmtdomain).all()
-    mgmtdom: Mgmtdomain
-    for mgmtdom in mgmtdomains:
-        mgmtdom_ipv4_network = IPv4Interface(mgmtdom.ipv4_gw).network
-        if ipv4_address in mgmtdom_ipv4_network:
-            return mgmtdom
-    return None
+def find_mgmtdomain_by_ip(session, ip_address: Union[IPv4Address, IPv6Address]) -> Optional[Mgmtdomain]:
+    """Find the management domain with the most specific network that contains ip_address."""
+    mgmtdomain_id = get_mgmtdomain_index(session).lookup(ip_address)
+    if mgmtdomain_id is None:
+        return None
+    return session.get(Mgmtdomain, mgmtdomain_id)
 
 
 def get_all_mgmtdomains(session, hostname: str) -> List[Mgmtdomain]:
@@ -1,12 +1,13 @@
 import enum
 import re
 
-from sqlalchemy import Column, Enum, ForeignKey, Integer, Unicode
+from sqlalchemy import Column, Enum, ForeignKey, Integer, Unicode, event
 from sqlalchemy.dialects.postgresql.json import JSONB
 from sqlalchemy.orm import backref, relationship
 
 import cnaas_nms.db.base
 import cnaas_nms.db.device
+import cnaas_nms.db.topology
 
 
 class InterfaceError(Exception):
@@ -88,3 +89,10 @@ class Interface(cnaas_nms.db.base.Base):
             else:
                 missing_groups += 1
         return index_num
+
+
+@event.listens_for(Interface, "after_insert")
+@event.listens_for(Interface, "after_update")
+@event.listens_for(Interface, "after_delete")
+def after_change_interface(mapper, connection, target: Interface):
+    cnaas_nms.db.topology.invalidate_topology_index()
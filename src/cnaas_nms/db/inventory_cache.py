@@ -0,0 +1,165 @@
+"""Process wide cache of the device columns used to build the nornir inventory.
+
+Changes to devices made in this process are applied to the cache when the
+session that made them is committed. The commit also increments an inventory
+generation in redis, which makes other processes reload their cache the next
+time it's used. Bulk inserts, updates and deletes of devices don't trigger
+mapper events, so committing one of those makes all processes, including
+this one, reload their cache.
+
+Redis is checked at most once a second, so other processes can see device
+changes up to a second late. A device that is requested but missing from the
+cache makes the cache check redis right away, so jobs can use devices that
+were just added by another process.
+"""
+
+from __future__ import annotations
+
+import threading
+from ipaddress import IPv4Address
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from cnaas_nms.db.session import sqla_session
+from cnaas_nms.tools.cache import GenerationCounter
+
+if TYPE_CHECKING:
+    from cnaas_nms.db.device import Device, DeviceState, DeviceType
+
+SESSION_INFO_KEY = "inventory_changes"
+BULK_SESSION_INFO_KEY = "inventory_bulk_changed"
+
+inventory_generation = GenerationCounter("inventory_generation")
+
+
+class InventoryDevice(NamedTuple):
+    hostname: str
+    management_ip: Optional[IPv4Address]
+    dhcp_ip: Optional[IPv4Address]
+    port: Optional[int]
+    platform: Optional[str]
+    device_type: DeviceType
+    state: DeviceState
+    synchronized: bool
+
+    @classmethod
+    def from_device(cls, dev: Device) -> InventoryDevice:
+        return cls(*[getattr(dev, field) for field in cls._fields])
+
+
+class InventoryCache:
+    def __init__(self):
+        self.devices: Dict[str, InventoryDevice] = {}
+        self.generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def load(self, generation: Optional[int]):
+        from cnaas_nms.db.device import Device
+
+        columns = [getattr(Device, field) for field in InventoryDevice._fields]
+        with sqla_session() as session:
+            devices = {row[0]: InventoryDevice(*row) for row in session.query(*columns)}
+        with self._lock:
+            self.devices = devices
+            self.generation = generation
+
+    def get_devices(self, hostnames: Optional[List[str]] = None) -> List[InventoryDevice]:
+        """Get devices from cache, reloaded from database if it's outdated.
+
+        Args:
+            hostnames: Only get devices with these hostnames, if found
+        """
+        # Get generation before loading, so changes committed during load cause another reload
+        generation = inventory_generation.get()
+        if generation is None or generation != self.generation:
+            self.load(generation)
+        elif hostnames is not None and not self._has_hostnames(hostnames):
+            # Device might have been added by another process since generation was last checked
+            generation = inventory_generation.get(refresh=True)
+            if generation is None or generation != self.generation:
+                self.load(generation)
+        with self._lock:
+            if hostnames is None:
+                return list(self.devices.values())
+            return [self.devices[hostname] for hostname in hostnames if hostname in self.devices]
+
+    def _has_hostnames(self, hostnames: List[str]) -> bool:
+        with self._lock:
+            return all(hostname in self.devices for hostname in hostnames)
+
+    def apply_changes(self, changes: Dict[str, Optional[InventoryDevice]]):
+        """Apply committed device changes, None means that device was removed."""
+        generation = inventory_generation.bump()
+        with self._lock:
+            for hostname, device in changes.items():
+                if device is None:
+                    self.devices.pop(hostname, None)
+                else:
+                    self.devices[hostname] = device
+            # If another process has changed devices since last load, reload on next use
+            if generation is None or self.generation is None or generation != self.generation + 1:
+                self.generation = None
+            else:
+                self.generation = generation
+
+
+inventory_cache = InventoryCache()
+
+
+def _get_changes(target) -> Optional[Dict[str, Optional[InventoryDevice]]]:
+    session = object_session(target)
+    if session is None:
+        return None
+    return session.info.setdefault(SESSION_INFO_KEY, {})
+
+
+def device_changed(target: Device):
+    """Record inserted or updated device, called from Device mapper events."""
+    changes = _get_changes(target)
+    if changes is None:
+        inventory_cache.generation = None
+        return
+    for old_hostname in inspect(target).attrs.hostname.history.deleted:
+        changes[old_hostname] = None
+    changes[target.hostname] = InventoryDevice.from_device(target)
+
+
+def device_deleted(target: Device):
+    """Record deleted device, called from Device mapper events."""
+    changes = _get_changes(target)
+    if changes is None:
+        inventory_cache.generation = None
+        return
+    changes[target.hostname] = None
+
+
+@event.listens_for(Session, "do_orm_execute")
+def orm_execute_inventory(orm_execute_state):
+    """Record bulk insert, update or delete statements on the device table."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    from cnaas_nms.db.device import Device
+
+    mapper = orm_execute_state.bind_mapper
+    table = getattr(orm_execute_state.statement, "table", None)
+    if (mapper is not None and mapper.class_ is Device) or table is Device.__table__:
+        orm_execute_state.session.info[BULK_SESSION_INFO_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def after_commit_inventory(session):
+    changes = session.info.pop(SESSION_INFO_KEY, None)
+    if session.info.pop(BULK_SESSION_INFO_KEY, False):
+        # Changed rows are not known, reload cache in all processes
+        inventory_generation.bump()
+        inventory_cache.generation = None
+    elif changes:
+        inventory_cache.apply_changes(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def after_rollback_inventory(session):
+    session.info.pop(SESSION_INFO_KEY, None)
+    session.info.pop(BULK_SESSION_INFO_KEY, None)
@@ -0,0 +1,102 @@
+"""Allocation of free addresses and networks from IP pools.
+
+Occupancy of a pool is kept as a bitmap with one bit per address, or per
+network of new_prefix length, built from queries that only return used values
+within the pool prefix. The first free offset is the lowest zero bit of the
+bitmap.
+
+Allocations from a pool are serialized with a postgres advisory lock that is
+held until the transaction that found the free address ends, so concurrent
+jobs can't get the same address as long as the address is saved (as a device
+IP, ReservedIP or linknet) before the transaction is committed.
+"""
+
+from ipaddress import IPv4Address, IPv4Network, IPv6Address, IPv6Network, ip_interface, ip_network
+from typing import Iterable, List, Optional, Union
+
+from sqlalchemy import cast, text
+from sqlalchemy.dialects.postgresql import CIDR, INET
+
+IPAddress = Union[IPv4Address, IPv6Address]
+IPNetwork = Union[IPv4Network, IPv6Network]
+
+
+class IPPool:
+    def __init__(self, network: IPNetwork, new_prefix: Optional[int] = None, skip: int = 0, hosts_only: bool = False):
+        """Pool of addresses, or networks with new_prefix length, from network.
+
+        Args:
+            network: Prefix to allocate from
+            new_prefix: Allocate networks of this prefix length instead of addresses
+            skip: Number of addresses or networks at the start of the pool to never allocate
+            hosts_only: Only allocate addresses returned by network.hosts()
+        """
+        self.network = network
+        self.new_prefix = new_prefix if new_prefix is not None else network.max_prefixlen
+        if self.new_prefix < network.prefixlen or self.new_prefix > network.max_prefixlen:
+            raise ValueError("new_prefix must be between {} and {}".format(network.prefixlen, network.max_prefixlen))
+        self.unit_bits = network.max_prefixlen - self.new_prefix
+        self.first = skip
+        self.last = 2 ** (self.new_prefix - network.prefixlen) - 1
+        if hosts_only and network.prefixlen < network.max_prefixlen - 1:
+            # Network address, and for IPv4 the broadcast address, are not hosts
+            self.first += 1
+            if network.version == 4:
+                self.last -= 1
+        self.network_int = int(network.network_address)
+        self.bitmap = 0
+
+    def offset(self, value) -> Optional[int]:
+        """Return offset of address or network in pool, counted from the first allocatable one."""
+        addr = value if isinstance(value, (IPv4Address, IPv6Address)) else ip_interface(value).ip
+        if addr.version != self.network.version:
+            return None
+        offset = (int(addr) - self.network_int) >> self.unit_bits
+        if offset < self.first or offset > self.last:
+            return None
+        return offset - self.first
+
+    def load(self, used_values: Iterable):
+        """Build occupancy bitmap from used addresses or networks."""
+        offsets = [offset for offset in (self.offset(value) for value in used_values if value) if offset is not None]
+        # The first free offset is at most len(offsets), higher offsets can't change the result
+        limit = len(offsets)
+        bits = bytearray(limit // 8 + 1)
+        for offset in offsets:
+            if offset <= limit:
+                bits[offset >> 3] |= 1 << (offset & 7)
+        self.bitmap = int.from_bytes(bits, "little")
+
+    def next_free(self) -> Optional[Union[IPAddress, IPNetwork]]:
+        """Return first free address, or network if new_prefix is set, or None if pool is full."""
+        offset = (~self.bitmap & (self.bitmap + 1)).bit_length() - 1 + self.first
+        if offset > self.last:
+            return None
+        addr = self.network.network_address + (offset << self.unit_bits)
+        if self.new_prefix == self.network.max_prefixlen:
+            return addr
+        return ip_network("{}/{}".format(addr, self.new_prefix))
+
+
+def in_prefix(column, network: IPNetwork):
+    """SQL expression for column values, addresses or networks stored as strings, within network."""
+    return cast(column, INET).op("<<=")(cast(str(network), CIDR))
+
+
+def lock_pool(session, network: IPNetwork):
+    """Lock pool for allocations until the current transaction of session ends."""
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:pool))"), {"pool": "ip_pool:{}".format(network)})
+
+
+def find_free(session, pool: IPPool, used_columns: List) -> Optional[Union[IPAddress, IPNetwork]]:
+    """Lock pool and return first address or network not used in any of the columns.
+
+    The caller should save the returned address in session and commit, which
+    also releases the lock.
+    """
+    lock_pool(session, pool.network)
+    used_values = []
+    for column in used_columns:
+        used_values += [row[0] for row in session.query(column).filter(in_prefix(column, pool.network))]
+    pool.load(used_values)
+    return pool.next_free()
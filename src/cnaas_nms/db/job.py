@@ -2,16 +2,18 @@ import datetime
 import enum
 import json
 import time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 
 from nornir.core.task import AggregatedResult
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, SmallInteger, Unicode
+from redis.exceptions import RedisError
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, SmallInteger, Unicode, event
 from sqlalchemy.dialects.postgresql.json import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Session, object_session, relationship
 
 import cnaas_nms.db.base
 import cnaas_nms.db.device
 from cnaas_nms.db.helper import json_dumper
+from cnaas_nms.db.session import redis_session, sqla_session
 from cnaas_nms.devicehandler.nornir_helper import NornirJobResult, nr_result_serialize
 from cnaas_nms.scheduler.jobresult import DictJobResult, StrJobResult
 from cnaas_nms.tools.event import add_event
@@ -19,6 +21,12 @@ from cnaas_nms.tools.log import get_logger
 
 logger = get_logger()
 
+# Redis pub/sub channel where ids of jobs are published when their status has changed
+JOB_STATUS_CHANNEL = "job_status"
+# Check job status at least this often while waiting, in case a notification is lost
+JOB_WAIT_POLL_INTERVAL = 10
+SESSION_INFO_KEY = "job_status_changes"
+
 
 class JobNotFoundError(Exception):
     pass
@@ -107,6 +115,18 @@ class Job(cnaas_nms.db.base.Base):
         try:
             if isinstance(res, NornirJobResult) and isinstance(res.nrresult, AggregatedResult):
                 self.result = {"devices": nr_result_serialize(res.nrresult)}
+                for hostname in res.cached_hosts or []:
+                    self.result["devices"][hostname] = {
+                        "failed": False,
+                        "job_tasks": [
+                            {
+                                "task_name": "Sync device config",
+                                "result": "unchanged (cached)",
+                                "diff": "",
+                                "failed": False,
+                            }
+                        ],
+                    }
                 if res.change_score and type(res.change_score) is int:
                     self.change_score = res.change_score
             elif isinstance(res, (StrJobResult, DictJobResult)):
@@ -277,15 +297,77 @@ class Job(cnaas_nms.db.base.Base):
         timeout: int = 300,
         exit_status: Optional[List[JobStatus]] = None,
     ) -> None:
-        """Wait for job to complete"""
-        start_time = time.time()
+        """Wait for job to complete, woken up by job status notifications.
+
+        If session is None, job status is checked in a new short-lived
+        session each time, so no database connection is held while waiting.
+        Returns immediately if the job does not exist.
+
+        Raises:
+            TimeoutError: Job did not complete within timeout seconds
+        """
+        deadline = time.time() + timeout
         if not exit_status:
             exit_status = [JobStatus.FINISHED, JobStatus.EXCEPTION, JobStatus.ABORTED]
-        while True:
-            job: Job = session.query(Job).filter(Job.id == job_id).one()
-            if job.status in exit_status:
-                return
-            if time.time() - start_time > timeout:
-                raise TimeoutError(f"Job {job_id} did not finish within {timeout} seconds")
-            time.sleep(1)
-            session.refresh(job)
+        with redis_session() as redis:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                # Subscribe before checking status so no notification is missed
+                pubsub.subscribe(JOB_STATUS_CHANNEL)
+                while True:
+                    status = cls._get_status(session, job_id)
+                    if status is None or status in exit_status:
+                        return
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Job {job_id} did not finish within {timeout} seconds")
+                    wait_until = time.time() + min(remaining, JOB_WAIT_POLL_INTERVAL)
+                    while time.time() < wait_until:
+                        message = pubsub.get_message(timeout=wait_until - time.time())
+                        if message and message["data"] == str(job_id):
+                            break
+            finally:
+                pubsub.close()
+
+    @classmethod
+    def _get_status(cls, session, job_id: int) -> Optional[JobStatus]:
+        if session is None:
+            with sqla_session() as new_session:
+                return new_session.query(Job.status).filter(Job.id == job_id).scalar()
+        job: Optional[Job] = session.query(Job).filter(Job.id == job_id).one_or_none()
+        if job is None:
+            return None
+        session.refresh(job)
+        return job.status
+
+
+def publish_job_status(job_ids: Set[int]):
+    """Notify processes waiting for jobs that status of jobs has changed."""
+    try:
+        with redis_session() as redis:
+            pipe = redis.pipeline(transaction=False)
+            for job_id in job_ids:
+                pipe.publish(JOB_STATUS_CHANNEL, job_id)
+            pipe.execute()
+    except RedisError as e:
+        logger.debug("Unable to publish job status change: {}".format(e))
+
+
+@event.listens_for(Job.status, "set")
+def job_status_set(target: Job, value, oldvalue, initiator):
+    session = object_session(target)
+    if session is not None and target.id is not None:
+        session.info.setdefault(SESSION_INFO_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def after_commit_job_status(session):
+    # Publish after commit, so waiters will see the new status in the database
+    job_ids = session.info.pop(SESSION_INFO_KEY, None)
+    if job_ids:
+        publish_job_status(job_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def after_rollback_job_status(session):
+    session.info.pop(SESSION_INFO_KEY, None)
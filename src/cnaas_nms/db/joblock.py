@@ -1,18 +1,36 @@
 import datetime
-from typing import Dict, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Set
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from redis.exceptions import RedisError
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, delete, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import relationship
 
 import cnaas_nms.db.base
-from cnaas_nms.db.session import sqla_session
+from cnaas_nms.db.session import redis_session, sqla_session
+from cnaas_nms.tools.log import get_logger
+
+# Name of lock for all devices, taken by jobs like refresh of settings/templates repositories
+DEVICES_LOCK = "devices"
+# Redis pub/sub channel where releases of device locks are announced
+DEVICE_LOCK_CHANNEL = "device_locks_released"
+# Device locks expire if they are not renewed within this many seconds
+DEVICE_LOCK_LEASE = 300
+DEVICE_LOCK_POLL_INTERVAL = 10
 
 
 class JoblockError(Exception):
     pass
 
 
+def _serialize_lock_changes(session):
+    """Make other sessions wait with acquiring locks until the transaction of session ends."""
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext('joblock'))"))
+
+
 class Joblock(cnaas_nms.db.base.Base):
     __tablename__ = "joblock"
     job_id = Column(Integer, ForeignKey("job.id"), unique=True, primary_key=True)
@@ -35,6 +53,12 @@ class Joblock(cnaas_nms.db.base.Base):
 
     @classmethod
     def acquire_lock(cls, session: sqla_session, name: str, job_id: int) -> bool:
+        if name == DEVICES_LOCK:
+            # Can't take the lock for all devices while jobs hold locks for single devices
+            _serialize_lock_changes(session)
+            now = datetime.datetime.utcnow()
+            if session.query(JoblockDevice).filter(JoblockDevice.expires > now).first():
+                return False
         curlock = session.query(Joblock).filter(Joblock.name == name).one_or_none()
         if curlock:
             return False
@@ -91,6 +115,7 @@ class Joblock(cnaas_nms.db.base.Base):
     def clear_locks(cls, session: sqla_session):
         """Clear/release all locks in the database."""
         try:
+            session.query(JoblockDevice).delete()
             return session.query(Joblock).delete()
         except DBAPIError as e:
             if e.orig.pgcode == '42P01':
@@ -98,3 +123,181 @@ class Joblock(cnaas_nms.db.base.Base):
             else:
                 raise
 
+
+class JoblockDevice(cnaas_nms.db.base.Base):
+    """Lock of a single device, held by a job that configures the device.
+
+    Jobs lock all their devices at once, and jobs with disjoint sets of
+    devices can run at the same time. Locks have a lease that is renewed
+    while the job holding them is running, so locks of jobs that died are
+    freed when the lease expires.
+    """
+
+    __tablename__ = "joblock_device"
+    hostname = Column(String(64), primary_key=True)
+    job_id = Column(Integer, ForeignKey("job.id"), nullable=False, index=True)
+    job = relationship("Job", foreign_keys=[job_id])
+    start_time = Column(DateTime, default=datetime.datetime.utcnow)
+    expires = Column(DateTime, nullable=False)
+
+    def as_dict(self) -> dict:
+        """Return JSON serializable dict."""
+        d = {}
+        for col in self.__table__.columns:
+            value = getattr(self, col.name)
+            if issubclass(value.__class__, datetime.datetime):
+                value = str(value)
+            d[col.name] = value
+        return d
+
+    @classmethod
+    def try_acquire_locks(cls, session, hostnames: List[str], job_id: int) -> Set[int]:
+        """Lock all hostnames for job in one transaction, or none of them.
+
+        The session should not have other uncommitted changes, since it's
+        committed or rolled back.
+
+        Returns:
+            Set of ids of jobs holding conflicting locks, empty if locks were acquired
+        """
+        hostnames = sorted(set(hostnames))
+        now = datetime.datetime.utcnow()
+        _serialize_lock_changes(session)
+        session.execute(
+            delete(JoblockDevice).where(JoblockDevice.hostname.in_(hostnames), JoblockDevice.expires <= now),
+            execution_options={"synchronize_session": False},
+        )
+        blocking_jobs = {
+            lock_job_id
+            for (lock_job_id,) in session.query(JoblockDevice.job_id).filter(
+                JoblockDevice.hostname.in_(hostnames), JoblockDevice.job_id != job_id
+            )
+        }
+        devices_lock = session.query(Joblock).filter(Joblock.name == DEVICES_LOCK).one_or_none()
+        if devices_lock:
+            blocking_jobs.add(devices_lock.job_id)
+        if blocking_jobs:
+            session.rollback()
+            return blocking_jobs
+        expires = now + datetime.timedelta(seconds=DEVICE_LOCK_LEASE)
+        if hostnames:
+            stmt = insert(JoblockDevice).values(
+                [
+                    {"hostname": hostname, "job_id": job_id, "start_time": now, "expires": expires}
+                    for hostname in hostnames
+                ]
+            )
+            session.execute(stmt.on_conflict_do_update(index_elements=["hostname"], set_={"expires": expires}))
+        session.commit()
+        return set()
+
+    @classmethod
+    def acquire_locks(cls, session, hostnames: List[str], job_id: int, timeout: int):
+        """Lock all hostnames for job, waiting for jobs holding conflicting locks.
+
+        Raises:
+            JoblockError: Locks could not be acquired within timeout seconds
+        """
+        logger = get_logger()
+        deadline = time.time() + timeout
+        with redis_session() as redis:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                # Subscribe before trying so no release is missed
+                pubsub.subscribe(DEVICE_LOCK_CHANNEL)
+                logged_jobs: Set[int] = set()
+                while True:
+                    blocking_jobs = cls.try_acquire_locks(session, hostnames, job_id)
+                    if not blocking_jobs:
+                        break
+                    if blocking_jobs != logged_jobs:
+                        logger.info(
+                            "Job {} waiting for device locks held by job(s): {}".format(
+                                job_id, ", ".join(str(x) for x in sorted(blocking_jobs))
+                            )
+                        )
+                        logged_jobs = blocking_jobs
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise JoblockError(
+                            "Unable to acquire device locks within {} seconds, held by job(s): {}".format(
+                                timeout, ", ".join(str(x) for x in sorted(blocking_jobs))
+                            )
+                        )
+                    pubsub.get_message(timeout=min(remaining, DEVICE_LOCK_POLL_INTERVAL))
+            finally:
+                pubsub.close()
+        DeviceLockLease.start_lease(job_id)
+
+    @classmethod
+    def release_locks(cls, session, job_id: int) -> int:
+        """Release all device locks held by job.
+
+        Returns:
+            Number of released locks
+        """
+        DeviceLockLease.stop_lease(job_id)
+        released = session.query(JoblockDevice).filter(JoblockDevice.job_id == job_id).delete()
+        session.commit()
+        try:
+            with redis_session() as redis:
+                redis.publish(DEVICE_LOCK_CHANNEL, job_id)
+        except RedisError as e:
+            get_logger().debug("Unable to publish release of device locks: {}".format(e))
+        return released
+
+
+class DeviceLockLease(threading.Thread):
+    """Renew lease of device locks held by a job, while the job is running."""
+
+    _leases: Dict[int, "DeviceLockLease"] = {}
+    _leases_lock = threading.Lock()
+
+    def __init__(self, job_id: int):
+        super().__init__(name="device-lock-lease-{}".format(job_id), daemon=True)
+        self.job_id = job_id
+        self.stopped = threading.Event()
+
+    @classmethod
+    def start_lease(cls, job_id: int):
+        with cls._leases_lock:
+            if job_id in cls._leases:
+                return
+            lease = cls(job_id)
+            cls._leases[job_id] = lease
+        lease.start()
+
+    @classmethod
+    def stop_lease(cls, job_id: int):
+        with cls._leases_lock:
+            lease = cls._leases.pop(job_id, None)
+        if lease:
+            lease.stopped.set()
+
+    def renew(self) -> bool:
+        """Renew lease, returns False if job is no longer running or holds no locks."""
+        from cnaas_nms.db.job import Job, JobStatus
+
+        with sqla_session() as session:
+            job_status = session.query(Job.status).filter(Job.id == self.job_id).scalar()
+            if job_status != JobStatus.RUNNING:
+                return False
+            expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=DEVICE_LOCK_LEASE)
+            renewed = (
+                session.query(JoblockDevice)
+                .filter(JoblockDevice.job_id == self.job_id)
+                .update({JoblockDevice.expires: expires}, synchronize_session=False)
+            )
+        return renewed > 0
+
+    def run(self):
+        logger = get_logger()
+        while not self.stopped.wait(DEVICE_LOCK_LEASE / 3):
+            try:
+                if not self.renew():
+                    break
+            except Exception as e:
+                logger.error("Unable to renew device locks for job {}: {}".format(self.job_id, e))
+        with self._leases_lock:
+            if self._leases.get(self.job_id) is self:
+                del self._leases[self.job_id]
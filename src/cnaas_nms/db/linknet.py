@@ -3,13 +3,14 @@ import enum
 import ipaddress
 from typing import List, Optional
 
-from sqlalchemy import Column, ForeignKey, Integer, Unicode, UniqueConstraint
+from sqlalchemy import Column, ForeignKey, Integer, Unicode, UniqueConstraint, event
 from sqlalchemy.orm import backref, relationship
 from sqlalchemy_utils import IPAddressType
 
 import cnaas_nms.db.base
 import cnaas_nms.db.device
 import cnaas_nms.db.site
+import cnaas_nms.db.topology
 from cnaas_nms.devicehandler.sync_history import add_sync_event
 
 
@@ -170,3 +171,10 @@ class Linknet(cnaas_nms.db.base.Base):
             dev_b.synchronized = False
             add_sync_event(dev_b.hostname, "linknet_created")
         return new_linknet
+
+
+@event.listens_for(Linknet, "after_insert")
+@event.listens_for(Linknet, "after_update")
+@event.listens_for(Linknet, "after_delete")
+def after_change_linknet(mapper, connection, target: Linknet):
+    cnaas_nms.db.topology.invalidate_topology_index()
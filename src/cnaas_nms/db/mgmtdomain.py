@@ -2,11 +2,10 @@ import datetime
 import enum
 import ipaddress
 from ipaddress import IPv4Address, IPv6Address, ip_interface
-from itertools import dropwhile, islice
-from typing import Optional, Set, Union
+from typing import Optional, Union
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Unicode, UniqueConstraint
-from sqlalchemy.orm import load_only, relationship
+from sqlalchemy import Column, ForeignKey, Integer, String, Unicode, UniqueConstraint, event
+from sqlalchemy.orm import relationship
 from sqlalchemy_utils import IPAddressType
 
 import cnaas_nms.db.base
@@ -14,6 +13,8 @@ import cnaas_nms.db.device
 import cnaas_nms.db.site
 from cnaas_nms.app_settings import api_settings
 from cnaas_nms.db.device import Device
+from cnaas_nms.db.ip_pool import IPPool, find_free
+from cnaas_nms.db.mgmtdomain_index import mgmtdomain_changed
 from cnaas_nms.db.reservedip import ReservedIP
 
 IPAddress = Union[IPv4Address, IPv6Address]
@@ -103,11 +104,6 @@ class Mgmtdomain(cnaas_nms.db.base.Base):
         Defaults to returning an IPv4 address from ipv4_gw. Set version=6 to get an address from
         the equivalent IPv6 network of ipv6_gw.
         """
-        taken_ips = self._get_taken_ips(session)
-
-        def is_taken(addr):
-            return addr in taken_ips
-
         if version not in (4, 6):
             raise ValueError("version must be 4 or 6")
         intf_addr = self.ipv4_gw if version == 4 else self.ipv6_gw
@@ -115,18 +111,12 @@ class Mgmtdomain(cnaas_nms.db.base.Base):
             return None  # can't find an addr if no subnet is defined
         else:
             mgmt_net = ip_interface(intf_addr).network
-        candidates = islice(mgmt_net.hosts(), api_settings.MGMTDOMAIN_RESERVED_COUNT, None)
-        free_ips = dropwhile(is_taken, candidates)
-        return next(free_ips, None)
-
-    @staticmethod
-    def _get_taken_ips(session) -> Set[IPAddress]:
-        """Returns the full set of taken (used + reserved) IP addresses"""
-        device_query = (
-            session.query(Device).filter(Device.management_ip is not None).options(load_only(Device.management_ip))
-        )
-        used_ips = set(device.management_ip for device in device_query)
-        reserved_ip_query = session.query(ReservedIP).options(load_only(ReservedIP.ip))
-        reserved_ips = set(reserved_ip.ip for reserved_ip in reserved_ip_query)
-
-        return used_ips | reserved_ips
+        pool = IPPool(mgmt_net, skip=api_settings.MGMTDOMAIN_RESERVED_COUNT, hosts_only=True)
+        return find_free(session, pool, [Device.management_ip, Device.secondary_management_ip, ReservedIP.ip])
+
+
+@event.listens_for(Mgmtdomain, "after_insert")
+@event.listens_for(Mgmtdomain, "after_update")
+@event.listens_for(Mgmtdomain, "after_delete")
+def after_change_mgmtdomain(mapper, connection, target: Mgmtdomain):
+    mgmtdomain_changed(target)
@@ -0,0 +1,120 @@
+"""Longest prefix match index of management domain networks.
+
+The index maps the networks of ipv4_gw and ipv6_gw of all management domains
+to mgmtdomain ids, with one dict per prefix length, so looking up the
+management domain of an address is one dict lookup per distinct prefix
+length instead of a scan of the mgmtdomain table. The index is shared by all
+sessions in the process. Committing a change to a management domain
+increments a generation in redis, which makes all processes rebuild their
+index on next use.
+"""
+
+from __future__ import annotations
+
+import threading
+from ipaddress import IPv4Address, IPv6Address, ip_interface
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from cnaas_nms.tools.cache import GenerationCounter
+from cnaas_nms.tools.log import get_logger
+
+if TYPE_CHECKING:
+    from cnaas_nms.db.mgmtdomain import Mgmtdomain
+
+SESSION_INFO_KEY = "mgmtdomain_changed"
+
+mgmtdomain_generation = GenerationCounter("mgmtdomain_generation")
+
+
+class MgmtdomainIndex:
+    def __init__(self, generation: Optional[int]):
+        self.generation = generation
+        # ip version -> prefix length -> network address >> host bits -> mgmtdomain id
+        self.networks: Dict[int, Dict[int, Dict[int, int]]] = {4: {}, 6: {}}
+        # Prefix lengths per ip version, longest first
+        self.prefixlens: Dict[int, List[int]] = {4: [], 6: []}
+
+    @classmethod
+    def build(cls, session, generation: Optional[int]) -> MgmtdomainIndex:
+        from cnaas_nms.db.mgmtdomain import Mgmtdomain
+
+        logger = get_logger()
+        index = cls(generation)
+        query = session.query(Mgmtdomain.id, Mgmtdomain.ipv4_gw, Mgmtdomain.ipv6_gw).order_by(Mgmtdomain.id)
+        for mgmtdomain_id, ipv4_gw, ipv6_gw in query:
+            for gw in (ipv4_gw, ipv6_gw):
+                if not gw:
+                    continue
+                try:
+                    network = ip_interface(gw).network
+                except ValueError:
+                    logger.error("Invalid gateway {} in mgmtdomain id {}".format(gw, mgmtdomain_id))
+                    continue
+                host_bits = network.max_prefixlen - network.prefixlen
+                networks = index.networks[network.version].setdefault(network.prefixlen, {})
+                # Keep the first mgmtdomain (lowest id) if several have the same network
+                networks.setdefault(int(network.network_address) >> host_bits, mgmtdomain_id)
+        for version, networks in index.networks.items():
+            index.prefixlens[version] = sorted(networks.keys(), reverse=True)
+        return index
+
+    def lookup(self, address: Optional[Union[IPv4Address, IPv6Address]]) -> Optional[int]:
+        """Return id of mgmtdomain with the longest prefix that contains address."""
+        if address is None:
+            return None
+        address_int = int(address)
+        for prefixlen in self.prefixlens[address.version]:
+            mgmtdomain_id = self.networks[address.version][prefixlen].get(
+                address_int >> (address.max_prefixlen - prefixlen)
+            )
+            if mgmtdomain_id is not None:
+                return mgmtdomain_id
+        return None
+
+
+_index: Optional[MgmtdomainIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_mgmtdomain_index(session) -> MgmtdomainIndex:
+    """Get index of management domains, built using session if it's missing or outdated."""
+    global _index
+    if session.info.get(SESSION_INFO_KEY):
+        # Session has uncommitted mgmtdomain changes, don't cache an index that includes them
+        return MgmtdomainIndex.build(session, None)
+    generation = mgmtdomain_generation.get()
+    with _index_lock:
+        index = _index
+        if index is None or generation is None or index.generation != generation:
+            index = MgmtdomainIndex.build(session, generation)
+            _index = index
+    return index
+
+
+def mgmtdomain_changed(target: Mgmtdomain):
+    """Record changed mgmtdomain, called from Mgmtdomain mapper events."""
+    global _index
+    session = object_session(target)
+    if session is None:
+        _index = None
+        return
+    session.info[SESSION_INFO_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def after_commit_mgmtdomain(session):
+    global _index
+    if session.info.pop(SESSION_INFO_KEY, False):
+        mgmtdomain_generation.bump()
+        _index = None
+
+
+@event.listens_for(Session, "after_rollback")
+def after_rollback_mgmtdomain(session):
+    global _index
+    if session.info.pop(SESSION_INFO_KEY, False):
+        # Index might have been built from changes that were rolled back
+        _index = None
@@ -1,12 +1,18 @@
+import os
+import threading
 from contextlib import contextmanager
+from typing import Dict, Optional
 
-from redis import StrictRedis
+from redis import BlockingConnectionPool, StrictRedis
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from cnaas_nms.app_settings import app_settings
 
 _sessionmaker = None
+_redis_pools: Dict[bool, BlockingConnectionPool] = {}
+_redis_pools_pid: Optional[int] = None
+_redis_pools_lock = threading.Lock()
 
 
 def _get_session():
@@ -41,9 +47,36 @@ def sqla_execute(**kwargs):
         yield connection
 
 
+def get_redis_pool(decode_responses: bool = True) -> BlockingConnectionPool:
+    """Get the process wide redis connection pool.
+
+    A forked process (uwsgi worker or mule) gets new pools instead of
+    sharing sockets with its parent. When all connections are in use,
+    callers wait for one to be released.
+
+    Args:
+        decode_responses: Get pool for clients that decode responses to str
+    """
+    global _redis_pools_pid
+    with _redis_pools_lock:
+        if _redis_pools_pid != os.getpid():
+            _redis_pools.clear()
+            _redis_pools_pid = os.getpid()
+        if decode_responses not in _redis_pools:
+            _redis_pools[decode_responses] = BlockingConnectionPool(
+                host=app_settings.REDIS_HOSTNAME,
+                port=app_settings.REDIS_PORT,
+                max_connections=app_settings.REDIS_MAX_CONNECTIONS,
+                health_check_interval=app_settings.REDIS_HEALTH_CHECK_INTERVAL,
+                retry_on_timeout=True,
+                socket_keepalive=True,
+                encoding="utf-8",
+                decode_responses=decode_responses,
+            )
+        return _redis_pools[decode_responses]
+
+
 @contextmanager
 def redis_session(**kwargs) -> StrictRedis:
-    with StrictRedis(
-        host=app_settings.REDIS_HOSTNAME, port=app_settings.REDIS_PORT, encoding="utf-8", decode_responses=True
-    ) as conn:
+    with StrictRedis(connection_pool=get_redis_pool()) as conn:
         yield conn
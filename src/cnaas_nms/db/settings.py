@@ -2,21 +2,27 @@ import importlib
 import json
 import os
 import re
+import threading
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, List, Optional, Set, Tuple, Union
 
 import pkg_resources
-import yaml
 from pydantic import ValidationError
 from redis import StrictRedis
+from redis.exceptions import RedisError
 from redis_lru import RedisLRU
+from sqlalchemy import event, inspect
 
 from cnaas_nms.app_settings import api_settings, app_settings
 from cnaas_nms.db.device import Device, DeviceState, DeviceType
 from cnaas_nms.db.mgmtdomain import Mgmtdomain
-from cnaas_nms.db.session import redis_session, sqla_session
+from cnaas_nms.db.session import get_redis_pool, redis_session, sqla_session
 from cnaas_nms.db.settings_fields import f_groups
+from cnaas_nms.tools.cache import GenerationCounter, LocalLRUCache, StableKeyRedisLRU
 from cnaas_nms.tools.log import get_logger
 from cnaas_nms.tools.mergedict import merge_dict_origin
+from cnaas_nms.tools.process_pool import get_process_pool, reset_process_pool
+from cnaas_nms.tools.yaml_store import load_yaml_file
 
 
 def get_settings_root():
@@ -38,10 +44,18 @@ def get_settings_root():
 f_root = get_settings_root()
 
 
-redis_client = StrictRedis(
-    host=app_settings.REDIS_HOSTNAME, port=app_settings.REDIS_PORT, retry_on_timeout=True, socket_keepalive=True
-)
-redis_lru_cache = RedisLRU(redis_client, default_ttl=24 * 3600)
+# The redis client does not decode responses since values are pickled. Its
+# pool is created at import but resets itself when used in a forked process.
+redis_client = StrictRedis(connection_pool=get_redis_pool(decode_responses=False))
+redis_lru_cache = StableKeyRedisLRU(redis_client, default_ttl=24 * 3600)
+# Process local cache in front of redis_lru_cache, cleared in all processes
+# when rebuild_settings_cache increments the settings generation
+settings_generation = GenerationCounter("settings_generation")
+local_lru_cache = LocalLRUCache(settings_generation, max_size=4096)
+# VXLAN settings per managed device, saved when checking for VLAN collisions
+REDIS_SETTINGS_VXLANS_KEYNAME = "settings_vxlans"
+# Minimum number of devices to get settings for using the process pool
+PARALLEL_SETTINGS_MIN_DEVICES = 16
 
 
 class VerifyPathException(Exception):
@@ -271,13 +285,15 @@ def sizeof_fmt(num, suffix="B"):
     return f"{num:.1f}Yi{suffix}"
 
 
-def check_settings_collisions(unique_vlans: bool = True):
+def check_settings_collisions(unique_vlans: bool = True, hostnames: Optional[Set[str]] = None):
     """Check settings for any duplicates/collisions.
     This will call get_settings on all devices so make sure to not call this
     from get_settings.
 
     Args:
         unique_vlans: If enabled VLANs has to be globally unique
+        hostnames: Only get settings for these devices, VXLANs for other
+            devices are taken from the result of the last check
 
     Returns:
 
@@ -285,6 +301,16 @@ def check_settings_collisions(unique_vlans: bool = True):
     logger = get_logger()
     mgmt_vlans: Set[int] = set()
     devices_dict: dict[str, dict] = {}
+    if hostnames is not None:
+        try:
+            with redis_session() as redis:
+                saved_vxlans: Dict[str, str] = redis.hgetall(REDIS_SETTINGS_VXLANS_KEYNAME)
+        except RedisError as e:
+            logger.exception(f"Redis Error while reading saved VXLAN settings (not critical): {e}")
+            saved_vxlans = {}
+        if not saved_vxlans:
+            logger.debug("No saved VXLAN settings found, checking settings for all devices")
+            hostnames = None
     with sqla_session() as session:
         mgmtdoms = session.query(Mgmtdomain).all()
         for mgmtdom in mgmtdoms:
@@ -295,14 +321,86 @@ def check_settings_collisions(unique_vlans: bool = True):
                     )
                 mgmt_vlans.add(mgmtdom.vlan)
         managed_devices: List[Device] = session.query(Device).filter(Device.state == DeviceState.MANAGED).all()
+        check_devices: List[Tuple[str, DeviceType]] = []
         for dev in managed_devices:
-            dev_settings, _ = get_settings(dev.hostname, dev.device_type)
-            devices_dict[dev.hostname] = dev_settings
+            if hostnames is not None and dev.hostname not in hostnames and dev.hostname in saved_vxlans:
+                devices_dict[dev.hostname] = {"vxlans": json.loads(saved_vxlans[dev.hostname])}
+            else:
+                check_devices.append((dev.hostname, dev.device_type))
+    devices_dict.update(get_devices_settings(check_devices))
 
     logger.debug("Memory size of all device settings: {}".format(sizeof_fmt(json.dumps(devices_dict).__sizeof__())))
 
     check_vlan_collisions(devices_dict, mgmt_vlans, unique_vlans)
-    check_group_priority_collisions()
+    if hostnames is None:
+        check_group_priority_collisions()
+    save_settings_vxlans(devices_dict, replace=hostnames is None)
+
+
+def save_settings_vxlans(devices_dict: Dict[str, dict], replace: bool = True):
+    """Save VXLAN settings for devices that passed collision checks, used by
+    check_settings_collisions to only get settings for some devices."""
+    logger = get_logger()
+    mapping = {k: json.dumps(v.get("vxlans", {}), default=str) for k, v in devices_dict.items()}
+    try:
+        with redis_session() as redis:
+            pipe = redis.pipeline()
+            if replace:
+                pipe.delete(REDIS_SETTINGS_VXLANS_KEYNAME)
+            if mapping:
+                pipe.hset(REDIS_SETTINGS_VXLANS_KEYNAME, mapping=mapping)
+            pipe.execute()
+    except RedisError as e:
+        logger.exception(f"Redis Error while saving VXLAN settings (not critical): {e}")
+
+
+def _get_device_settings(hostname: str, device_type: DeviceType, generation: Optional[int]) -> dict:
+    """Get settings for one device in a process pool worker."""
+    if settings_generation.get() != generation:
+        # Make sure local cache of the worker is not older than the caller's
+        settings_generation.get(refresh=True)
+    settings, _ = get_settings(hostname, device_type)
+    return settings
+
+
+def get_devices_settings(devices: List[Tuple[str, DeviceType]]) -> Dict[str, dict]:
+    """Get settings for many devices, using the process pool to parse and
+    verify settings on all CPU cores.
+
+    Args:
+        devices: List of (hostname, device_type) tuples
+
+    Returns:
+        Dict with hostname as key and settings as value
+
+    Raises:
+        SettingsSyntaxError: Syntax is wrong in settings files
+        VlanConflictError: Multiple conflicting VLANs exists on same device
+    """
+    logger = get_logger()
+    ret: Dict[str, dict] = {}
+    if len(devices) >= PARALLEL_SETTINGS_MIN_DEVICES:
+        generation = settings_generation.get()
+        futures = {}
+        try:
+            pool = get_process_pool()
+            for hostname, device_type in devices:
+                if hostname in futures:
+                    continue
+                futures[hostname] = pool.submit(_get_device_settings, hostname, device_type, generation)
+            # Raise the exception for the first failed device in list order
+            for hostname, future in futures.items():
+                ret[hostname] = future.result()
+        except BrokenProcessPool:
+            logger.error("Process pool failed, getting remaining settings in this process")
+            reset_process_pool()
+        finally:
+            for future in futures.values():
+                future.cancel()
+    for hostname, device_type in devices:
+        if hostname not in ret:
+            ret[hostname], _ = get_settings(hostname, device_type)
+    return ret
 
 
 def get_internal_vlan_range(settings) -> range:
@@ -414,10 +512,9 @@ def check_group_priority_collisions(settings: Optional[dict] = None):
         priorities[group["group"]["group_priority"]] = group["group"]["name"]
 
 
-@redis_lru_cache
+@local_lru_cache
 def read_settings_file(filename):
-    with open(filename, "r") as f:
-        return yaml.safe_load(f)
+    return load_yaml_file(filename)
 
 
 def read_settings(
@@ -536,6 +633,9 @@ def get_downstream_dependencies(hostname: str, settings: dict) -> dict:
         for neighbor_dev in neighbor_devices:
             if neighbor_dev.device_type == DeviceType.ACCESS:
                 ds_hostnames.append(neighbor_dev.hostname)
+        if ds_hostnames:
+            # Don't modify vxlans dict that might be shared with cached settings
+            settings["vxlans"] = dict(settings["vxlans"])
         for ds_hostname in ds_hostnames:
             ds_settings, _ = get_settings(ds_hostname, DeviceType.ACCESS)
             for vxlan_name, vxlan_data in ds_settings["vxlans"].items():
@@ -544,6 +644,7 @@ def get_downstream_dependencies(hostname: str, settings: dict) -> dict:
     return settings
 
 
+@local_lru_cache
 @redis_lru_cache
 def get_settings(
     hostname: Optional[str] = None, device_type: Optional[DeviceType] = None, device_model: Optional[str] = None
@@ -562,8 +663,7 @@ def get_settings(
 
     # 1. Get CNaaS-NMS default settings
     data_dir = pkg_resources.resource_filename(__name__, "data")
-    with open(os.path.join(data_dir, "default_settings.yml"), "r") as f_default_settings:
-        settings: dict = yaml.safe_load(f_default_settings)
+    settings: dict = load_yaml_file(os.path.join(data_dir, "default_settings.yml"))
 
     settings_origin = {}
     for k in settings.keys():
@@ -702,6 +802,7 @@ def get_settings(
     return verified_settings, settings_origin
 
 
+@local_lru_cache
 @redis_lru_cache
 def get_group_settings() -> Tuple[dict, dict]:
     logger = get_logger()
@@ -716,37 +817,150 @@ def get_group_settings() -> Tuple[dict, dict]:
         raise e
 
     data_dir = pkg_resources.resource_filename(__name__, "data")
-    with open(os.path.join(data_dir, "default_groups.yml"), "r") as f_default_settings:
-        default_settings: dict = yaml.safe_load(f_default_settings)
+    default_settings: dict = load_yaml_file(os.path.join(data_dir, "default_groups.yml"))
 
     settings, settings_origin = read_settings(
         local_repo_path, ["global", "groups.yml"], "global", settings, settings_origin
     )
-    settings["groups"] += default_settings["groups"]
+    settings["groups"] = settings["groups"] + default_settings["groups"]
     check_settings_syntax(settings, settings_origin)
     return f_groups(**settings).model_dump(), settings_origin
 
 
-@redis_lru_cache
-def get_groups(hostname: Optional[str] = None) -> List[str]:
-    """Return list of names for valid groups."""
-    groups = []
-    settings, origin = get_group_settings()
-    if not settings:
-        return groups
-    if not settings.get("groups", None):
-        return groups
-    for group in settings["groups"]:
-        if "name" not in group["group"]:
-            continue
-        if hostname:
-            if "regex" not in group["group"]:
+class GroupIndex:
+    """Group memberships for devices, using precompiled group regexes.
+
+    An index is valid for one settings generation. Memberships are computed
+    once per hostname, on first lookup or when the list of devices is loaded
+    from the database. Devices that are added, renamed or deleted in this
+    process are updated incrementally by mapper events.
+    """
+
+    def __init__(self, generation: Optional[int], group_regexes: List[Tuple[str, Optional[re.Pattern]]]):
+        self.generation = generation
+        self.group_names: List[str] = [name for name, _ in group_regexes]
+        self.group_regexes = [(name, regex) for name, regex in group_regexes if regex is not None]
+        self.hostname_groups: Dict[str, List[str]] = {}
+        self.group_hostnames: Dict[str, Set[str]] = {name: set() for name in self.group_names}
+        self.device_hostnames: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, generation: Optional[int], settings: dict) -> "GroupIndex":
+        group_regexes: List[Tuple[str, Optional[re.Pattern]]] = []
+        for group in settings.get("groups", None) or []:
+            if "name" not in group["group"]:
                 continue
-            # TODO: try and catch, report what regex failed
-            if not re.match(group["group"]["regex"], hostname):
+            if "regex" not in group["group"]:
+                group_regexes.append((group["group"]["name"], None))
                 continue
-        groups.append(group["group"]["name"])
-    return groups
+            try:
+                group_regexes.append((group["group"]["name"], re.compile(group["group"]["regex"])))
+            except re.error as e:
+                raise SettingsSyntaxError(
+                    "Invalid regex for group {}: {}".format(group["group"]["name"], group["group"]["regex"])
+                ) from e
+        return cls(generation, group_regexes)
+
+    def _match(self, hostname: str) -> List[str]:
+        return [name for name, regex in self.group_regexes if regex.match(hostname)]
+
+    def get_groups(self, hostname: str) -> List[str]:
+        with self._lock:
+            if hostname not in self.hostname_groups:
+                self.hostname_groups[hostname] = self._match(hostname)
+            return list(self.hostname_groups[hostname])
+
+    def get_hostnames(self, group_name: str) -> Set[str]:
+        """Return hostnames of devices that are members of group."""
+        with self._lock:
+            return set(self.group_hostnames.get(group_name, set()))
+
+    def get_device_hostnames(self) -> Set[str]:
+        with self._lock:
+            return set(self.device_hostnames)
+
+    def add_device(self, hostname: str):
+        with self._lock:
+            if hostname in self.device_hostnames:
+                return
+            if hostname not in self.hostname_groups:
+                self.hostname_groups[hostname] = self._match(hostname)
+            self.device_hostnames.add(hostname)
+            for group_name in self.hostname_groups[hostname]:
+                self.group_hostnames[group_name].add(hostname)
+
+    def remove_device(self, hostname: str):
+        with self._lock:
+            if hostname not in self.device_hostnames:
+                return
+            self.device_hostnames.discard(hostname)
+            for group_name in self.hostname_groups.get(hostname, []):
+                self.group_hostnames[group_name].discard(hostname)
+
+    def set_devices(self, hostnames: Set[str]):
+        """Update index to contain exactly the devices with these hostnames."""
+        device_hostnames = self.get_device_hostnames()
+        for hostname in device_hostnames - hostnames:
+            self.remove_device(hostname)
+        for hostname in hostnames - device_hostnames:
+            self.add_device(hostname)
+
+
+_group_index: Optional[GroupIndex] = None
+_group_index_lock = threading.Lock()
+
+
+def get_group_index(with_devices: bool = False) -> GroupIndex:
+    """Get group index for the current settings generation.
+
+    Args:
+        with_devices: Make sure memberships are up to date with all devices
+            in the database, also devices added or removed by other processes
+    """
+    global _group_index
+    generation = settings_generation.get()
+    with _group_index_lock:
+        index = _group_index
+        if index is None or generation is None or index.generation != generation:
+            settings, _ = get_group_settings()
+            index = GroupIndex.from_settings(generation, settings or {})
+            _group_index = index
+    if with_devices:
+        with sqla_session() as session:
+            index.set_devices({hostname for (hostname,) in session.query(Device.hostname)})
+    return index
+
+
+@event.listens_for(Device, "after_insert")
+def after_insert_device_groups(mapper, connection, target: Device):
+    if _group_index is not None and target.hostname:
+        _group_index.add_device(target.hostname)
+
+
+@event.listens_for(Device, "after_update")
+def after_update_device_groups(mapper, connection, target: Device):
+    if _group_index is None:
+        return
+    history = inspect(target).attrs.hostname.history
+    if history.has_changes():
+        for hostname in history.deleted:
+            _group_index.remove_device(hostname)
+        if target.hostname:
+            _group_index.add_device(target.hostname)
+
+
+@event.listens_for(Device, "after_delete")
+def after_delete_device_groups(mapper, connection, target: Device):
+    if _group_index is not None and target.hostname:
+        _group_index.remove_device(target.hostname)
+
+
+def get_groups(hostname: Optional[str] = None) -> List[str]:
+    """Return list of names for valid groups."""
+    if hostname:
+        return get_group_index().get_groups(hostname)
+    return list(get_group_index().group_names)
 
 
 def get_group_regex(group_name: str) -> Optional[str]:
@@ -814,12 +1028,11 @@ def parse_device_primary_groups() -> Dict[str, str]:
     """Returns a dict with {hostname: primary_group} from settings"""
     groups_priorities_sorted = get_groups_priorities_sorted()
     device_primary_group: Dict[str, str] = {}
-    with sqla_session() as session:
-        devices: List[Device] = session.query(Device).all()
-        for dev in devices:
-            groups = get_groups(dev.hostname)
-            primary_group: str = find_primary_group(groups, groups_priorities_sorted)
-            device_primary_group[dev.hostname] = primary_group
+    group_index = get_group_index(with_devices=True)
+    for hostname in group_index.get_device_hostnames():
+        groups = group_index.get_groups(hostname)
+        primary_group: str = find_primary_group(groups, groups_priorities_sorted)
+        device_primary_group[hostname] = primary_group
     return device_primary_group
 
 
@@ -853,19 +1066,107 @@ def get_device_primary_groups(no_cache: bool = False) -> Dict[str, str]:
     return device_primary_group
 
 
-def rebuild_settings_cache() -> None:
+def get_settings_dependents(changed_files: Set[str]) -> Optional[Tuple[Set[DeviceType], Set[str]]]:
+    """Find device types and hostnames with settings that depend on any of
+    the changed files in the settings repository.
+
+    Args:
+        changed_files: Filenames relative to settings repository root
+
+    Returns:
+        device types, hostnames or None if global settings has changed
+    """
+    devtypes: Set[DeviceType] = set()
+    hostnames: Set[str] = set()
+    for filename in changed_files:
+        path = filename.split(os.path.sep)
+        if path[0] not in DIR_STRUCTURE:
+            continue
+        elif path[0] == "global":
+            return None
+        elif path[0] == "fabric":
+            devtypes.update({DeviceType.DIST, DeviceType.CORE})
+        elif path[0] in ["access", "dist", "core"]:
+            devtypes.add(DeviceType[path[0].upper()])
+        elif path[0] == "devices" and len(path) > 1:
+            hostnames.add(path[1])
+        elif path[0] == "groups" and len(path) > 1:
+            for hostname, primary_group in get_device_primary_groups().items():
+                if primary_group == path[1]:
+                    hostnames.add(hostname)
+    return devtypes, hostnames
+
+
+def update_settings_cache(devtypes: Set[DeviceType], hostnames: Set[str]) -> None:
+    """Invalidate cached settings for device types and hostnames that depend
+    on changed files, and check VLAN collisions for affected devices.
+
+    Raises:
+        SettingsSyntaxError: Syntax is wrong in settings files
+        VlanConflictError: Multiple conflicting VLANs exists on same device
+    """
+    logger = get_logger()
+    devtypes = set(devtypes)
+    hostnames = set(hostnames)
+    with sqla_session() as session:
+        # DIST settings include VXLANs from downstream ACCESS devices
+        if DeviceType.ACCESS in devtypes:
+            devtypes.add(DeviceType.DIST)
+        access_devices = (
+            session.query(Device)
+            .filter(Device.hostname.in_(list(hostnames)), Device.device_type == DeviceType.ACCESS)
+            .all()
+        )
+        for dev in access_devices:
+            hostnames.update([x.hostname for x in dev.get_neighbors(session) if x.device_type == DeviceType.DIST])
+        affected_hostnames = set(hostnames)
+        if devtypes:
+            for (hostname,) in session.query(Device.hostname).filter(Device.device_type.in_(list(devtypes))):
+                affected_hostnames.add(hostname)
+
+    logger.debug(
+        "Invalidating settings cache for devicetypes {} and hostnames {}".format(
+            ", ".join([dt.name for dt in devtypes]) or "None", ", ".join(hostnames) or "None"
+        )
+    )
+    deleted = 0
+    for devtype in devtypes:
+        deleted += redis_lru_cache.delete_matching(get_settings, device_type=devtype)
+    for hostname in hostnames:
+        deleted += redis_lru_cache.delete_matching(get_settings, hostname=hostname)
+    settings_generation.bump()
+    logger.debug("Deleted {} settings cache entries".format(deleted))
+
+    for devtype in devtypes:
+        get_settings(device_type=devtype)
+    logger.debug("Rechecking settings collisions for {} devices".format(len(affected_hostnames)))
+    check_settings_collisions(api_settings.GLOBAL_UNIQUE_VLANS, hostnames=affected_hostnames)
+
+
+def rebuild_settings_cache(changed_files: Optional[Set[str]] = None) -> None:
     """Clear cache and rebuild for devicetypes.
 
+    Args:
+        changed_files: Optional set of changed filenames relative to settings
+            repository root. Only settings depending on these files will be
+            rebuilt, unless global settings has changed.
+
     Raises:
         SettingsSyntaxError: Syntax is wrong in settings files
         VlanConflictError: Multiple conflicting VLANs exists on same device
     """
     logger = get_logger()
+    if changed_files is not None:
+        dependents = get_settings_dependents(changed_files)
+        if dependents is not None:
+            update_settings_cache(*dependents)
+            return
     logger.debug("Clearing redis-lru cache for settings")
     with redis_session() as redis_db:
         mem_stats_before = redis_db.memory_stats()
         cache = RedisLRU(redis_db)
         cache.clear_all_cache()
+        settings_generation.bump()
         mem_stats_after = redis_db.memory_stats()
         try:
             logger.debug(
@@ -886,6 +1187,7 @@ def rebuild_settings_cache() -> None:
     for devtype in test_devtypes:
         get_settings(device_type=devtype)
     logger.debug("Rebuilding settings cache for device specific settings")
+    devices: List[Tuple[str, DeviceType]] = []
     with sqla_session() as session:
         for hostname in os.listdir(os.path.join(app_settings.SETTINGS_LOCAL, "devices")):
             hostname_path = os.path.join(app_settings.SETTINGS_LOCAL, "devices", hostname)
@@ -897,7 +1199,8 @@ def rebuild_settings_cache() -> None:
             if dev is None or dev.device_type == DeviceType.UNKNOWN:
                 logger.warning(f"Device {hostname} specified in settings/devices but it was not found in database")
                 continue
-            get_settings(hostname, dev.device_type)
+            devices.append((hostname, dev.device_type))
+    get_devices_settings(devices)
     logger.debug("Rebuilding settings cache for device models")
     for devtype_str, device_models in get_model_specific_configfiles(True).items():
         devtype = DeviceType[devtype_str]
@@ -0,0 +1,114 @@
+import unittest
+from ipaddress import IPv4Address
+
+import pytest
+
+from cnaas_nms.db.device import Device, DeviceState, DeviceType
+from cnaas_nms.db.inventory_cache import inventory_cache
+from cnaas_nms.db.session import sqla_session
+from cnaas_nms.devicehandler.nornir_helper import select_hostnames
+
+
+@pytest.mark.integration
+class InventoryCacheTests(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def requirements(self, postgresql, redis):
+        """Ensures the required pytest fixtures are loaded implicitly for all these tests"""
+        pass
+
+    def cleandb(self):
+        with sqla_session() as session:
+            for hostname in ["test-inventory1", "test-inventory2"]:
+                device = session.query(Device).filter(Device.hostname == hostname).one_or_none()
+                if device:
+                    session.delete(device)
+                    session.commit()
+
+    def setUp(self):
+        self.cleandb()
+
+    def tearDown(self):
+        self.cleandb()
+
+    def get_hostnames(self):
+        return [dev.hostname for dev in inventory_cache.get_devices(["test-inventory1", "test-inventory2"])]
+
+    def test_device_changes(self):
+        self.assertEqual(self.get_hostnames(), [])
+        with sqla_session() as session:
+            session.add(
+                Device(
+                    ztp_mac="08002708a8be",
+                    hostname="test-inventory1",
+                    platform="eos",
+                    management_ip=IPv4Address("10.0.1.22"),
+                    state=DeviceState.MANAGED,
+                    device_type=DeviceType.ACCESS,
+                    synchronized=False,
+                )
+            )
+        self.assertEqual(self.get_hostnames(), ["test-inventory1"])
+        generation = inventory_cache.generation
+
+        with sqla_session() as session:
+            dev: Device = session.query(Device).filter(Device.hostname == "test-inventory1").one()
+            dev.hostname = "test-inventory2"
+            dev.synchronized = True
+        self.assertEqual(self.get_hostnames(), ["test-inventory2"])
+        self.assertTrue(inventory_cache.get_devices(["test-inventory2"])[0].synchronized)
+        # Changes from this process are applied without reloading
+        self.assertEqual(inventory_cache.generation, generation + 1)
+
+        with sqla_session() as session:
+            dev: Device = session.query(Device).filter(Device.hostname == "test-inventory2").one()
+            session.delete(dev)
+        self.assertEqual(self.get_hostnames(), [])
+
+    def test_bulk_update(self):
+        with sqla_session() as session:
+            session.add(
+                Device(
+                    ztp_mac="08002708a8be",
+                    hostname="test-inventory1",
+                    platform="eos",
+                    state=DeviceState.MANAGED,
+                    device_type=DeviceType.ACCESS,
+                    synchronized=True,
+                )
+            )
+        self.assertTrue(inventory_cache.get_devices(["test-inventory1"])[0].synchronized)
+        self.assertNotIn("test-inventory1", select_hostnames(resync=False, device_type="ACCESS").hostnames)
+        with sqla_session() as session:
+            # Bulk update like the one done when config hash check fails, bypasses mapper events
+            session.query(Device).filter(Device.hostname.in_(["test-inventory1"])).update(
+                {Device.synchronized: False}, synchronize_session=False
+            )
+        self.assertFalse(inventory_cache.get_devices(["test-inventory1"])[0].synchronized)
+        self.assertIn("test-inventory1", select_hostnames(resync=False, device_type="ACCESS").hostnames)
+
+    def test_select_hostnames(self):
+        with sqla_session() as session:
+            for hostname, ztp_mac, synchronized in [
+                ("test-inventory1", "08002708a8be", True),
+                ("test-inventory2", "08002708a8bf", False),
+            ]:
+                session.add(
+                    Device(
+                        ztp_mac=ztp_mac,
+                        hostname=hostname,
+                        platform="eos",
+                        state=DeviceState.MANAGED,
+                        device_type=DeviceType.ACCESS,
+                        synchronized=synchronized,
+                    )
+                )
+        selection = select_hostnames(hostname=["test-inventory2", "test-inventory1", "test-inventory2"])
+        self.assertEqual(selection.hostnames, ["test-inventory2", "test-inventory1"])
+        selection = select_hostnames(resync=False, device_type="ACCESS")
+        self.assertIn("test-inventory2", selection.hostnames)
+        self.assertNotIn("test-inventory1", selection.hostnames)
+        self.assertIn("test-inventory1", selection.skipped_hostnames)
+
+
+if __name__ == "__main__":
+    unittest.main()
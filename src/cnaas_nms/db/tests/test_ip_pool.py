@@ -0,0 +1,27 @@
+import unittest
+from ipaddress import IPv4Address, IPv4Network, IPv6Address, IPv6Network
+
+from cnaas_nms.db.ip_pool import IPPool
+
+
+class IPPoolTests(unittest.TestCase):
+    def test_next_free_host(self):
+        pool = IPPool(IPv4Network("10.0.6.0/24"), skip=5, hosts_only=True)
+        pool.load([IPv4Address("10.0.6.6"), IPv4Address("10.0.6.8"), IPv4Address("10.0.7.6"), None])
+        self.assertEqual(pool.next_free(), IPv4Address("10.0.6.7"))
+        pool.load([IPv4Address("10.0.6.{}".format(i)) for i in range(6, 255)])
+        self.assertIsNone(pool.next_free())
+
+    def test_next_free_network(self):
+        pool = IPPool(IPv4Network("10.198.0.0/16"), new_prefix=31)
+        pool.load(["10.198.0.0/31", "10.198.0.2/31", "10.198.0.6/31"])
+        self.assertEqual(pool.next_free(), IPv4Network("10.198.0.4/31"))
+
+    def test_next_free_ipv6(self):
+        pool = IPPool(IPv6Network("fe80::/64"), hosts_only=True)
+        pool.load([IPv6Address("fe80::1"), IPv6Address("fe80::ffff:ffff:ffff:fff0")])
+        self.assertEqual(pool.next_free(), IPv6Address("fe80::2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+
+import pytest
+
+from cnaas_nms.db.job import Job, JobStatus
+from cnaas_nms.db.session import sqla_session
+
+
+@pytest.mark.integration
+class JobTests(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def requirements(self, postgresql, redis):
+        """Ensures the required pytest fixtures are loaded implicitly for all these tests"""
+        pass
+
+    def setUp(self):
+        with sqla_session() as session:
+            job = Job()
+            session.add(job)
+            session.flush()
+            job.start_job(function_name="test_wait")
+            self.job_id = job.id
+
+    def tearDown(self):
+        with sqla_session() as session:
+            session.query(Job).filter(Job.id == self.job_id).delete()
+
+    def finish_job(self):
+        time.sleep(0.5)
+        with sqla_session() as session:
+            job = session.query(Job).filter(Job.id == self.job_id).one()
+            job.finish_abort("test")
+
+    def test_wait_for_job_completion(self):
+        thread = threading.Thread(target=self.finish_job)
+        start_time = time.time()
+        thread.start()
+        with sqla_session() as session:
+            Job.wait_for_job_completion(session, self.job_id, timeout=5)
+            job = session.query(Job).filter(Job.id == self.job_id).one()
+            self.assertEqual(job.status, JobStatus.ABORTED)
+        # Woken up by notification instead of polling interval
+        self.assertLess(time.time() - start_time, 5)
+        thread.join()
+
+    def test_wait_without_session(self):
+        thread = threading.Thread(target=self.finish_job)
+        thread.start()
+        Job.wait_for_job_completion(None, self.job_id, timeout=5)
+        with sqla_session() as session:
+            job = session.query(Job).filter(Job.id == self.job_id).one()
+            self.assertEqual(job.status, JobStatus.ABORTED)
+        thread.join()
+        # Missing job returns immediately
+        Job.wait_for_job_completion(None, -1, timeout=5)
+
+    def test_wait_timeout(self):
+        with sqla_session() as session:
+            with self.assertRaises(TimeoutError):
+                Job.wait_for_job_completion(session, self.job_id, timeout=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
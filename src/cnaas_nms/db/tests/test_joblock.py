@@ -0,0 +1,47 @@
+import unittest
+
+import pytest
+
+from cnaas_nms.db.job import Job
+from cnaas_nms.db.joblock import JoblockDevice, JoblockError
+from cnaas_nms.db.session import sqla_session
+
+
+@pytest.mark.integration
+class JoblockDeviceTests(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def requirements(self, postgresql, redis):
+        """Ensures the required pytest fixtures are loaded implicitly for all these tests"""
+        pass
+
+    def setUp(self):
+        self.job_ids = []
+        with sqla_session() as session:
+            for _ in range(3):
+                job = Job()
+                session.add(job)
+                session.flush()
+                job.start_job(function_name="test_joblock")
+                self.job_ids.append(job.id)
+
+    def tearDown(self):
+        with sqla_session() as session:
+            for job_id in self.job_ids:
+                JoblockDevice.release_locks(session, job_id)
+            session.query(Job).filter(Job.id.in_(self.job_ids)).delete()
+
+    def test_overlapping_devices(self):
+        job_a, job_b, job_c = self.job_ids
+        with sqla_session() as session:
+            self.assertEqual(JoblockDevice.try_acquire_locks(session, ["locktest1", "locktest2"], job_a), set())
+            self.assertEqual(JoblockDevice.try_acquire_locks(session, ["locktest2", "locktest3"], job_b), {job_a})
+            # Disjoint set of devices can be locked while job_a holds its locks
+            self.assertEqual(JoblockDevice.try_acquire_locks(session, ["locktest3"], job_c), set())
+            with self.assertRaises(JoblockError):
+                JoblockDevice.acquire_locks(session, ["locktest1"], job_b, timeout=1)
+            self.assertEqual(JoblockDevice.release_locks(session, job_a), 2)
+            self.assertEqual(JoblockDevice.try_acquire_locks(session, ["locktest1", "locktest2"], job_b), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -130,6 +130,19 @@ class MgmtdomainTests(unittest.TestCase):
             mgmtdomain = cnaas_nms.db.helper.find_mgmtdomain_by_ip(session, IPv4Address("10.0.6.6"))
             self.assertEqual(IPv4Interface(mgmtdomain.ipv4_gw).network, IPv4Network("10.0.6.0/24"))
 
+    def test_find_mgmtdomain_by_ip_after_change(self):
+        with sqla_session() as session:
+            mgmtdomain = cnaas_nms.db.helper.find_mgmtdomain_by_ip(session, IPv4Address("10.0.66.6"))
+            self.assertEqual(mgmtdomain.ipv4_gw, self.testdata["mgmtdomain_ipv4_gw"])
+            mgmtdomain.ipv4_gw = "10.0.67.1/24"
+            session.commit()
+            self.assertIsNone(cnaas_nms.db.helper.find_mgmtdomain_by_ip(session, IPv4Address("10.0.66.6")))
+            self.assertEqual(
+                cnaas_nms.db.helper.find_mgmtdomain_by_ip(session, IPv4Address("10.0.67.6")).id, mgmtdomain.id
+            )
+            mgmtdomain.ipv4_gw = self.testdata["mgmtdomain_ipv4_gw"]
+            session.commit()
+
 
 if __name__ == "__main__":
     unittest.main()
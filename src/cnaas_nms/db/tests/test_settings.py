@@ -8,13 +8,18 @@ import yaml
 from cnaas_nms.db.device import DeviceType
 from cnaas_nms.db.settings import (
     DIR_STRUCTURE,
+    PARALLEL_SETTINGS_MIN_DEVICES,
+    GroupIndex,
+    SettingsSyntaxError,
     VerifyPathException,
     VlanConflictError,
     check_group_priority_collisions,
     check_vlan_collisions,
     get_device_primary_groups,
+    get_devices_settings,
     get_groups_priorities_sorted,
     get_settings,
+    get_settings_dependents,
     verify_dir_structure,
 )
 
@@ -49,6 +54,46 @@ class SettingsTests(unittest.TestCase):
         # Assert that all required settings are set
         self.assertTrue(all(k in settings for k in self.required_setting_keys))
 
+    @pytest.mark.integration
+    def test_get_devices_settings(self):
+        hostname = self.testdata["testdevice"]
+        settings, _ = get_settings(hostname, DeviceType.DIST)
+        devices = [(hostname, DeviceType.DIST)] * PARALLEL_SETTINGS_MIN_DEVICES
+        self.assertEqual(get_devices_settings(devices), {hostname: settings})
+
+    def test_get_settings_dependents(self):
+        self.assertIsNone(get_settings_dependents({"devices/eosdist1/routing.yml", "global/vxlans.yml"}))
+        devtypes, hostnames = get_settings_dependents(
+            {"fabric/base_system.yml", "devices/eosdist1/interfaces.yml", "README.md"}
+        )
+        self.assertEqual(devtypes, {DeviceType.DIST, DeviceType.CORE})
+        self.assertEqual(hostnames, {"eosdist1"})
+
+    def test_group_index(self):
+        settings = {
+            "groups": [
+                {"group": {"name": "ACCESS", "regex": "^eosaccess", "group_priority": 0}},
+                {"group": {"name": "ODD", "regex": ".*[13579]$", "group_priority": 0}},
+                {"group": {"name": "DEFAULT", "regex": ".*", "group_priority": 1}},
+            ]
+        }
+        index = GroupIndex.from_settings(1, settings)
+        self.assertEqual(index.group_names, ["ACCESS", "ODD", "DEFAULT"])
+        self.assertEqual(index.get_groups("eosaccess1"), ["ACCESS", "ODD", "DEFAULT"])
+        index.set_devices({"eosaccess1", "eosaccess2", "eosdist1"})
+        self.assertEqual(index.get_hostnames("ACCESS"), {"eosaccess1", "eosaccess2"})
+        self.assertEqual(index.get_hostnames("ODD"), {"eosaccess1", "eosdist1"})
+        index.remove_device("eosaccess1")
+        index.add_device("eosaccess3")
+        self.assertEqual(index.get_hostnames("ACCESS"), {"eosaccess2", "eosaccess3"})
+        index.set_devices({"eosdist1"})
+        self.assertEqual(index.get_hostnames("ACCESS"), set())
+        self.assertEqual(index.get_hostnames("DEFAULT"), {"eosdist1"})
+
+        settings["groups"][0]["group"]["regex"] = "^eos("
+        with self.assertRaises(SettingsSyntaxError):
+            GroupIndex.from_settings(2, settings)
+
     def test_settings_pathverification(self):
         # Assert that directory structure is actually verified by making sure an
         # is raised when looking in the filesystem root
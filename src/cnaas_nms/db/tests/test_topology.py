@@ -0,0 +1,98 @@
+import unittest
+from ipaddress import IPv4Address
+
+import pytest
+
+from cnaas_nms.db.device import Device, DeviceState, DeviceType
+from cnaas_nms.db.linknet import Linknet
+from cnaas_nms.db.session import sqla_session
+from cnaas_nms.db.topology import TopologyIndex, TopologySnapshot, get_topology_index, topology_index
+
+
+@pytest.mark.integration
+class TopologyTests(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def requirements(self, postgresql):
+        """Ensures the required pytest fixtures are loaded implicitly for all these tests"""
+        pass
+
+    def cleandb(self):
+        with sqla_session() as session:
+            for hostname in ["test-topo1", "test-topo2"]:
+                device = session.query(Device).filter(Device.hostname == hostname).one_or_none()
+                if device:
+                    session.delete(device)
+                    session.commit()
+
+    def setUp(self):
+        self.cleandb()
+
+    def tearDown(self):
+        self.cleandb()
+
+    @classmethod
+    def create_test_device(cls, hostname: str):
+        return Device(
+            ztp_mac="08002708a8be",
+            hostname=hostname,
+            platform="eos",
+            management_ip=IPv4Address("10.0.1.22"),
+            state=DeviceState.MANAGED,
+            device_type=DeviceType.DIST,
+        )
+
+    def test_snapshot_matches_device_lookups(self):
+        device1 = self.create_test_device("test-topo1")
+        device2 = self.create_test_device("test-topo2")
+        with sqla_session() as session:
+            session.add(device1)
+            session.add(device2)
+            test_linknet = Linknet(device_a=device1, device_b=device2, device_a_port="Ethernet1")
+            session.add(test_linknet)
+            session.flush()
+            snapshot = TopologySnapshot.load(session, ["test-topo1"])
+            self.assertEqual(list(device1.get_neighbors(session)), snapshot.get_neighbors(device1))
+            self.assertEqual(device1.get_links_to(session, device2), snapshot.get_links_to(device1, device2))
+            self.assertEqual(
+                device1.get_linknet_localif_mapping(session), snapshot.get_linknet_localif_mapping(device1)
+            )
+            self.assertIn("test-topo2", snapshot.devices_by_hostname)
+            with self.assertRaises(ValueError):
+                snapshot.get_neighbors(device2)
+
+    def test_index_matches_device_lookups(self):
+        device1 = self.create_test_device("test-topo1")
+        device2 = self.create_test_device("test-topo2")
+        with sqla_session() as session:
+            session.add(device1)
+            session.add(device2)
+            test_linknet = Linknet(device_a=device1, device_b=device2, device_a_port="Ethernet1")
+            session.add(test_linknet)
+            session.flush()
+            neighbors = device1.get_neighbors(session)
+            links_to = device1.get_links_to(session, device2)
+            localif_mapping = device1.get_linknet_localif_mapping(session)
+            with topology_index(session, TopologyIndex.build(session, [device1.id])) as index:
+                self.assertIn(device2.id, index.devices)
+                self.assertFalse(index.covers(device2.id))
+                self.assertEqual(neighbors, device1.get_neighbors(session))
+                self.assertEqual(links_to, device1.get_links_to(session, device2))
+                self.assertEqual(localif_mapping, device1.get_linknet_localif_mapping(session))
+            self.assertIsNone(get_topology_index(session))
+
+    def test_index_invalidated_by_linknet_change(self):
+        device1 = self.create_test_device("test-topo1")
+        device2 = self.create_test_device("test-topo2")
+        with sqla_session() as session:
+            session.add(device1)
+            session.add(device2)
+            session.flush()
+            with topology_index(session, TopologyIndex.build(session, [device1.id])) as index:
+                self.assertEqual([], device1.get_linknets(session))
+                test_linknet = Linknet(device_a=device1, device_b=device2, device_a_port="Ethernet1")
+                session.add(test_linknet)
+                # Pending changes are not flushed by the index lookup
+                self.assertIsNone(get_topology_index(session))
+                self.assertIn(test_linknet, session.new)
+                self.assertEqual([test_linknet], device1.get_linknets(session))
+                self.assertIsNot(index, get_topology_index(session))
@@ -0,0 +1,337 @@
+"""Topology lookups used when populating template variables.
+
+TopologyIndex is an in-memory index of the linknets of a set of devices,
+built with a few bulk queries. It is installed on a sqlalchemy session with
+the topology_index context manager. While it is installed, neighbor and
+linknet lookups on Device objects from that session are answered from
+memory for the devices the index covers, and queried from the database as
+usual for other devices. Inserts, updates and deletes of devices, linknets
+and interfaces invalidate all indexes, which are then rebuilt on next use.
+
+LiveTopology and TopologySnapshot provide the lookups for
+populate_device_vars, either by querying the database directly or from a
+snapshot loaded for a set of devices.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+from contextlib import contextmanager
+from ipaddress import IPv4Address
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
+
+from cnaas_nms.db.mgmtdomain_index import get_mgmtdomain_index
+from cnaas_nms.tools.log import get_logger
+
+if TYPE_CHECKING:
+    from cnaas_nms.db.device import Device
+    from cnaas_nms.db.interface import Interface, InterfaceConfigType
+    from cnaas_nms.db.linknet import Linknet
+    from cnaas_nms.db.mgmtdomain import Mgmtdomain
+
+SESSION_INFO_KEY = "topology_index"
+
+_generation_counter = itertools.count(1)
+_generation_lock = threading.Lock()
+_generation: int = 0
+
+
+def get_topology_generation() -> int:
+    return _generation
+
+
+def invalidate_topology_index():
+    """Mark all topology indexes in this process as outdated."""
+    global _generation
+    with _generation_lock:
+        _generation = next(_generation_counter)
+
+
+class TopologyIndex:
+    """Adjacency structure keyed by device id, holding linknets and peer devices
+    of a set of devices."""
+
+    def __init__(self, generation: int, device_ids: Iterable[int]):
+        self.generation = generation
+        self.device_ids: Set[int] = set(device_ids)
+        self.devices: Dict[int, Device] = {}
+        self.linknets: Dict[int, List[Linknet]] = {device_id: [] for device_id in self.device_ids}
+        self.interfaces: Dict[int, List[Interface]] = {}
+
+    @classmethod
+    def build(cls, session, device_ids: Iterable[int]) -> TopologyIndex:
+        """Load linknets and MLAG/uplink interfaces of devices with device_ids,
+        and the devices together with their neighbors."""
+        from cnaas_nms.db.device import Device
+        from cnaas_nms.db.interface import Interface, InterfaceConfigType
+        from cnaas_nms.db.linknet import Linknet
+
+        index = cls(get_topology_generation(), device_ids)
+        if not index.device_ids:
+            return index
+        selected_ids = list(index.device_ids)
+        related_ids: Set[int] = set(selected_ids)
+        linknet: Linknet
+        for linknet in (
+            session.query(Linknet)
+            .filter(Linknet.device_a_id.in_(selected_ids) | Linknet.device_b_id.in_(selected_ids))
+            .all()
+        ):
+            for device_id in (linknet.device_a_id, linknet.device_b_id):
+                if device_id in index.linknets:
+                    index.linknets[device_id].append(linknet)
+                if device_id is not None:
+                    related_ids.add(device_id)
+        for dev in session.query(Device).filter(Device.id.in_(list(related_ids))).all():
+            index.devices[dev.id] = dev
+        # Only interface types that Device methods look up through the index
+        indexed_configtypes = [InterfaceConfigType.MLAG_PEER, InterfaceConfigType.ACCESS_UPLINK]
+        intf: Interface
+        for intf in (
+            session.query(Interface)
+            .filter(Interface.device_id.in_(selected_ids))
+            .filter(Interface.configtype.in_(indexed_configtypes))
+            .all()
+        ):
+            index.interfaces.setdefault(intf.device_id, []).append(intf)
+        return index
+
+    def covers(self, device_id: int) -> bool:
+        """Return True if linknets and interfaces of device_id are loaded in the index."""
+        return device_id in self.device_ids
+
+    def get_linknets(self, device_id: int) -> List[Linknet]:
+        return list(self.linknets.get(device_id, []))
+
+    def get_peer(self, linknet: Linknet, device_id: int) -> Device:
+        if linknet.device_a_id == device_id:
+            return self.devices[linknet.device_b_id]
+        else:
+            return self.devices[linknet.device_a_id]
+
+    def get_neighbors(self, device_id: int) -> List[Device]:
+        ret: List[Device] = []
+        for linknet in self.linknets.get(device_id, []):
+            peer = self.get_peer(linknet, device_id)
+            if peer not in ret:
+                ret.append(peer)
+        return ret
+
+    def get_links_to(self, device_id: int, peer_device_id: int) -> List[Linknet]:
+        return [
+            linknet
+            for linknet in self.linknets.get(device_id, [])
+            if (linknet.device_a_id == device_id and linknet.device_b_id == peer_device_id)
+            or (linknet.device_b_id == device_id and linknet.device_a_id == peer_device_id)
+        ]
+
+    def get_linknet_localif_mapping(self, device_id: int) -> Dict[str, str]:
+        ret = {}
+        for linknet in self.linknets.get(device_id, []):
+            if linknet.device_a_id == device_id:
+                ret[linknet.device_a_port] = self.devices[linknet.device_b_id].hostname
+            else:
+                ret[linknet.device_b_port] = self.devices[linknet.device_a_id].hostname
+        return ret
+
+    def get_interfaces(self, device_id: int, configtype: InterfaceConfigType) -> List[Interface]:
+        return [x for x in self.interfaces.get(device_id, []) if x.configtype == configtype]
+
+
+def get_topology_index(session) -> Optional[TopologyIndex]:
+    """Return the topology index installed on session, rebuilt if it has
+    been invalidated, or None if no index is installed or the session has
+    pending changes."""
+    if SESSION_INFO_KEY not in session.info:
+        return None
+    if session.new or session.dirty or session.deleted:
+        # Pending changes are not in the index, callers use database queries
+        # instead, which flush the changes as usual
+        return None
+    index: TopologyIndex = session.info[SESSION_INFO_KEY]
+    if index.generation != get_topology_generation():
+        index = TopologyIndex.build(session, index.device_ids)
+        session.info[SESSION_INFO_KEY] = index
+    return index
+
+
+@contextmanager
+def topology_index(session, index: TopologyIndex):
+    """Install a topology index on session for the duration of the context.
+    If an index is already installed on session it is kept."""
+    installed = SESSION_INFO_KEY in session.info
+    if not installed:
+        session.info[SESSION_INFO_KEY] = index
+    try:
+        yield get_topology_index(session)
+    finally:
+        if not installed:
+            session.info.pop(SESSION_INFO_KEY, None)
+
+
+class LiveTopology:
+    """Topology lookups for populate_device_vars that query the database
+    directly. Used when building variables for a single device."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def get_interfaces(self, dev: Device) -> List[Interface]:
+        from cnaas_nms.db.interface import Interface
+
+        return self.session.query(Interface).filter(Interface.device == dev).all()
+
+    def get_neighbors(self, dev: Device) -> List[Device]:
+        return list(dev.get_neighbors(self.session))
+
+    def get_links_to(self, dev: Device, peer_device: Device) -> List[Linknet]:
+        return dev.get_links_to(self.session, peer_device)
+
+    def get_linknet_localif_mapping(self, dev: Device) -> Dict[str, str]:
+        return dev.get_linknet_localif_mapping(self.session)
+
+    def get_mlag_peer(self, dev: Device) -> Optional[Device]:
+        return dev.get_mlag_peer(self.session)
+
+    def find_mgmtdomain_by_ip(self, ipv4_address: IPv4Address) -> Optional[Mgmtdomain]:
+        from cnaas_nms.db.helper import find_mgmtdomain_by_ip
+
+        return find_mgmtdomain_by_ip(self.session, ipv4_address)
+
+    def get_all_mgmtdomains(self, hostname: str) -> List[Mgmtdomain]:
+        from cnaas_nms.db.helper import get_all_mgmtdomains
+
+        return get_all_mgmtdomains(self.session, hostname)
+
+    def get_devices_by_hostname(self, hostnames: List[str]) -> List[Device]:
+        from cnaas_nms.db.device import Device
+
+        if not hostnames:
+            return []
+        found = {dev.hostname: dev for dev in self.session.query(Device).filter(Device.hostname.in_(hostnames)).all()}
+        return [found[hostname] for hostname in hostnames if hostname in found]
+
+    def get_core_devices(self) -> List[Device]:
+        from cnaas_nms.db.device import Device, DeviceType
+
+        return self.session.query(Device).filter(Device.device_type == DeviceType.CORE).all()
+
+
+class TopologySnapshot(LiveTopology):
+    """Topology for a set of devices loaded with a handful of bulk queries.
+
+    Lookups used by populate_device_vars are answered from memory, so
+    building template variables for many devices does not cost a number of
+    database round trips per device. Linknets are held in a TopologyIndex
+    covering the selected devices, which should also be installed on the
+    session with topology_index so that Device methods use it. The snapshot
+    is only valid for the session it was loaded in.
+    """
+
+    def __init__(self, session):
+        super().__init__(session)
+        self.index: Optional[TopologyIndex] = None
+        self.devices_by_hostname: Dict[str, Device] = {}
+        self.interfaces_by_device: Dict[int, List[Interface]] = {}
+        self.mgmtdomains: List[Mgmtdomain] = []
+        self.mgmtdomains_by_id: Dict[int, Mgmtdomain] = {}
+        self.core_devices: List[Device] = []
+        self.missing_hostnames: Set[str] = set()
+
+    @classmethod
+    def load(cls, session, hostnames: List[str]) -> TopologySnapshot:
+        """Load devices matching hostnames together with their linknets,
+        interfaces, neighbors, management domains and all CORE devices."""
+        from cnaas_nms.db.device import Device, DeviceType
+        from cnaas_nms.db.interface import Interface
+        from cnaas_nms.db.mgmtdomain import Mgmtdomain
+
+        snapshot = cls(session)
+        # stack_members are loaded using lazy="subquery" together with the devices
+        snapshot._add_devices(session.query(Device).filter(Device.hostname.in_(hostnames)).all())
+        selected_ids = [dev.id for dev in snapshot.devices_by_hostname.values()]
+        for device_id in selected_ids:
+            snapshot.interfaces_by_device[device_id] = []
+        snapshot.index = TopologyIndex.build(session, selected_ids)
+        if not selected_ids:
+            return snapshot
+        snapshot._add_devices(snapshot.index.devices.values())
+
+        intf: Interface
+        for intf in session.query(Interface).filter(Interface.device_id.in_(selected_ids)).all():
+            snapshot.interfaces_by_device[intf.device_id].append(intf)
+
+        related_ids: Set[int] = set()
+        mgmtdom: Mgmtdomain
+        for mgmtdom in session.query(Mgmtdomain).all():
+            snapshot.mgmtdomains.append(mgmtdom)
+            snapshot.mgmtdomains_by_id[mgmtdom.id] = mgmtdom
+            related_ids.update({mgmtdom.device_a_id, mgmtdom.device_b_id})
+
+        related_ids = {x for x in related_ids if x is not None and x not in snapshot.index.devices}
+        snapshot._add_devices(
+            session.query(Device).filter(Device.id.in_(related_ids) | (Device.device_type == DeviceType.CORE)).all()
+        )
+        snapshot.core_devices = [x for x in snapshot.devices_by_hostname.values() if x.device_type == DeviceType.CORE]
+        return snapshot
+
+    def _add_devices(self, devices: Iterable[Device]):
+        for dev in devices:
+            self.devices_by_hostname[dev.hostname] = dev
+
+    def _get_index(self, dev: Device) -> TopologyIndex:
+        if not self.index.covers(dev.id):
+            raise ValueError("Device {} is not part of the topology snapshot".format(dev.hostname))
+        if self.index.generation != get_topology_generation():
+            index = get_topology_index(self.session)
+            if index and self.index.device_ids <= index.device_ids:
+                self.index = index
+            else:
+                self.index = TopologyIndex.build(self.session, self.index.device_ids)
+        return self.index
+
+    def get_interfaces(self, dev: Device) -> List[Interface]:
+        if dev.id not in self.interfaces_by_device:
+            raise ValueError("Device {} is not part of the topology snapshot".format(dev.hostname))
+        return self.interfaces_by_device[dev.id]
+
+    def get_neighbors(self, dev: Device) -> List[Device]:
+        return self._get_index(dev).get_neighbors(dev.id)
+
+    def get_links_to(self, dev: Device, peer_device: Device) -> List[Linknet]:
+        return self._get_index(dev).get_links_to(dev.id, peer_device.id)
+
+    def get_linknet_localif_mapping(self, dev: Device) -> Dict[str, str]:
+        return self._get_index(dev).get_linknet_localif_mapping(dev.id)
+
+    def get_mlag_peer(self, dev: Device) -> Optional[Device]:
+        self._get_index(dev)
+        return super().get_mlag_peer(dev)
+
+    def find_mgmtdomain_by_ip(self, ipv4_address: IPv4Address) -> Optional[Mgmtdomain]:
+        mgmtdomain_id = get_mgmtdomain_index(self.session).lookup(ipv4_address)
+        if mgmtdomain_id is None:
+            return None
+        if mgmtdomain_id not in self.mgmtdomains_by_id:
+            # Added after the snapshot was loaded
+            return super().find_mgmtdomain_by_ip(ipv4_address)
+        return self.mgmtdomains_by_id[mgmtdomain_id]
+
+    def get_all_mgmtdomains(self, hostname: str) -> List[Mgmtdomain]:
+        if hostname not in self.devices_by_hostname:
+            raise ValueError(f"hostname {hostname} not found in device database")
+        dev = self.devices_by_hostname[hostname]
+        return [x for x in self.mgmtdomains if x.device_a_id == dev.id or x.device_b_id == dev.id]
+
+    def get_devices_by_hostname(self, hostnames: List[str]) -> List[Device]:
+        unknown = [x for x in hostnames if x not in self.devices_by_hostname and x not in self.missing_hostnames]
+        if unknown:
+            logger = get_logger()
+            logger.debug("Loading devices not included in topology snapshot: {}".format(", ".join(unknown)))
+            self._add_devices(super().get_devices_by_hostname(unknown))
+            self.missing_hostnames.update(x for x in unknown if x not in self.devices_by_hostname)
+        return [self.devices_by_hostname[x] for x in hostnames if x in self.devices_by_hostname]
+
+    def get_core_devices(self) -> List[Device]:
+        return list(self.core_devices)
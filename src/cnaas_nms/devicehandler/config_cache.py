@@ -0,0 +1,72 @@
+import json
+from dataclasses import asdict, dataclass
+from hashlib import sha256
+from typing import Dict, List
+
+from redis.exceptions import RedisError
+
+from cnaas_nms.db.device import DeviceType
+from cnaas_nms.db.session import redis_session
+from cnaas_nms.tools.log import get_logger
+
+REDIS_CONFIG_CACHE_KEYNAME = "rendered_config"
+
+
+@dataclass(frozen=True)
+class CachedConfig:
+    """Last rendered config for a device, the hash of the inputs it was
+    rendered from and the device config hash after it was synchronized"""
+
+    input_hash: str
+    confhash: str
+    config: str
+
+
+def calc_input_hash(
+    templates_commit: str, settings_commit: str, platform: str, devtype: DeviceType, template_vars: dict
+) -> str:
+    """Calculate a hash of everything that a rendered device config depends on."""
+    data = {
+        "templates_commit": templates_commit,
+        "settings_commit": settings_commit,
+        "platform": platform,
+        "devtype": devtype.name,
+        "template_vars": template_vars,
+    }
+    return sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_cached_configs(hostnames: List[str]) -> Dict[str, CachedConfig]:
+    """Get cached configs for hostnames, devices without a valid entry are left out."""
+    logger = get_logger()
+    ret: Dict[str, CachedConfig] = {}
+    if not hostnames:
+        return ret
+    try:
+        with redis_session() as redis:
+            values = redis.hmget(REDIS_CONFIG_CACHE_KEYNAME, hostnames)
+    except RedisError as e:
+        logger.exception(f"Redis Error while reading config cache (not critical): {e}")
+        return ret
+    for hostname, value in zip(hostnames, values):
+        if not value:
+            continue
+        try:
+            ret[hostname] = CachedConfig(**json.loads(value))
+        except (TypeError, ValueError):
+            logger.debug("Ignoring invalid config cache entry for {}".format(hostname))
+    return ret
+
+
+def save_cached_configs(cached_configs: Dict[str, CachedConfig]):
+    logger = get_logger()
+    if not cached_configs:
+        return
+    try:
+        with redis_session() as redis:
+            redis.hset(
+                REDIS_CONFIG_CACHE_KEYNAME,
+                mapping={k: json.dumps(asdict(v)) for k, v in cached_configs.items()},
+            )
+    except RedisError as e:
+        logger.exception(f"Redis Error while saving config cache (not critical): {e}")
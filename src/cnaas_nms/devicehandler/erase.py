@@ -67,7 +67,7 @@ def device_erase(device_id: int = None, job_id: int = None, scheduled_by: Option
     if device_state not in [DeviceState.MANAGED, DeviceState.UNMANAGED]:
         raise Exception("Can only do factory default on MANAGED or UNMANAGED devices")
 
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname)
 
     device_list = list(nr_filtered.inventory.hosts.keys())
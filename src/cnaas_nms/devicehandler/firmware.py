@@ -9,9 +9,10 @@ from nornir_netmiko.tasks import netmiko_send_command
 
 from cnaas_nms.db.device import Device, DeviceType
 from cnaas_nms.db.job import Job
-from cnaas_nms.db.session import redis_session, sqla_session
+from cnaas_nms.db.session import sqla_session
 from cnaas_nms.devicehandler.nornir_helper import NornirJobResult, cnaas_init, inventory_selector
 from cnaas_nms.devicehandler.sync_history import add_sync_event
+from cnaas_nms.scheduler.progress import device_finished, start_progress, with_job_progress
 from cnaas_nms.scheduler.thread_data import set_thread_data
 from cnaas_nms.scheduler.wrapper import job_wrapper
 from cnaas_nms.tools.log import get_logger
@@ -337,8 +338,7 @@ def device_upgrade_task(
                 logger.error("Post-flight check failed for: {}".format(" ".join(res.failed_hosts.keys())))
 
     if job_id:
-        with redis_session() as db:
-            db.lpush("finished_devices_" + str(job_id), task.host.name)
+        device_finished(job_id, task.host.name)
 
 
 @job_wrapper
@@ -382,8 +382,10 @@ def device_upgrade(
                 raise Exception('Invalid device platform "{}" for device: {}'.format(dev.platform, device))
 
     # Start tasks to take care of the upgrade
+    if job_id:
+        start_progress(job_id, dev_count)
     try:
-        nrresult = nr_filtered.run(
+        nrresult = with_job_progress(nr_filtered, job_id).run(
             task=device_upgrade_task,
             job_id=job_id,
             scheduled_by=scheduled_by,
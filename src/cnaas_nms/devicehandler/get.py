@@ -23,7 +23,7 @@ def get_inventory():
 
 
 def get_running_config(hostname: str) -> Optional[str]:
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname).filter(managed=True)
     nr_result = nr_filtered.run(task=napalm_get, getters=["config"])
     if nr_result[hostname].failed:
@@ -198,7 +198,7 @@ def get_interfaces(hostname: str) -> AggregatedResult:
     """Get a NAPALM/Nornir aggregated result of the current interfaces
     on the specified device.
     """
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname)
     if len(nr_filtered.inventory) != 1:
         raise ValueError(f"Hostname {hostname} not found in inventory")
@@ -3,12 +3,10 @@ import os
 from ipaddress import IPv4Address, IPv4Interface, ip_interface
 from typing import List, Optional, Union
 
-import yaml
 from apscheduler.job import Job
 from netmiko.exceptions import ReadTimeout as NMReadTimeout
 from nornir.core.exceptions import NornirSubTaskError
 from nornir.core.task import MultiResult, Result
-from nornir_jinja2.plugins.tasks import template_file
 from nornir_napalm.plugins.tasks import napalm_configure, napalm_get
 from nornir_utils.plugins.functions import print_result
 
@@ -25,7 +23,7 @@ from cnaas_nms.db.reservedip import ReservedIP
 from cnaas_nms.db.session import sqla_session
 from cnaas_nms.db.settings import SettingsSyntaxError, VlanConflictError, rebuild_settings_cache
 from cnaas_nms.devicehandler.cert import arista_copy_cert
-from cnaas_nms.devicehandler.nornir_helper import NornirJobResult, get_jinja_env
+from cnaas_nms.devicehandler.nornir_helper import NornirJobResult, get_jinja_env, render_template_file
 from cnaas_nms.devicehandler.sync_devices import confcheck_devices, populate_device_vars
 from cnaas_nms.devicehandler.sync_history import add_sync_event, remove_sync_events
 from cnaas_nms.devicehandler.update import set_facts, update_interfacedb_worker, update_linknets
@@ -35,6 +33,7 @@ from cnaas_nms.scheduler.thread_data import set_thread_data
 from cnaas_nms.scheduler.wrapper import job_wrapper
 from cnaas_nms.tools.log import get_logger
 from cnaas_nms.tools.pki import generate_device_cert
+from cnaas_nms.tools.yaml_store import load_yaml_file
 
 
 class ConnectionCheckError(Exception):
@@ -62,9 +61,8 @@ def push_base_management(task, device_variables: dict, devtype: DeviceType, job_
     mapfile = os.path.join(local_repo_path, task.host.platform, "mapping.yml")
     if not os.path.isfile(mapfile):
         raise RepoStructureException("File {} not found in template repo".format(mapfile))
-    with open(mapfile, "r") as f:
-        mapping = yaml.safe_load(f)
-        template = mapping[devtype.name]["entrypoint"]
+    mapping = load_yaml_file(mapfile)
+    template = mapping[devtype.name]["entrypoint"]
 
     # TODO: install device certificate, using new hostname and reserved IP.
     #       exception on fail if tls_verify!=False
@@ -89,7 +87,7 @@ def push_base_management(task, device_variables: dict, devtype: DeviceType, job_
         raise e
 
     r = task.run(
-        task=template_file,
+        task=render_template_file,
         name="Generate initial device config",
         template=template,
         jinja_env=get_jinja_env(f"{local_repo_path}/{task.host.platform}"),
@@ -131,7 +129,7 @@ def pre_init_checks(session, device_id: int, accepted_state: Optional[List[Devic
         raise DeviceStateError("Device must be in state DISCOVERED to begin init")
     old_hostname = dev.hostname
     # Perform connectivity check
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[old_hostname])
     nr_old_filtered = nr.filter(name=old_hostname)
     try:
         nrresult_old = nr_old_filtered.run(task=napalm_get, getters=["facts"])
@@ -561,7 +559,7 @@ def init_access_device_step1(
         logger.error("VLAN conflict in repo configuration: {}".format(e))
         raise e
 
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname)
 
     # step2. push management config
@@ -756,7 +754,7 @@ def init_fabric_device_step1(
         logger.error("VLAN conflict in repo configuration: {}".format(e))
         raise e
 
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname)
 
     # step2. push management config
@@ -834,7 +832,7 @@ def init_device_step2(
             raise DeviceStateError("Device must be in state INIT to continue init step 2")
         hostname = dev.hostname
         devtype: DeviceType = dev.device_type
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname)
 
     nrresult = nr_filtered.run(task=napalm_get, getters=["facts"])
@@ -901,7 +899,7 @@ def set_hostname_task(task, new_hostname: str):
     local_repo_path = app_settings.TEMPLATES_LOCAL
     template_vars = {}  # host is already set by nornir
     r = task.run(
-        task=template_file,
+        task=render_template_file,
         name="Generate hostname config",
         template="hostname.j2",
         jinja_env=get_jinja_env(f"{local_repo_path}/{task.host.platform}"),
@@ -933,7 +931,7 @@ def discover_device(
             dev.dhcp_ip = dhcp_ip
         hostname = dev.hostname
 
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname)
 
     nrresult = nr_filtered.run(task=napalm_get, getters=["facts"])
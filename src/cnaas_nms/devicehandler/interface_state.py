@@ -1,17 +1,16 @@
 from typing import List
 
-from nornir_jinja2.plugins.tasks import template_file
 from nornir_napalm.plugins.tasks import napalm_configure, napalm_get
 
 from cnaas_nms.app_settings import app_settings
 from cnaas_nms.db.device import Device, DeviceState, DeviceType
 from cnaas_nms.db.interface import Interface, InterfaceConfigType
 from cnaas_nms.db.session import sqla_session
-from cnaas_nms.devicehandler.nornir_helper import cnaas_init, get_jinja_env
+from cnaas_nms.devicehandler.nornir_helper import cnaas_init, get_jinja_env, render_template_file
 
 
 def get_interface_states(hostname) -> dict:
-    nr = cnaas_init()
+    nr = cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname).filter(managed=True)
     if len(nr_filtered.inventory) != 1:
         raise ValueError(f"Hostname {hostname} not found in inventory")
@@ -57,7 +56,7 @@ def bounce_task(task, interfaces: List[str]):
     template_vars = {"interfaces": interfaces}
     local_repo_path = app_settings.TEMPLATES_LOCAL
     r = task.run(
-        task=template_file,
+        task=render_template_file,
         name="Generate port bounce down config",
         template="bounce-down.j2",
         jinja_env=get_jinja_env(f"{local_repo_path}/{task.host.platform}"),
@@ -72,7 +71,7 @@ def bounce_task(task, interfaces: List[str]):
         configuration=task.host["config"],
     )
     r = task.run(
-        task=template_file,
+        task=render_template_file,
         name="Generate port bounce up config",
         template="bounce-up.j2",
         jinja_env=get_jinja_env(f"{local_repo_path}/{task.host.platform}"),
@@ -93,7 +92,7 @@ def bounce_interfaces(hostname: str, interfaces: List[str]) -> bool:
     Returns false if config did not change, and raises Exception if an
     error was encountered."""
     pre_bounce_check(hostname, interfaces)
-    nr = cnaas_init()
+    nr = cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname).filter(managed=True)
     if len(nr_filtered.inventory) != 1:
         raise ValueError(f"Hostname {hostname} not found in inventory")
@@ -1,26 +1,43 @@
 import os
+import shutil
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import List, Optional, Tuple, Union
+from typing import List, NamedTuple, Optional, Tuple, Union
 
+from git import InvalidGitRepositoryError, Repo
+from git.exc import NoSuchPathError
 from jinja2 import Environment as JinjaEnvironment
-from jinja2 import FileSystemLoader
+from jinja2 import FileSystemBytecodeCache, FileSystemLoader
 from netutils.utils import jinja2_convenience_function
 from nornir import InitNornir
 from nornir.core import Nornir
-from nornir.core.filter import F
+from nornir.core.inventory import Host
 from nornir.core.plugins.inventory import InventoryPluginRegister
-from nornir.core.task import AggregatedResult, MultiResult
+from nornir.core.task import AggregatedResult, MultiResult, Result, Task
 
+from cnaas_nms.app_settings import api_settings, app_settings
+from cnaas_nms.db.device import DeviceState
+from cnaas_nms.db.inventory_cache import inventory_cache
+from cnaas_nms.db.settings import get_group_index
 from cnaas_nms.devicehandler.nornir_plugins.cnaas_inventory import CnaasInventory
 from cnaas_nms.scheduler.jobresult import JobResult
 from cnaas_nms.tools import jinja_filters
+from cnaas_nms.tools.cache import GenerationCounter
+from cnaas_nms.tools.private_dir import make_private_dir
+
+# Number of compiled templates kept in memory per jinja environment
+JINJA_CACHE_SIZE = 400
+# Incremented when the templates repository is refreshed
+templates_generation = GenerationCounter("templates_generation")
+# Generation and commit hash of the templates repository
+_templates_commit: Tuple[Optional[int], Optional[str]] = (None, None)
 
 
 @dataclass
 class NornirJobResult(JobResult):
     nrresult: Optional[MultiResult] = None
     change_score: Optional[float] = None
+    cached_hosts: Optional[List[str]] = None
 
 
 class RelativeJinjaEnvironment(JinjaEnvironment):
@@ -30,25 +47,186 @@ class RelativeJinjaEnvironment(JinjaEnvironment):
         return os.path.join(os.path.dirname(parent), template)
 
 
-@lru_cache(maxsize=8)
-def get_jinja_env(path):
+def get_repo_commit(path: str) -> Optional[str]:
+    """Get the commit hash currently checked out in the git repository containing path."""
+    try:
+        return Repo(path, search_parent_directories=True).head.commit.hexsha
+    except (InvalidGitRepositoryError, NoSuchPathError, ValueError):
+        return None
+
+
+def get_templates_commit(path: str) -> Optional[str]:
+    """Get the commit hash of the templates repository containing path.
+
+    The commit of the templates repository is cached until the repository is
+    refreshed by any process. Other paths are looked up every time.
+    """
+    global _templates_commit
+    templates_root = os.path.abspath(app_settings.TEMPLATES_LOCAL)
+    if os.path.commonpath([os.path.abspath(path), templates_root]) != templates_root:
+        return get_repo_commit(path)
+    generation = templates_generation.get()
+    cached_generation, commit = _templates_commit
+    if generation is None or generation != cached_generation:
+        commit = get_repo_commit(app_settings.TEMPLATES_LOCAL)
+        _templates_commit = (generation, commit)
+    return commit
+
+
+def get_bytecode_cache(commit: str) -> Optional[FileSystemBytecodeCache]:
+    """Get an on-disk jinja bytecode cache for templates from a specific commit."""
+    if not make_private_dir(api_settings.TEMPLATES_CACHE_DIR):
+        return None
+    directory = os.path.join(api_settings.TEMPLATES_CACHE_DIR, commit)
+    if not make_private_dir(directory):
+        return None
+    return FileSystemBytecodeCache(directory)
+
+
+@lru_cache(maxsize=16)
+def _get_jinja_env(path: str, commit: Optional[str]) -> RelativeJinjaEnvironment:
+    if commit:
+        cache_size = JINJA_CACHE_SIZE
+        bytecode_cache = get_bytecode_cache(commit)
+    else:
+        cache_size = 0
+        bytecode_cache = None
     jinja_env = RelativeJinjaEnvironment(
         trim_blocks=True,
         lstrip_blocks=True,
         keep_trailing_newline=True,
         loader=FileSystemLoader(path),
-        cache_size=0,
+        cache_size=cache_size,
+        bytecode_cache=bytecode_cache,
     )
     jinja_env.filters.update(jinja_filters.FILTERS)
     jinja_env.filters.update(jinja2_convenience_function())
     return jinja_env
 
 
-def cnaas_init() -> Nornir:
+def get_jinja_env(path: str) -> RelativeJinjaEnvironment:
+    """Get a jinja environment for templates in path. The environment and the
+    templates compiled by it are shared between threads and reused for as
+    long as the templates repository stays on the same commit."""
+    return _get_jinja_env(path, get_templates_commit(path))
+
+
+def clear_template_cache(keep_commit: Optional[str] = None):
+    """Drop cached jinja environments and remove on-disk bytecode caches
+    for all commits except keep_commit, the new commit of the templates
+    repository."""
+    global _templates_commit
+    _get_jinja_env.cache_clear()
+    # Make all processes look up the new commit, this process already knows it
+    generation = templates_generation.bump()
+    _templates_commit = (generation, keep_commit) if keep_commit else (None, None)
+    cache_dir = api_settings.TEMPLATES_CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return
+    for entry in os.listdir(cache_dir):
+        if entry != keep_commit:
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+
+
+class TemplateHost:
+    """Picklable copy of a nornir host, available as the variable host in
+    all rendered templates, both inside nornir and in the render pool.
+
+    Templates can use these attributes: name, hostname, platform, port,
+    username, password, groups (names of parent groups) and data (data of
+    the host itself). Data including data inherited from groups and defaults
+    can be accessed like a dict, for example host["synchronized"],
+    host.get("managed"), host.keys() and host.items().
+    """
+
+    ATTRIBUTES = ("name", "hostname", "platform", "port", "username", "password", "groups", "data")
+
+    def __init__(self, name: str, groups: List[str], data: dict, extended_data: dict, **kwargs):
+        self.name = name
+        self.hostname = kwargs.get("hostname")
+        self.platform = kwargs.get("platform")
+        self.port = kwargs.get("port")
+        self.username = kwargs.get("username")
+        self.password = kwargs.get("password")
+        self.groups = groups
+        self.data = data
+        self._extended_data = extended_data
+
+    @classmethod
+    def from_host(cls, host: Host) -> "TemplateHost":
+        return cls(
+            name=host.name,
+            hostname=host.hostname,
+            platform=host.platform,
+            port=host.port,
+            username=host.username,
+            password=host.password,
+            groups=[group.name for group in host.groups],
+            data=dict(host.data),
+            extended_data=host.extended_data(),
+        )
+
+    def __getitem__(self, item: str):
+        return self._extended_data[item]
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._extended_data
+
+    def __iter__(self):
+        return iter(self._extended_data)
+
+    def __len__(self) -> int:
+        return len(self._extended_data)
+
+    def __bool__(self) -> bool:
+        return bool(self.name)
+
+    def __str__(self) -> str:
+        return self.name
+
+    def extended_data(self) -> dict:
+        return dict(self._extended_data)
+
+    def get(self, item: str, default=None):
+        if item in self.ATTRIBUTES:
+            return getattr(self, item)
+        return self._extended_data.get(item, default)
+
+    def keys(self):
+        return self._extended_data.keys()
+
+    def values(self):
+        return self._extended_data.values()
+
+    def items(self):
+        return self._extended_data.items()
+
+
+def render_template_file(task: Task, template: str, path: str, jinja_env: Optional[JinjaEnvironment] = None, **kwargs):
+    """Nornir task to render a template file, like template_file from
+    nornir_jinja2 but without replacing the loader of jinja_env so that
+    compiled templates stay cached between renders."""
+    if not jinja_env:
+        jinja_env = get_jinja_env(path)
+    text = jinja_env.get_template(template).render(host=TemplateHost.from_host(task.host), **kwargs)
+    return Result(host=task.host, result=text)
+
+
+def render_template(path: str, template: str, host: TemplateHost, template_vars: dict) -> str:
+    """Render a template file outside of nornir, for example in the render pool."""
+    return get_jinja_env(path).get_template(template).render(host=host, **template_vars)
+
+
+def cnaas_init(hostnames: Optional[List[str]] = None) -> Nornir:
+    """Initialize nornir with inventory from the device database.
+
+    Args:
+        hostnames: Only include these devices in the inventory, default all devices
+    """
     InventoryPluginRegister.register("CnaasInventory", CnaasInventory)
     nr = InitNornir(
         runner={"plugin": "threaded", "options": {"num_workers": 50}},
-        inventory={"plugin": "CnaasInventory"},
+        inventory={"plugin": "CnaasInventory", "options": {"hostnames": hostnames}},
         logging={"log_file": "/tmp/nornir-pid{}.log".format(os.getpid()), "level": "DEBUG"},
     )
     return nr
@@ -70,6 +248,64 @@ def nr_result_serialize(result: AggregatedResult):
     return hosts
 
 
+class DeviceSelection(NamedTuple):
+    hostnames: List[str]
+    skipped_hostnames: List[str]
+
+
+def _hostname_list(hostname: Union[str, List[str]]) -> List[str]:
+    if isinstance(hostname, str):
+        return [hostname]
+    elif isinstance(hostname, list):
+        # Remove duplicates but keep order
+        return list(dict.fromkeys(hostname))
+    else:
+        raise ValueError("Can't select hostname based on type {}".format(type(hostname)))
+
+
+def select_hostnames(
+    resync: bool = True,
+    hostname: Optional[Union[str, List[str]]] = None,
+    device_type: Optional[str] = None,
+    group: Optional[str] = None,
+) -> DeviceSelection:
+    """Select devices like inventory_selector, but without building a Nornir
+    inventory. Devices are looked up in the inventory cache and group index.
+
+    Args:
+        resync: Set to false if you want to filter out devices that are synchronized
+        hostname: Select device by hostname (string) or list of hostnames (list)
+        device_type: Select device by device_type (string)
+        group: Select device by group (string)
+
+    Returns:
+        DeviceSelection with list of selected hostnames and list of hostnames
+        that was skipped because of resync=False
+    """
+    if hostname:
+        devices = inventory_cache.get_devices(_hostname_list(hostname))
+    else:
+        devices = inventory_cache.get_devices()
+    devices = [dev for dev in devices if dev.state == DeviceState.MANAGED]
+
+    if hostname:
+        return DeviceSelection([dev.hostname for dev in devices], [])
+    elif device_type:
+        devices = [dev for dev in devices if dev.device_type.name == device_type]
+    elif group:
+        group_index = get_group_index()
+        group_index.set_devices({dev.hostname for dev in inventory_cache.get_devices()})
+        members = group_index.get_hostnames(group)
+        devices = [dev for dev in devices if dev.hostname in members]
+
+    if resync:
+        return DeviceSelection([dev.hostname for dev in devices], [])
+    return DeviceSelection(
+        [dev.hostname for dev in devices if not dev.synchronized],
+        [dev.hostname for dev in devices if dev.synchronized],
+    )
+
+
 def inventory_selector(
     nr: Nornir,
     resync: bool = True,
@@ -90,27 +326,23 @@ def inventory_selector(
         Tuple with: filtered Nornir inventory, total device count selected,
                     list of hostnames that was skipped because of resync=False
     """
-    skipped_devices = []
     if hostname:
-        if isinstance(hostname, str):
-            nr_filtered = nr.filter(name=hostname).filter(managed=True)
-        elif isinstance(hostname, list):
-            nr_filtered = nr.filter(filter_func=lambda h: h.name in hostname).filter(managed=True)
-        else:
-            raise ValueError("Can't select hostname based on type {}".type(hostname))
+        hostnames = set(_hostname_list(hostname))
+        selected = [h for name, h in nr.inventory.hosts.items() if name in hostnames]
     elif device_type:
-        nr_filtered = nr.filter(F(groups__contains="T_" + device_type)).filter(managed=True)
+        selected = [h for h in nr.inventory.hosts.values() if "T_" + device_type in h.groups]
     elif group:
-        nr_filtered = nr.filter(F(groups__contains=group)).filter(managed=True)
+        selected = [h for h in nr.inventory.hosts.values() if group in h.groups]
     else:
         # all devices
-        nr_filtered = nr.filter(managed=True)
+        selected = list(nr.inventory.hosts.values())
+    selected = [h for h in selected if h.data.get("managed")]
 
-    if resync or hostname:
-        return nr_filtered, len(nr_filtered.inventory.hosts), skipped_devices
-    else:
-        pre_device_list = list(nr_filtered.inventory.hosts.keys())
-        nr_filtered = nr_filtered.filter(synchronized=False)
-        post_device_list = list(nr_filtered.inventory.hosts.keys())
-        skipped_devices = [x for x in pre_device_list if x not in post_device_list]
-        return nr_filtered, len(post_device_list), skipped_devices
+    skipped_devices = []
+    if not resync and not hostname:
+        skipped_devices = [h.name for h in selected if h.data.get("synchronized")]
+        selected = [h for h in selected if not h.data.get("synchronized")]
+
+    selected_names = {h.name for h in selected}
+    nr_filtered = nr.filter(filter_func=lambda h: h.name in selected_names)
+    return nr_filtered, len(selected_names), skipped_devices
@@ -1,15 +1,23 @@
 import ipaddress
+from typing import List, Optional
 
 from nornir.core.inventory import ConnectionOptions, Defaults, Group, Groups, Host, Hosts, Inventory, ParentGroups
 
-import cnaas_nms.db.session
 from cnaas_nms.app_settings import app_settings
-from cnaas_nms.db.device import Device, DeviceState, DeviceType
-from cnaas_nms.db.settings import get_groups
+from cnaas_nms.db.device import DeviceState, DeviceType
+from cnaas_nms.db.inventory_cache import InventoryDevice, inventory_cache
+from cnaas_nms.db.settings import get_group_index
 from cnaas_nms.tools.pki import ssl_context
 
 
 class CnaasInventory:
+    def __init__(self, hostnames: Optional[List[str]] = None):
+        """
+        Args:
+            hostnames: Only include devices with these hostnames in inventory
+        """
+        self.hostnames = hostnames
+
     @staticmethod
     def _get_credentials(devicestate):
         if devicestate == "UNKNOWN":
@@ -70,37 +78,37 @@ class CnaasInventory:
             username, password = self._get_credentials(device_state)
             group_name = "S_" + device_state
             groups[group_name] = Group(name=group_name, username=username, password=password, defaults=defaults)
-        for group_name in get_groups():
+        group_index = get_group_index()
+        for group_name in group_index.group_names:
             groups[group_name] = Group(name=group_name, defaults=defaults)
 
         hosts = Hosts()
-        with cnaas_nms.db.session.sqla_session() as session:
-            instance: Device
-            for instance in session.query(Device):
-                hostname = self._get_management_ip(instance.management_ip, instance.dhcp_ip)
-                port = None
-                if instance.port and isinstance(instance.port, int):
-                    port = instance.port
-                host_groups = ["T_" + instance.device_type.name, "S_" + instance.state.name]
-                for member_group in get_groups(instance.hostname):
-                    host_groups.append(member_group)
+        instance: InventoryDevice
+        for instance in inventory_cache.get_devices(self.hostnames):
+            hostname = self._get_management_ip(instance.management_ip, instance.dhcp_ip)
+            port = None
+            if instance.port and isinstance(instance.port, int):
+                port = instance.port
+            host_groups = ["T_" + instance.device_type.name, "S_" + instance.state.name]
+            for member_group in group_index.get_groups(instance.hostname):
+                host_groups.append(member_group)
 
-                if instance.state in insecure_device_states:
-                    host_connection_options = insecure_connection_options
-                else:
-                    host_connection_options = None
-                hosts[instance.hostname] = Host(
-                    name=instance.hostname,
-                    hostname=hostname,
-                    platform=instance.platform,
-                    groups=ParentGroups(groups[g] for g in host_groups),
-                    port=port,
-                    data={
-                        "synchronized": instance.synchronized,
-                        "managed": (True if instance.state == DeviceState.MANAGED else False),
-                    },
-                    connection_options=host_connection_options,
-                    defaults=defaults,
-                )
+            if instance.state in insecure_device_states:
+                host_connection_options = insecure_connection_options
+            else:
+                host_connection_options = None
+            hosts[instance.hostname] = Host(
+                name=instance.hostname,
+                hostname=hostname,
+                platform=instance.platform,
+                groups=ParentGroups(groups[g] for g in host_groups),
+                port=port,
+                data={
+                    "synchronized": instance.synchronized,
+                    "managed": (True if instance.state == DeviceState.MANAGED else False),
+                },
+                connection_options=host_connection_options,
+                defaults=defaults,
+            )
 
         return Inventory(hosts=hosts, groups=groups, defaults=defaults)
@@ -1,38 +1,54 @@
 import datetime
 import os
 import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from hashlib import sha256
 from ipaddress import IPv4Address, IPv4Interface, ip_interface
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
-import yaml
 from napalm.eos import EOSDriver as NapalmEOSDriver
 from napalm.junos import JunOSDriver as NapalmJunOSDriver
 from nornir.core import Nornir
+from nornir.core.inventory import Host
 from nornir.core.task import MultiResult, Result
-from nornir_jinja2.plugins.tasks import template_file
 from nornir_napalm.plugins.tasks import napalm_configure, napalm_get
 from nornir_utils.plugins.functions import print_result
 
-import cnaas_nms.db.helper
 from cnaas_nms.app_settings import api_settings, app_settings
 from cnaas_nms.db.device import Device, DeviceState, DeviceType
 from cnaas_nms.db.device_vars import expand_interface_settings
 from cnaas_nms.db.git import RepoStructureException
 from cnaas_nms.db.interface import Interface
 from cnaas_nms.db.job import Job
-from cnaas_nms.db.joblock import Joblock, JoblockError
-from cnaas_nms.db.session import redis_session, sqla_session
+from cnaas_nms.db.joblock import JoblockDevice
+from cnaas_nms.db.session import sqla_session
 from cnaas_nms.db.settings import get_settings
+from cnaas_nms.db.topology import LiveTopology, TopologySnapshot, topology_index
 from cnaas_nms.devicehandler.changescore import calculate_score
+from cnaas_nms.devicehandler.config_cache import CachedConfig, calc_input_hash, get_cached_configs, save_cached_configs
 from cnaas_nms.devicehandler.get import calc_config_hash
-from cnaas_nms.devicehandler.nornir_helper import NornirJobResult, cnaas_init, get_jinja_env, inventory_selector
+from cnaas_nms.devicehandler.nornir_helper import (
+    NornirJobResult,
+    TemplateHost,
+    cnaas_init,
+    get_jinja_env,
+    get_repo_commit,
+    get_templates_commit,
+    inventory_selector,
+    render_template,
+    render_template_file,
+)
 from cnaas_nms.devicehandler.sync_history import add_sync_event, remove_sync_events
+from cnaas_nms.scheduler.progress import device_finished, start_progress, with_job_progress
 from cnaas_nms.scheduler.scheduler import Scheduler
 from cnaas_nms.scheduler.thread_data import set_thread_data
 from cnaas_nms.scheduler.wrapper import job_wrapper
 from cnaas_nms.tools.jinja_helpers import get_environment_secrets
 from cnaas_nms.tools.log import get_logger
+from cnaas_nms.tools.process_pool import get_process_pool, reset_process_pool
+from cnaas_nms.tools.yaml_store import load_yaml_file
 
 AUTOPUSH_MAX_SCORE = 10
 PRIVATE_ASN_START = 4200000000
@@ -44,24 +60,20 @@ def generate_asn(ipv4_address: IPv4Address) -> Optional[int]:
     return PRIVATE_ASN_START + (ipv4_address.packed[2] * 256 + ipv4_address.packed[3])
 
 
-def get_evpn_peers(session, settings: dict):
+def get_evpn_peers(session, settings: dict, topology: Optional[LiveTopology] = None):
     logger = get_logger()
+    if topology is None:
+        topology = LiveTopology(session)
     device_hostnames = []
     for entry in settings["evpn_peers"]:
         if "hostname" in entry and Device.valid_hostname(entry["hostname"]):
             device_hostnames.append(entry["hostname"])
         else:
             logger.error("Invalid entry specified in settings->evpn_peers, ignoring: {}".format(entry))
-    ret = []
-    for hostname in device_hostnames:
-        dev = session.query(Device).filter(Device.hostname == hostname).one_or_none()
-        if dev:
-            ret.append(dev)
+    ret = topology.get_devices_by_hostname(device_hostnames)
     # If no evpn_peers were specified return a list of all CORE devices instead
     if not ret:
-        core_devs = session.query(Device).filter(Device.device_type == DeviceType.CORE).all()
-        for dev in core_devs:
-            ret.append(dev)
+        ret = topology.get_core_devices()
     return ret
 
 
@@ -91,9 +103,11 @@ def resolve_vlanid_list(vlan_name_list: List[str], vxlans: dict) -> List[int]:
     return ret
 
 
-def get_mlag_vars(session, dev: Device) -> dict:
+def get_mlag_vars(session, dev: Device, topology: Optional[LiveTopology] = None) -> dict:
     ret = {"mlag_peer": False, "mlag_peer_hostname": None, "mlag_peer_low": None}
-    mlag_peer: Device = dev.get_mlag_peer(session)
+    if topology is None:
+        topology = LiveTopology(session)
+    mlag_peer: Device = topology.get_mlag_peer(dev)
     if not mlag_peer:
         return ret
     ret["mlag_peer"] = True
@@ -106,9 +120,15 @@ def get_mlag_vars(session, dev: Device) -> dict:
 
 
 def populate_device_vars(
-    session, dev: Device, ztp_hostname: Optional[str] = None, ztp_devtype: Optional[DeviceType] = None
+    session,
+    dev: Device,
+    ztp_hostname: Optional[str] = None,
+    ztp_devtype: Optional[DeviceType] = None,
+    topology: Optional[LiveTopology] = None,
 ):
     logger = get_logger()
+    if topology is None:
+        topology = LiveTopology(session)
     device_variables = {
         "device_model": dev.model,
         "device_os_version": dev.os_version,
@@ -152,7 +172,7 @@ def populate_device_vars(
         if ztp_hostname:
             access_device_variables = {"interfaces": []}
         else:
-            mgmtdomain = cnaas_nms.db.helper.find_mgmtdomain_by_ip(session, dev.management_ip)
+            mgmtdomain = topology.find_mgmtdomain_by_ip(dev.management_ip)
             if not mgmtdomain:
                 raise Exception(
                     "Could not find appropriate management domain for management_ip: {}".format(dev.management_ip)
@@ -183,9 +203,9 @@ def populate_device_vars(
                 )
 
         # Check peer names for populating description on ACCESS_DOWNLINK ports
-        ifname_peer_map = dev.get_linknet_localif_mapping(session)
+        ifname_peer_map = topology.get_linknet_localif_mapping(dev)
 
-        intfs = session.query(Interface).filter(Interface.device == dev).all()
+        intfs = topology.get_interfaces(dev)
         intf: Interface
         for intf in intfs:
             untagged_vlan: Optional[int] = None
@@ -217,7 +237,7 @@ def populate_device_vars(
                     "indexnum": ifindexnum,
                 }
             )
-        mlag_vars = get_mlag_vars(session, dev)
+        mlag_vars = get_mlag_vars(session, dev, topology)
         device_variables = {**device_variables, **access_device_variables, **mlag_vars}
     elif devtype == DeviceType.DIST or devtype == DeviceType.CORE:
         infra_ip = dev.infra_ip
@@ -239,9 +259,9 @@ def populate_device_vars(
             fabric_device_variables = {**fabric_device_variables, **mgmt_device_variables}
         # find fabric neighbors
         fabric_interfaces = {}
-        for neighbor_d in dev.get_neighbors(session):
+        for neighbor_d in topology.get_neighbors(dev):
             if neighbor_d.device_type == DeviceType.DIST or neighbor_d.device_type == DeviceType.CORE:
-                for linknet in dev.get_links_to(session, neighbor_d):
+                for linknet in topology.get_links_to(dev, neighbor_d):
                     local_if = linknet.get_port(dev.id)
                     local_ipif = linknet.get_ipif(dev.id)
                     neighbor_ip = linknet.get_ip(neighbor_d.id)
@@ -263,7 +283,7 @@ def populate_device_vars(
                                 "peer_asn": generate_asn(neighbor_d.infra_ip),
                             }
                         )
-        ifname_peer_map = dev.get_linknet_localif_mapping(session)
+        ifname_peer_map = topology.get_linknet_localif_mapping(dev)
         if "interfaces" in settings and settings["interfaces"]:
             for intf in expand_interface_settings(settings["interfaces"]):
                 try:
@@ -325,7 +345,7 @@ def populate_device_vars(
             )
 
         if not ztp_hostname:
-            for mgmtdom in cnaas_nms.db.helper.get_all_mgmtdomains(session, hostname):
+            for mgmtdom in topology.get_all_mgmtdomains(hostname):
                 fabric_device_variables["mgmtdomains"].append(
                     {
                         "id": mgmtdom.id,
@@ -340,7 +360,7 @@ def populate_device_vars(
                     }
                 )
         # populate evpn peers data
-        for neighbor_d in get_evpn_peers(session, settings):
+        for neighbor_d in get_evpn_peers(session, settings, topology):
             if neighbor_d.hostname == dev.hostname:
                 continue
             fabric_device_variables["bgp_evpn_peers"].append(
@@ -368,6 +388,190 @@ def populate_device_vars(
     return device_variables
 
 
+@dataclass
+class PopulatedDeviceVars:
+    platform: str
+    devtype: DeviceType
+    host: TemplateHost
+    confhash: Optional[str] = None
+    template_vars: Optional[dict] = None
+    exception: Optional[Exception] = None
+    template: Optional[str] = None
+    config_future: Optional[Future] = None
+    input_hash: Optional[str] = None
+    cached_config: Optional[str] = None
+
+
+def get_template_entrypoint(platform: str, devtype: DeviceType) -> str:
+    mapfile = os.path.join(app_settings.TEMPLATES_LOCAL, platform, "mapping.yml")
+    if not os.path.isfile(mapfile):
+        raise RepoStructureException("File {} not found in template repo".format(mapfile))
+    mapping = load_yaml_file(mapfile)
+    return mapping[devtype.name]["entrypoint"]
+
+
+def populate_device_vars_batch(session, hosts: Dict[str, Host]) -> Dict[str, PopulatedDeviceVars]:
+    """Populate template variables for several devices using a topology
+    snapshot loaded with a few bulk queries, instead of querying the
+    database for each device separately.
+
+    Args:
+        session: sqla session
+        hosts: nornir hosts to populate variables for, by hostname
+
+    Returns:
+        Dict with hostname as key. If variables could not be populated for
+        a device the exception is saved and template_vars is None.
+    """
+    logger = get_logger()
+    ret: Dict[str, PopulatedDeviceVars] = {}
+    topology = TopologySnapshot.load(session, list(hosts.keys()))
+    with topology_index(session, topology.index):
+        for hostname, host in hosts.items():
+            dev: Optional[Device] = topology.devices_by_hostname.get(hostname)
+            if not dev:
+                continue
+            populated = PopulatedDeviceVars(
+                platform=dev.platform,
+                devtype=dev.device_type,
+                host=TemplateHost.from_host(host),
+                confhash=dev.confhash,
+            )
+            try:
+                populated.template_vars = populate_device_vars(session, dev, topology=topology)
+            except Exception as e:
+                logger.debug("Could not populate device variables for {}: {}".format(hostname, str(e)))
+                populated.exception = e
+            ret[hostname] = populated
+    return ret
+
+
+def render_device_configs(device_vars: Dict[str, PopulatedDeviceVars]):
+    """Start rendering configuration for devices in the render process pool.
+    This is the first stage of a sync, push_sync_device picks up each rendered
+    config as soon as it is ready. Devices that could not be submitted to the
+    pool are rendered by push_sync_device itself.
+
+    Args:
+        device_vars: Populated variables from populate_device_vars_batch
+    """
+    logger = get_logger()
+    local_repo_path = app_settings.TEMPLATES_LOCAL
+    entrypoints: Dict[Tuple[str, DeviceType], str] = {}
+    pool_restarted = False
+    for hostname, populated in device_vars.items():
+        if populated.exception:
+            continue
+        if populated.cached_config:
+            populated.config_future = Future()
+            populated.config_future.set_result(populated.cached_config)
+            continue
+        try:
+            if (populated.platform, populated.devtype) not in entrypoints:
+                entrypoints[(populated.platform, populated.devtype)] = get_template_entrypoint(
+                    populated.platform, populated.devtype
+                )
+            populated.template = entrypoints[(populated.platform, populated.devtype)]
+        except Exception as e:
+            populated.exception = e
+            continue
+        render_args = (
+            f"{local_repo_path}/{populated.platform}",
+            populated.template,
+            populated.host,
+            populated.template_vars,
+        )
+        try:
+            populated.config_future = get_process_pool().submit(render_template, *render_args)
+        except BrokenProcessPool:
+            reset_process_pool()
+            if pool_restarted:
+                logger.error("Render process pool failed, rendering remaining configs in sync threads")
+                return
+            pool_restarted = True
+            populated.config_future = get_process_pool().submit(render_template, *render_args)
+
+
+def check_config_cache(device_vars: Dict[str, PopulatedDeviceVars]) -> List[str]:
+    """Compare the inputs of each device config with the rendered config cache.
+
+    Devices that are synchronized, whose inputs (templates commit, settings
+    commit and populated variables) are unchanged and whose config hash is
+    the same as after they were last synchronized don't have to be rendered
+    and pushed again, or even connected to. Devices with unchanged inputs but
+    a changed config hash reuse the cached config instead of rendering it
+    again.
+
+    Args:
+        device_vars: Populated variables from populate_device_vars_batch,
+                     input_hash and cached_config are updated
+
+    Returns:
+        List of hostnames that can be skipped
+    """
+    logger = get_logger()
+    templates_commit = get_templates_commit(app_settings.TEMPLATES_LOCAL)
+    settings_commit = get_repo_commit(app_settings.SETTINGS_LOCAL)
+    if not templates_commit or not settings_commit:
+        return []
+    for hostname, populated in device_vars.items():
+        if populated.exception:
+            continue
+        try:
+            populated.input_hash = calc_input_hash(
+                templates_commit, settings_commit, populated.platform, populated.devtype, populated.template_vars
+            )
+        except (TypeError, ValueError) as e:
+            logger.debug("Unable to calculate config cache hash for {}: {}".format(hostname, str(e)))
+
+    ret: List[str] = []
+    hostnames = [k for k, v in device_vars.items() if v.input_hash]
+    for hostname, cached_config in get_cached_configs(hostnames).items():
+        populated = device_vars[hostname]
+        if cached_config.input_hash != populated.input_hash:
+            continue
+        if populated.host["synchronized"] and populated.confhash == cached_config.confhash:
+            ret.append(hostname)
+        else:
+            populated.cached_config = cached_config.config
+    return ret
+
+
+def save_config_cache(device_vars: Dict[str, PopulatedDeviceVars], nrresult, hostnames: List[str]):
+    """Save rendered configs and current config hashes for synchronized devices."""
+    hostnames = [x for x in hostnames if x in device_vars and device_vars[x].input_hash]
+    if not hostnames:
+        return
+    with sqla_session() as session:
+        confhashes = dict(session.query(Device.hostname, Device.confhash).filter(Device.hostname.in_(hostnames)).all())
+    cached_configs: Dict[str, CachedConfig] = {}
+    for hostname in hostnames:
+        if not confhashes.get(hostname) or len(nrresult[hostname]) < 2:
+            continue
+        cached_configs[hostname] = CachedConfig(
+            input_hash=device_vars[hostname].input_hash,
+            confhash=confhashes[hostname],
+            config=nrresult[hostname][1].result,
+        )
+    save_cached_configs(cached_configs)
+
+
+def wait_rendered_config(task, populated: PopulatedDeviceVars) -> Result:
+    """Nornir task that returns the config rendered by render_device_configs"""
+    try:
+        config = populated.config_future.result()
+    except BrokenProcessPool:
+        logger = get_logger()
+        logger.warning("Render process pool failed, rendering config for {} in sync thread".format(task.host.name))
+        config = render_template(
+            f"{app_settings.TEMPLATES_LOCAL}/{populated.platform}",
+            populated.template,
+            populated.host,
+            populated.template_vars,
+        )
+    return Result(host=task.host, result=config)
+
+
 def get_confirm_mode(confirm_mode_override: Optional[int] = None) -> int:
     valid_modes = [0, 1, 2]
     if confirm_mode_override is not None and confirm_mode_override in valid_modes:
@@ -474,8 +678,7 @@ def napalm_confirm_commit(task, job_id: int, prev_job_id: int):
         n_device.confirm_commit()
     logger.debug("Commit for job {} confirmed on device {}".format(prev_job_id, task.host.name))
     if job_id:
-        with redis_session() as db:
-            db.lpush("finished_devices_" + str(job_id), task.host.name)
+        device_finished(job_id, task.host.name)
 
 
 def push_sync_device(
@@ -485,6 +688,7 @@ def push_sync_device(
     generate_only: bool = False,
     job_id: Optional[str] = None,
     scheduled_by: Optional[str] = None,
+    device_vars: Optional[Dict[str, PopulatedDeviceVars]] = None,
 ):
     """
     Nornir task to generate config and push to device
@@ -497,36 +701,44 @@ def push_sync_device(
         job_id: Job ID integer
         scheduled_by: username of users that scheduled job
         confirm_mode: integer to specify commit confirm mode
+        device_vars: Template variables populated in advance by
+                     populate_device_vars_batch, optional
     Returns:
 
     """
     set_thread_data(job_id)
     logger = get_logger()
     hostname = task.host.name
-    with sqla_session() as session:
-        dev: Device = session.query(Device).filter(Device.hostname == hostname).one()
-        template_vars = populate_device_vars(session, dev)
-        platform = dev.platform
-        devtype = dev.device_type
+    populated: Optional[PopulatedDeviceVars] = None
+    if device_vars and hostname in device_vars:
+        populated = device_vars[hostname]
+        if populated.exception:
+            raise populated.exception
+        template_vars = populated.template_vars
+        platform = populated.platform
+        devtype = populated.devtype
+    else:
+        with sqla_session() as session:
+            dev: Device = session.query(Device).filter(Device.hostname == hostname).one()
+            template_vars = populate_device_vars(session, dev)
+            platform = dev.platform
+            devtype = dev.device_type
 
     local_repo_path = app_settings.TEMPLATES_LOCAL
 
-    mapfile = os.path.join(local_repo_path, platform, "mapping.yml")
-    if not os.path.isfile(mapfile):
-        raise RepoStructureException("File {} not found in template repo".format(mapfile))
-    with open(mapfile, "r") as f:
-        mapping = yaml.safe_load(f)
-        template = mapping[devtype.name]["entrypoint"]
-
     logger.debug("Generate config for host: {}".format(task.host.name))
-    r = task.run(
-        task=template_file,
-        name="Generate device config",
-        template=template,
-        jinja_env=get_jinja_env(f"{local_repo_path}/{task.host.platform}"),
-        path=f"{local_repo_path}/{task.host.platform}",
-        **template_vars,
-    )
+    if populated and populated.config_future:
+        r = task.run(task=wait_rendered_config, name="Generate device config", populated=populated)
+    else:
+        template = get_template_entrypoint(platform, devtype)
+        r = task.run(
+            task=render_template_file,
+            name="Generate device config",
+            template=template,
+            jinja_env=get_jinja_env(f"{local_repo_path}/{task.host.platform}"),
+            path=f"{local_repo_path}/{task.host.platform}",
+            **template_vars,
+        )
 
     # TODO: Handle template not found, variables not defined
     # jinja2.exceptions.UndefinedError
@@ -593,8 +805,7 @@ def push_sync_device(
         else:
             task.host["change_score"] = 0
     if job_id:
-        with redis_session() as db:
-            db.lpush("finished_devices_" + str(job_id), task.host.name)
+        device_finished(job_id, task.host.name)
 
 
 def generate_only(hostname: str) -> (str, dict):
@@ -608,13 +819,24 @@ def generate_only(hostname: str) -> (str, dict):
         (string with config, dict with available template variables)
     """
     logger = get_logger()
-    nr = cnaas_init()
+    nr = cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname)
     template_vars = {}
     if len(nr_filtered.inventory.hosts) != 1:
         raise ValueError("Invalid hostname: {}".format(hostname))
+    device_vars: Optional[Dict[str, PopulatedDeviceVars]] = None
     try:
-        nrresult = nr_filtered.run(task=push_sync_device, generate_only=True, confirm_mode=0)
+        # Same populate and render path as sync_devices, push_sync_device
+        # only waits for the rendered config
+        with sqla_session() as session:
+            device_vars = populate_device_vars_batch(session, nr_filtered.inventory.hosts)
+        render_device_configs(device_vars)
+    except Exception as e:
+        # push_sync_device populates variables and renders the config itself
+        logger.exception("Exception while populating device variables: {}".format(str(e)))
+        device_vars = None
+    try:
+        nrresult = nr_filtered.run(task=push_sync_device, generate_only=True, confirm_mode=0, device_vars=device_vars)
         if nrresult[hostname][0].failed:
             raise Exception(
                 "Could not generate config for device {}: {}".format(hostname, nrresult[hostname][0].result)
@@ -687,7 +909,7 @@ def update_config_hash(task):
 
 
 def confcheck_devices(session, hostnames: List[str], job_id=None):
-    nr = cnaas_init()
+    nr = cnaas_init(hostnames=hostnames)
     nr_filtered, dev_count, skipped_hostnames = inventory_selector(nr, hostname=hostnames)
 
     try:
@@ -752,15 +974,19 @@ def confirm_devices(
     resync: bool = False,
 ) -> NornirJobResult:
     logger = get_logger()
-    nr = cnaas_init()
+    nr = cnaas_init(hostnames=hostnames or None)
 
     nr_filtered, dev_count, skipped_hostnames = select_devices(nr, hostnames, resync)
 
     device_list = list(nr_filtered.inventory.hosts.keys())
     logger.info("Device(s) selected for commit-confirm ({}): {}".format(dev_count, ", ".join(device_list)))
+    if job_id:
+        start_progress(job_id, dev_count)
 
     try:
-        nrresult = nr_filtered.run(task=napalm_confirm_commit, job_id=job_id, prev_job_id=prev_job_id)
+        nrresult = with_job_progress(nr_filtered, job_id).run(
+            task=napalm_confirm_commit, job_id=job_id, prev_job_id=prev_job_id
+        )
     except Exception as e:
         logger.exception("Exception while confirm-commit devices: {}".format(str(e)))
         try:
@@ -768,7 +994,7 @@ def confirm_devices(
                 logger.info(
                     "Releasing lock for devices from syncto job: {} (in commit-job {})".format(prev_job_id, job_id)
                 )
-                Joblock.release_lock(session, job_id=prev_job_id)
+                JoblockDevice.release_locks(session, job_id=prev_job_id)
         except Exception:
             logger.error("Unable to release devices lock after syncto job")
         return NornirJobResult(nrresult=nrresult)
@@ -800,7 +1026,7 @@ def confirm_devices(
                 dev.last_seen = datetime.datetime.utcnow()
 
         logger.info("Releasing lock for devices from syncto job: {} (in commit-job {})".format(prev_job_id, job_id))
-        Joblock.release_lock(session, job_id=prev_job_id)
+        JoblockDevice.release_locks(session, job_id=prev_job_id)
 
     return NornirJobResult(nrresult=nrresult)
 
@@ -817,6 +1043,7 @@ def sync_devices(
     scheduled_by: Optional[str] = None,
     resync: bool = False,
     confirm_mode_override: Optional[int] = None,
+    verify_cached: bool = False,
 ) -> NornirJobResult:
     """Synchronize devices to their respective templates. If no arguments
     are specified then synchronize all devices that are currently out
@@ -836,17 +1063,42 @@ def sync_devices(
                 database, a device selected by hostname is always re-synced
         confirm_mode_override: Override settings commit confirm mode, optional int
                                with value 0, 1 or 2
+        verify_cached: Check the config hash on devices that are skipped because
+                       of the config cache, instead of trusting the database
 
     Returns:
         NornirJobResult
     """
     logger = get_logger()
-    nr = cnaas_init()
+    nr = cnaas_init(hostnames=hostnames or None)
     nr_filtered, dev_count, skipped_hostnames = select_devices(nr, hostnames, device_type, group, resync)
 
     device_list = list(nr_filtered.inventory.hosts.keys())
     logger.info("Device(s) selected for synchronization ({}): {}".format(dev_count, ", ".join(device_list)))
+    if job_id:
+        start_progress(job_id, dev_count)
+
+    device_vars: Optional[Dict[str, PopulatedDeviceVars]] = None
+    cached_hosts: List[str] = []
+    if dev_count:
+        try:
+            with sqla_session() as session:
+                device_vars = populate_device_vars_batch(session, nr_filtered.inventory.hosts)
+            # A device selected by hostname is always re-synchronized
+            if not force and not (hostnames and len(hostnames) == 1):
+                cached_hosts = check_config_cache(device_vars)
+        except Exception as e:
+            # Fall back to populating variables separately for each device
+            logger.exception("Exception while populating device variables in batch: {}".format(str(e)))
+            device_vars = None
+            cached_hosts = []
 
+    def exclude_cached_filter(host, exclude_list=set(cached_hosts)):
+        return host.name not in exclude_list
+
+    if cached_hosts and not verify_cached:
+        # Trust the config hash and synchronized state in the database, don't connect to cached devices
+        nr_filtered = nr_filtered.filter(filter_func=exclude_cached_filter)
     try:
         nrresult = nr_filtered.run(task=sync_check_hash, force=force, job_id=job_id)
     except Exception as e:
@@ -861,27 +1113,37 @@ def sync_devices(
                 )
             raise Exception("Configuration hash check failed for {}".format(" ".join(nrresult.failed_hosts.keys())))
 
+    if cached_hosts:
+        logger.info(
+            "Device(s) skipped because of unchanged config and config hash (cached) ({}): {}".format(
+                len(cached_hosts), ", ".join(cached_hosts)
+            )
+        )
+        nr_filtered = nr_filtered.filter(filter_func=exclude_cached_filter)
+        device_list = list(nr_filtered.inventory.hosts.keys())
+        if job_id:
+            device_finished(job_id, *cached_hosts)
+
     if not dry_run:
         with sqla_session() as session:
-            logger.info("Trying to acquire lock for devices to run syncto job: {}".format(job_id))
-            max_attempts = 5
-            lock_ok: bool = False
-            for i in range(max_attempts):
-                lock_ok = Joblock.acquire_lock(session, name="devices", job_id=job_id)
-                if lock_ok:
-                    break
-                else:
-                    time.sleep(2)
-            if not lock_ok:
-                raise JoblockError("Unable to acquire lock for configuring devices")
+            logger.info("Trying to acquire locks for devices to run syncto job: {}".format(job_id))
+            JoblockDevice.acquire_locks(session, device_list, job_id, timeout=api_settings.DEVICE_LOCK_WAIT)
+
+    if device_vars:
+        try:
+            render_device_configs(device_vars)
+        except Exception as e:
+            # Configs not submitted to the render pool are rendered by push_sync_device
+            logger.exception("Exception while rendering device configs: {}".format(str(e)))
 
     try:
-        nrresult = nr_filtered.run(
+        nrresult = with_job_progress(nr_filtered, job_id).run(
             task=push_sync_device,
             dry_run=dry_run,
             job_id=job_id,
             scheduled_by=scheduled_by,
             confirm_mode=get_confirm_mode(confirm_mode_override),
+            device_vars=device_vars,
         )
     except Exception as e:
         logger.exception("Exception while synchronizing devices: {}".format(str(e)))
@@ -889,7 +1151,7 @@ def sync_devices(
             if not dry_run:
                 with sqla_session() as session:
                     logger.info("Releasing lock for devices from syncto job: {}".format(job_id))
-                    Joblock.release_lock(session, job_id=job_id)
+                    JoblockDevice.release_locks(session, job_id=job_id)
         except Exception:
             logger.error("Unable to release devices lock after syncto job")
         return NornirJobResult(nrresult=nrresult)
@@ -956,7 +1218,16 @@ def sync_devices(
                 )
                 time.sleep(api_settings.COMMIT_CONFIRMED_TIMEOUT)
             logger.info("Releasing lock for devices from syncto job: {}".format(job_id))
-            Joblock.release_lock(session, job_id=job_id)
+            JoblockDevice.release_locks(session, job_id=job_id)
+
+    if device_vars:
+        cache_hosts = list(unchanged_hosts)
+        if not dry_run and get_confirm_mode(confirm_mode_override) != 2:
+            cache_hosts += changed_hosts
+        try:
+            save_config_cache(device_vars, nrresult, cache_hosts)
+        except Exception as e:
+            logger.exception("Exception while saving config cache: {}".format(str(e)))
 
     if len(device_list) == 0:
         total_change_score = 0
@@ -997,11 +1268,11 @@ def sync_devices(
             )
             time.sleep(api_settings.COMMIT_CONFIRMED_TIMEOUT)
             logger.info("Releasing lock for devices from syncto job: {}".format(job_id))
-            Joblock.release_lock(session, job_id=job_id)
+            JoblockDevice.release_locks(session, job_id=job_id)
         elif not changed_hosts:
             logger.info("None of the selected host has any changes (diff), skipping commit-confirm")
             logger.info("Releasing lock for devices from syncto job: {}".format(job_id))
-            Joblock.release_lock(session, job_id=job_id)
+            JoblockDevice.release_locks(session, job_id=job_id)
         else:
             scheduler = Scheduler()
             next_job_id = scheduler.add_onetime_job(
@@ -1013,10 +1284,11 @@ def sync_devices(
             logger.info(f"Commit-confirm for job id {job_id} scheduled as job id {next_job_id}")
             # keep this thread running until next_job has finished so the device session is not closed,
             # causing cancellation of pending commits
-            with sqla_session() as session:
-                Job.wait_for_job_completion(session, next_job_id)
+            Job.wait_for_job_completion(None, next_job_id)
 
-    return NornirJobResult(nrresult=nrresult, next_job_id=next_job_id, change_score=total_change_score)
+    return NornirJobResult(
+        nrresult=nrresult, next_job_id=next_job_id, change_score=total_change_score, cached_hosts=cached_hosts
+    )
 
 
 def push_static_config(
@@ -1066,7 +1338,7 @@ def apply_config(
         elif not (dev.state == DeviceState.MANAGED or dev.state == DeviceState.UNMANAGED):
             raise Exception("Device {} is in invalid state: {}".format(hostname, dev.state))
 
-    nr = cnaas_init()
+    nr = cnaas_init(hostnames=[hostname])
     nr_filtered, _, _ = inventory_selector(nr, hostname=hostname)
 
     try:
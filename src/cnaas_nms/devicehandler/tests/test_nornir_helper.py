@@ -0,0 +1,39 @@
+import pickle
+import unittest
+
+from jinja2 import Environment
+from nornir.core.inventory import Defaults, Group, Host, ParentGroups
+
+from cnaas_nms.devicehandler.nornir_helper import TemplateHost
+
+
+class TemplateHostTests(unittest.TestCase):
+    TEMPLATE = (
+        "{{ host }} {{ host.name }} {{ host.hostname }} {{ host.platform }} {{ host.port }} {{ host.username }}\n"
+        "{{ host.synchronized }} {{ host['managed'] }} {{ host.get('site') }} {{ host.get('missing', 'x') }}\n"
+        "{{ 'T_ACCESS' in host.groups }} {{ 'T_CORE' in host.groups }} {{ host.data | dictsort }}\n"
+        "{% for key, value in host.items() | sort %}{{ key }}={{ value }} {% endfor %}"
+    )
+
+    def test_same_as_nornir_host(self):
+        defaults = Defaults(data={"site": "default"})
+        groups = {
+            "T_ACCESS": Group(name="T_ACCESS", data={"site": "access"}, defaults=defaults),
+            "S_MANAGED": Group(name="S_MANAGED", username="admin", defaults=defaults),
+        }
+        host = Host(
+            name="eosaccess",
+            hostname="10.0.6.6",
+            platform="eos",
+            groups=ParentGroups([groups["T_ACCESS"], groups["S_MANAGED"]]),
+            data={"synchronized": True, "managed": True},
+            defaults=defaults,
+        )
+        template_host = TemplateHost.from_host(host)
+        template = Environment().from_string(self.TEMPLATE)
+        self.assertEqual(template.render(host=template_host), template.render(host=host))
+        self.assertEqual(template.render(host=pickle.loads(pickle.dumps(template_host))), template.render(host=host))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,10 +7,10 @@ import pytest
 import yaml
 
 from cnaas_nms.db.device import Device, DeviceType
-from cnaas_nms.db.interface import InterfaceError
+from cnaas_nms.db.interface import InterfaceConfigType, InterfaceError
 from cnaas_nms.db.session import sqla_session
 from cnaas_nms.devicehandler.init_device import InitVerificationError, pre_init_check_neighbors
-from cnaas_nms.devicehandler.update import update_linknets
+from cnaas_nms.devicehandler.update import reconcile_interfaces, update_linknets
 
 
 @pytest.mark.integration
@@ -101,5 +101,26 @@ class UpdateTests(unittest.TestCase):
             )
 
 
+class ReconcileInterfacesTests(unittest.TestCase):
+    def test_reconcile_interfaces(self):
+        existing = {
+            "Ethernet1": (InterfaceConfigType.ACCESS_UPLINK, {"neighbor": "eosdist1"}),
+            "Ethernet2": (InterfaceConfigType.ACCESS_UNTAGGED, {"untagged_vlan": 13}),
+            "Ethernet3": (InterfaceConfigType.ACCESS_AUTO, None),
+            "Ethernet4": (InterfaceConfigType.MLAG_PEER, {"neighbor_id": 2}),
+        }
+        phy_interfaces = ["Ethernet1", "Ethernet2", "Ethernet5"]
+        changes = reconcile_interfaces(1, existing, phy_interfaces, {"Ethernet1": "eosdist1"}, {}, replace=False)
+        self.assertEqual([row["name"] for row in changes.inserts], ["Ethernet5"])
+        self.assertEqual(changes.updates, [])
+        self.assertEqual(changes.deletes, ["Ethernet3"])
+        self.assertEqual(changes.protected, ["Ethernet4"])
+
+        changes = reconcile_interfaces(1, existing, phy_interfaces, {"Ethernet1": "eosdist1"}, {}, replace=True)
+        self.assertEqual([row["name"] for row in changes.updates], ["Ethernet1", "Ethernet2"])
+        self.assertEqual(changes.updates[1]["configtype"], InterfaceConfigType.ACCESS_AUTO)
+        self.assertEqual(changes.updates[1]["data"], {"untagged_vlan": 13})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,14 +1,17 @@
 import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
 from nornir_napalm.plugins.tasks import napalm_get
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm.attributes import set_committed_value
 
 import cnaas_nms.devicehandler.nornir_helper
-from cnaas_nms.db.device import Device, DeviceState, DeviceType
+from cnaas_nms.db.device import Device, DeviceState, DeviceType, add_device_update_event
 from cnaas_nms.db.interface import Interface, InterfaceConfigType
 from cnaas_nms.db.linknet import Linknet
 from cnaas_nms.db.session import sqla_session
 from cnaas_nms.db.settings import get_settings
+from cnaas_nms.db.topology import invalidate_topology_index
 from cnaas_nms.devicehandler.get import (
     filter_interfaces,
     get_interfaces_names,
@@ -17,14 +20,104 @@ from cnaas_nms.devicehandler.get import (
     get_uplinks,
     verify_peer_iftype,
 )
-from cnaas_nms.devicehandler.nornir_helper import NornirJobResult
+from cnaas_nms.devicehandler.nornir_helper import NornirJobResult, select_hostnames
 from cnaas_nms.devicehandler.sync_history import add_sync_event
 from cnaas_nms.devicehandler.underlay import find_free_infra_linknet
 from cnaas_nms.scheduler.jobresult import DictJobResult
+from cnaas_nms.scheduler.progress import device_finished, start_progress, with_job_progress
 from cnaas_nms.scheduler.wrapper import job_wrapper
 from cnaas_nms.tools.log import get_logger
 
 
+class InterfaceChanges(NamedTuple):
+    inserts: List[dict]
+    updates: List[dict]
+    deletes: List[str]
+    # Interfaces of protected types that disappeared from device but are kept
+    protected: List[str]
+
+
+PROTECTED_CONFIGTYPES = [InterfaceConfigType.ACCESS_UPLINK, InterfaceConfigType.MLAG_PEER]
+
+
+def reconcile_interfaces(
+    device_id: int,
+    existing: Dict[str, Tuple[InterfaceConfigType, Optional[dict]]],
+    phy_interfaces: List[str],
+    uplinks: Dict[str, str],
+    mlag_ifs: Dict[str, int],
+    replace: bool,
+) -> InterfaceChanges:
+    """Diff physical interfaces found on a device against interfaces in database.
+
+    Args:
+        device_id: id of device
+        existing: configtype and data of interfaces in database, by interface name
+        phy_interfaces: Names of physical interfaces found on device
+        uplinks: Mapping of uplink interface name -> neighbor hostname
+        mlag_ifs: Mapping of MLAG peer interface name -> neighbor id
+        replace: Overwrite configtype and data of existing interfaces
+
+    Returns:
+        Rows to insert and update, as dicts of interface columns, and names of interfaces to delete
+    """
+    changes = InterfaceChanges([], [], [], [])
+    found: Set[str] = set()
+    for intf_name in phy_interfaces:
+        if intf_name in found:
+            continue
+        found.add(intf_name)
+        if intf_name in existing and not replace:
+            continue
+        if intf_name in uplinks:
+            configtype, data = InterfaceConfigType.ACCESS_UPLINK, {"neighbor": uplinks[intf_name]}
+        elif intf_name in mlag_ifs:
+            configtype, data = InterfaceConfigType.MLAG_PEER, {"neighbor_id": mlag_ifs[intf_name]}
+        else:
+            # Data of existing interfaces is kept
+            configtype, data = InterfaceConfigType.ACCESS_AUTO, existing.get(intf_name, (None, None))[1]
+        row = {"device_id": device_id, "name": intf_name, "configtype": configtype, "data": data}
+        if intf_name in existing:
+            changes.updates.append(row)
+        else:
+            changes.inserts.append(row)
+
+    # Remove interfaces that no longer exist on device
+    for intf_name, (configtype, _) in existing.items():
+        if intf_name in found:
+            continue
+        if configtype in PROTECTED_CONFIGTYPES:
+            changes.protected.append(intf_name)
+        else:
+            changes.deletes.append(intf_name)
+    return changes
+
+
+def apply_interface_changes(session, dev: Device, changes: InterfaceChanges):
+    """Write interface changes for device with one statement each for inserts, updates and deletes."""
+    if changes.inserts:
+        session.execute(insert(Interface), changes.inserts)
+    if changes.updates:
+        session.execute(update(Interface), changes.updates)
+    if changes.deletes:
+        session.execute(
+            delete(Interface).where(Interface.device_id == dev.id, Interface.name.in_(changes.deletes)),
+            execution_options={"synchronize_session": False},
+        )
+    if not (changes.inserts or changes.updates or changes.deletes):
+        return
+    # Bulk statements bypass the identity map and mapper events
+    deleted = set(changes.deletes)
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Interface) and obj.device_id == dev.id:
+            if obj.name in deleted:
+                session.expunge(obj)
+            else:
+                session.expire(obj)
+    session.expire(dev, ["Interfaces"])
+    invalidate_topology_index()
+
+
 def update_interfacedb_worker(
     session,
     dev: Device,
@@ -32,28 +125,31 @@ def update_interfacedb_worker(
     delete_all: bool,
     mlag_peer_hostname: Optional[str] = None,
     linknets: Optional[List[dict]] = None,
+    iflist: Optional[List[str]] = None,
 ) -> List[dict]:
     """Perform actual work of updating database for update_interfacedb.
     If replace is set to true, configtype and data will get overwritten.
     If delete_all is set to true, delete all interfaces from database.
+    Interface names are fetched from the device unless iflist is given.
     Return list of new/updated interfaces, or empty if delete_all was set."""
     logger = get_logger()
-    ret = []
 
-    current_iflist = session.query(Interface).filter(Interface.device == dev).all()
-    unmatched_iflist = []
-    current_intf: Interface
-    for current_intf in current_iflist:
-        if delete_all:
-            logger.debug("Deleting interface {} on device {} from interface DB".format(current_intf.name, dev.hostname))
-            session.delete(current_intf)
-        else:
-            unmatched_iflist.append(current_intf)
+    existing = {
+        name: (configtype, data)
+        for name, configtype, data in session.query(Interface.name, Interface.configtype, Interface.data).filter(
+            Interface.device_id == dev.id
+        )
+    }
     if delete_all:
+        logger.debug(
+            "Deleting interfaces {} on device {} from interface DB".format(", ".join(existing.keys()), dev.hostname)
+        )
+        apply_interface_changes(session, dev, InterfaceChanges([], [], list(existing.keys()), []))
         session.commit()
-        return ret
+        return []
 
-    iflist = get_interfaces_names(dev.hostname)  # query nornir for current interfaces
+    if iflist is None:
+        iflist = get_interfaces_names(dev.hostname)  # query nornir for current interfaces
     uplinks = get_uplinks(session, dev.hostname, recheck=replace, linknets=linknets)
     if mlag_peer_hostname:
         mlag_ifs = get_mlag_ifs(session, dev, mlag_peer_hostname, linknets=linknets)
@@ -63,68 +159,83 @@ def update_interfacedb_worker(
     if not phy_interfaces:
         raise Exception("Could not find any physical interfaces for device {}".format(dev.hostname))
 
-    for intf_name in phy_interfaces:
-        intf: Interface = (
-            session.query(Interface).filter(Interface.device == dev).filter(Interface.name == intf_name).one_or_none()
-        )
-        if intf in unmatched_iflist:
-            unmatched_iflist.remove(intf)
-        if intf:
-            new_intf = False
-        else:
-            new_intf = True
-            intf: Interface = Interface()
-        if not new_intf and not replace:
-            continue
-        logger.debug("New/updated physical interface found on device {}: {}".format(dev.hostname, intf_name))
-        if intf_name in uplinks.keys():
-            intf.configtype = InterfaceConfigType.ACCESS_UPLINK
-            intf.data = {"neighbor": uplinks[intf_name]}
-        elif intf_name in mlag_ifs.keys():
-            intf.configtype = InterfaceConfigType.MLAG_PEER
-            intf.data = {"neighbor_id": mlag_ifs[intf_name]}
-        else:
-            intf.configtype = InterfaceConfigType.ACCESS_AUTO
-        intf.name = intf_name
-        intf.device = dev
-        if new_intf:
-            session.add(intf)
-        ret.append(intf.as_dict())
+    changes = reconcile_interfaces(dev.id, existing, phy_interfaces, uplinks, mlag_ifs, replace)
+    for row in changes.inserts + changes.updates:
+        logger.debug("New/updated physical interface found on device {}: {}".format(dev.hostname, row["name"]))
+    for intf_name in changes.protected:
+        logger.warning("Interface of protected type disappeared from {} ignoring: {}".format(dev.hostname, intf_name))
+    for intf_name in changes.deletes:
+        logger.info("Deleting interface {} from {} because it disappeared on device".format(intf_name, dev.hostname))
+    apply_interface_changes(session, dev, changes)
+    session.commit()
+    return [dict(row, configtype=row["configtype"].name) for row in changes.inserts + changes.updates]
 
-    # Remove interfaces that no longer exist on device
-    for unmatched_intf in unmatched_iflist:
-        protected_interfaces = [InterfaceConfigType.ACCESS_UPLINK, InterfaceConfigType.MLAG_PEER]
-        if unmatched_intf.configtype in protected_interfaces:
-            logger.warn(
-                "Interface of protected type disappeared from {} ignoring: {}".format(dev.hostname, unmatched_intf.name)
-            )
-        else:
-            logger.info(
-                "Deleting interface {} from {} because it disappeared on device".format(
-                    unmatched_intf.name, dev.hostname
-                )
+
+def update_interfacedb_devices(
+    session, devices: List[Device], iflists: Dict[str, List[str]], replace: bool
+) -> Dict[str, dict]:
+    """Update interface DB for many devices, using interface names already fetched from the devices.
+
+    Args:
+        devices: ACCESS devices to update
+        iflists: Interface names per hostname, devices missing here are reported as failed
+        replace: Overwrite configtype and data of existing interfaces
+
+    Returns:
+        Dict with result per hostname, with a list of new/updated interfaces or an error message
+    """
+    logger = get_logger()
+    results: Dict[str, dict] = {}
+    for dev in devices:
+        hostname = dev.hostname
+        if hostname not in iflists:
+            results[hostname] = {"failed": True, "error": "Could not get interfaces from device"}
+            continue
+        try:
+            mlag_peer = dev.get_mlag_peer(session)
+            interfaces = update_interfacedb_worker(
+                session,
+                dev,
+                replace,
+                False,
+                mlag_peer_hostname=mlag_peer.hostname if mlag_peer else None,
+                iflist=iflists[hostname],
             )
-            session.delete(unmatched_intf)
-    session.commit()
-    return ret
+        except Exception as e:
+            session.rollback()
+            logger.exception("Could not update interfaces for {}: {}".format(hostname, e))
+            results[hostname] = {"failed": True, "error": str(e)}
+            continue
+        results[hostname] = {"failed": False, "interfaces": interfaces}
+    return results
 
 
 @job_wrapper
 def update_interfacedb(
-    hostname: str,
+    hostname: Optional[Union[str, List[str]]] = None,
     replace: bool = False,
     delete_all: bool = False,
     mlag_peer_hostname: Optional[str] = None,
+    group: Optional[str] = None,
+    device_type: Optional[str] = None,
     job_id: Optional[str] = None,
     scheduled_by: Optional[str] = None,
 ) -> DictJobResult:
     """Update interface DB with any new physical interfaces for specified device.
     If replace is set, any existing records in the database will get overwritten.
     If delete_all is set, all entries in database for this device will be removed.
+    If a list of hostnames, a group or a device_type is specified instead of a
+    single hostname, interfaces of all selected ACCESS devices are fetched in one
+    Nornir run and the MLAG peer of each device is looked up from the database.
 
     Returns:
-        List of interfaces that was added to DB
+        List of interfaces that was added to DB, or result per device if many devices were selected
     """
+    if not isinstance(hostname, str):
+        if not (hostname or device_type or group):
+            raise ValueError("No devices selected, specify hostname, group or device_type")
+        hostnames = select_hostnames(hostname=hostname, device_type=device_type, group=group).hostnames
+        return update_interfacedb_many(hostnames, replace, job_id=job_id, scheduled_by=scheduled_by)
     with sqla_session() as session:
         dev: Device = session.query(Device).filter(Device.hostname == hostname).one_or_none()
         if not dev:
@@ -142,6 +253,55 @@ def update_interfacedb(
     return DictJobResult(result={"interfaces": result})
 
 
+def run_napalm_getter(hostnames: List[str], getter: str, job_id: Optional[str] = None) -> Dict[str, dict]:
+    """Run a NAPALM getter on many devices concurrently in one Nornir run.
+
+    Returns:
+        Result of getter per hostname, devices where the getter failed are left out
+    """
+    logger = get_logger()
+    if job_id:
+        start_progress(job_id, len(hostnames))
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=hostnames)
+    nrresult = with_job_progress(nr, job_id).run(task=napalm_get, getters=[getter])
+    results: Dict[str, dict] = {}
+    for hostname, multiresult in nrresult.items():
+        if multiresult.failed:
+            logger.error("Could not get {} from device {}: {}".format(getter, hostname, multiresult[0].result))
+        else:
+            results[hostname] = multiresult[0].result[getter]
+    return results
+
+
+def update_interfacedb_many(
+    hostnames: List[str], replace: bool, job_id: Optional[str] = None, scheduled_by: Optional[str] = None
+) -> DictJobResult:
+    with sqla_session() as session:
+        hostnames = [
+            hostname
+            for (hostname,) in session.query(Device.hostname).filter(
+                Device.hostname.in_(hostnames), Device.device_type == DeviceType.ACCESS
+            )
+        ]
+    if not hostnames:
+        raise ValueError("No managed access devices selected")
+
+    iflists = {
+        hostname: list(interfaces.keys())
+        for hostname, interfaces in run_napalm_getter(hostnames, "interfaces", job_id).items()
+    }
+    with sqla_session() as session:
+        devices = session.query(Device).filter(Device.hostname.in_(hostnames)).order_by(Device.hostname).all()
+        results = update_interfacedb_devices(session, devices, iflists, replace)
+        for dev in devices:
+            if results[dev.hostname].get("interfaces"):
+                dev.synchronized = False
+                add_sync_event(dev.hostname, "update_interfacedb", scheduled_by, job_id)
+    if job_id:
+        device_finished(job_id, *[hostname for hostname, result in results.items() if not result["failed"]])
+    return DictJobResult(result={"devices": results})
+
+
 def reset_interfacedb(hostname: str):
     with sqla_session() as session:
         dev: Device = session.query(Device).filter(Device.hostname == hostname).one_or_none()
@@ -152,7 +312,8 @@ def reset_interfacedb(hostname: str):
         return ret
 
 
-def set_facts(dev: Device, facts: dict) -> dict:
+def get_facts_diff(dev: Device, facts: dict) -> dict:
+    """Compare device attributes with NAPALM facts and return the attributes that differ."""
     attr_map = {
         # Map NAPALM getfacts name -> device.Device member name
         "vendor": "vendor",
@@ -161,20 +322,44 @@ def set_facts(dev: Device, facts: dict) -> dict:
         "serial_number": "serial",
     }
     diff = {}
-    # Update any attributes that has changed
     for dict_key, obj_member in attr_map.items():
         obj_data = dev.__getattribute__(obj_member)
         maxlen = Device.__dict__[obj_member].property.columns[0].type.length
         fact_data = facts[dict_key][:maxlen]
         if fact_data and obj_data != fact_data:
             diff[obj_member] = {"old": obj_data, "new": fact_data}
-            dev.__setattr__(obj_member, fact_data)
+    return diff
+
+
+def set_facts(dev: Device, facts: dict) -> dict:
+    diff = get_facts_diff(dev, facts)
+    # Update any attributes that has changed
+    for obj_member, change in diff.items():
+        dev.__setattr__(obj_member, change["new"])
     return diff
 
 
 @job_wrapper
-def update_facts(hostname: str, job_id: Optional[str] = None, scheduled_by: Optional[str] = None):
+def update_facts(
+    hostname: Optional[Union[str, List[str]]] = None,
+    group: Optional[str] = None,
+    device_type: Optional[str] = None,
+    job_id: Optional[str] = None,
+    scheduled_by: Optional[str] = None,
+):
+    """Update serial, vendor, model and OS version of devices from NAPALM facts.
+
+    A single hostname can be a MANAGED or UNMANAGED device. If a list of
+    hostnames, a group or a device_type is specified, facts are fetched from
+    all selected MANAGED devices in one Nornir run and the job result has the
+    outcome per device.
+    """
     logger = get_logger()
+    if not isinstance(hostname, str):
+        if not (hostname or device_type or group):
+            raise ValueError("No devices selected, specify hostname, group or device_type")
+        hostnames = select_hostnames(hostname=hostname, device_type=device_type, group=group).hostnames
+        return update_facts_many(hostnames, job_id=job_id)
     with sqla_session() as session:
         dev: Device = session.query(Device).filter(Device.hostname == hostname).one_or_none()
         if not dev:
@@ -183,7 +368,7 @@ def update_facts(hostname: str, job_id: Optional[str] = None, scheduled_by: Opti
             raise ValueError("Device with hostname {} is in incorrect state: {}".format(hostname, str(dev.state)))
         hostname = dev.hostname
 
-    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init()
+    nr = cnaas_nms.devicehandler.nornir_helper.cnaas_init(hostnames=[hostname])
     nr_filtered = nr.filter(name=hostname)
 
     nrresult = nr_filtered.run(task=napalm_get, getters=["facts"])
@@ -211,6 +396,43 @@ def update_facts(hostname: str, job_id: Optional[str] = None, scheduled_by: Opti
     return DictJobResult(result={"diff": diff})
 
 
+def update_facts_many(hostnames: List[str], job_id: Optional[str] = None) -> DictJobResult:
+    if not hostnames:
+        raise ValueError("No managed devices selected")
+    facts = run_napalm_getter(hostnames, "facts", job_id)
+    results: Dict[str, dict] = {
+        hostname: {"failed": True, "error": "Could not get facts from device"}
+        for hostname in hostnames
+        if hostname not in facts
+    }
+    with sqla_session() as session:
+        now = datetime.datetime.utcnow()
+        updates: Dict[int, dict] = {}
+        devices: Dict[int, Device] = {}
+        dev: Device
+        for dev in session.query(Device).filter(Device.hostname.in_(list(facts.keys()))):
+            try:
+                diff = get_facts_diff(dev, facts[dev.hostname])
+            except Exception as e:
+                results[dev.hostname] = {"failed": True, "error": "Could not update facts: {}".format(e)}
+                continue
+            results[dev.hostname] = {"failed": False, "diff": diff}
+            updates[dev.id] = {"id": dev.id, "last_seen": now, **{k: v["new"] for k, v in diff.items()}}
+            devices[dev.id] = dev
+        if updates:
+            # One bulk UPDATE statement for all devices instead of one per device
+            session.execute(update(Device), list(updates.values()))
+            # Bulk statements bypass the identity map and mapper events
+            for device_id, values in updates.items():
+                dev = devices[device_id]
+                for key, value in values.items():
+                    set_committed_value(dev, key, value)
+                add_device_update_event(dev, [key for key in values if key != "id"])
+    if job_id:
+        device_finished(job_id, *[hostname for hostname, result in results.items() if not result["failed"]])
+    return DictJobResult(result={"devices": results})
+
+
 def update_linknets(
     session,
     hostname: str,
@@ -2,7 +2,6 @@ import atexit
 import os
 import signal
 import threading
-from typing import List
 
 import coverage
 from gevent import monkey
@@ -71,74 +70,18 @@ def get_app():
     return app.app
 
 
-def socketio_emit(message: str, rooms: List[str]):
-    if not app.socketio:
-        return
-    for room in rooms:
-        app.socketio.emit("events", message, room=room)
-
-
-def loglevel_to_rooms(levelname: str) -> List[str]:
-    if levelname == "DEBUG":
-        return ["DEBUG"]
-    elif levelname == "INFO":
-        return ["DEBUG", "INFO"]
-    elif levelname == "WARNING":
-        return ["DEBUG", "INFO", "WARNING"]
-    elif levelname == "ERROR":
-        return ["DEBUG", "INFO", "WARNING", "ERROR"]
-    elif levelname == "CRITICAL":
-        return ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
-
-
-def parse_redis_event(event):
-    try:
-        # [stream, [(messageid, {datadict})]]
-        if event[0] == "events":
-            return event[1][0][1]
-    except Exception:  # noqa: S110
-        return None
-
-
-def emit_redis_event(event):
-    try:
-        if event["type"] == "log":
-            socketio_emit(event["message"], loglevel_to_rooms(event["level"]))
-        elif event["type"] == "update":
-            socketio_emit(json.loads(event["json"]), ["update_{}".format(event["update_type"])])
-        elif event["type"] == "sync":
-            socketio_emit(json.loads(event["json"]), ["sync"])
-    except Exception:  # noqa: S110
-        pass
-
-
 def thread_websocket_events():
     redis: StrictRedis
     with redis_session() as redis:
-        last_event = b"$"
-        while True:
-            result = redis.xread({"events": last_event}, count=10, block=200)
-            for item in result:
-                event = parse_redis_event(item)
-                if not event:
-                    continue
-                emit_redis_event(event)
-                try:
-                    # [stream, [(messageid, {datadict})]]
-                    last_event = item[1][0][0]
-                except Exception:  # noqa: S110
-                    last_event = b"$"
-            if stop_websocket_threads:
-                break
+        event_fanout.run(app.socketio, redis, lambda: stop_websocket_threads)
 
 
 if __name__ == "__main__":
     # Starting via python run.py
     # gevent monkey patching required if you start flask with the auto-reloader (debug mode)
     monkey.patch_all()
-    import json
-
     from cnaas_nms.api import app
+    from cnaas_nms.api.websocket_events import event_fanout
     from cnaas_nms.db.session import redis_session
 
     t_websocket_events = threading.Thread(target=thread_websocket_events)
@@ -153,9 +96,8 @@ if __name__ == "__main__":
 
 else:
     # Starting via uwsgi
-    import json
-
     from cnaas_nms.api import app
+    from cnaas_nms.api.websocket_events import event_fanout
     from cnaas_nms.db.session import redis_session
 
     t_websocket_events = threading.Thread(target=thread_websocket_events)
@@ -0,0 +1,293 @@
+"""Priority and fair-share queueing of jobs in the scheduler.
+
+Jobs that are due to run are put in one queue per priority class instead of
+going straight to a thread pool:
+
+- critical: follow-up jobs that other running jobs wait for, like
+  confirm_devices. They always start immediately, since making them wait
+  for capacity could deadlock with the job waiting for them.
+- interactive: jobs working on a single device. They can use all job
+  threads.
+- bulk: jobs working on many devices, and firmware jobs. They can't use the
+  threads reserved for interactive jobs.
+
+Within a priority class the next job is taken from the user with the fewest
+running jobs, and oldest first for the same user. Jobs are also held back
+while their user, or their function, has reached its concurrency limit.
+
+A snapshot of queued and running jobs is saved in redis on every change, so
+queue depth and wait time can be reported by the API from other processes.
+"""
+
+import datetime
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+from apscheduler.executors.base import BaseExecutor, run_job
+from redis.exceptions import RedisError
+
+from cnaas_nms.db.session import redis_session
+from cnaas_nms.tools.log import get_logger
+
+PRIORITY_CRITICAL = "critical"
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+# In order of priority
+PRIORITY_CLASSES = [PRIORITY_CRITICAL, PRIORITY_INTERACTIVE, PRIORITY_BULK]
+
+CRITICAL_FUNCTIONS = ["confirm_devices"]
+BULK_FUNCTIONS = ["device_upgrade", "get_firmware"]
+# Functions that work on all devices unless hostname(s) are specified
+DEVICE_SELECTION_FUNCTIONS = ["sync_devices", "update_facts", "update_interfacedb"]
+
+QUEUE_STATE_KEY = "job_queue_state"
+
+
+def job_function_name(name: str) -> str:
+    """Get function name from apscheduler job name, like module:function."""
+    return str(name).split(":")[-1].split(".")[-1]
+
+
+def job_priority(function_name: str, job_kwargs: dict) -> str:
+    """Get priority class of job from function name and the arguments to the function."""
+    if function_name in CRITICAL_FUNCTIONS:
+        return PRIORITY_CRITICAL
+    if function_name in BULK_FUNCTIONS:
+        return PRIORITY_BULK
+    for arg in ["hostname", "hostnames"]:
+        value = job_kwargs.get(arg)
+        if isinstance(value, list) and len(value) != 1:
+            return PRIORITY_BULK
+    if function_name in DEVICE_SELECTION_FUNCTIONS:
+        hostname = job_kwargs.get("hostname")
+        hostnames = job_kwargs.get("hostnames")
+        if not (isinstance(hostname, (str, list)) and hostname) and not (isinstance(hostnames, list) and hostnames):
+            return PRIORITY_BULK
+    return PRIORITY_INTERACTIVE
+
+
+class QueuedJob(NamedTuple):
+    job_id: str
+    priority: str
+    function_name: str
+    scheduled_by: str
+    queued_time: float
+
+
+class JobQueue:
+    def __init__(
+        self,
+        max_running: int,
+        reserved_interactive: int = 0,
+        max_per_user: int = 0,
+        function_limits: Optional[Dict[str, int]] = None,
+    ):
+        """Queues of jobs waiting to run, with one queue per priority class.
+
+        Args:
+            max_running: Maximum number of running interactive and bulk jobs
+            reserved_interactive: Number of the max_running jobs that can't be bulk jobs
+            max_per_user: Maximum number of running jobs per user, 0 for no limit
+            function_limits: Maximum number of running jobs per function name
+        """
+        if max_running < 1:
+            raise ValueError("max_running must be at least 1")
+        if reserved_interactive < 0 or reserved_interactive >= max_running:
+            raise ValueError("reserved_interactive must be between 0 and {}".format(max_running - 1))
+        self.max_running = max_running
+        self.reserved_interactive = reserved_interactive
+        self.max_per_user = max_per_user
+        self.function_limits = function_limits or {}
+        self.queues: Dict[str, List[QueuedJob]] = {priority: [] for priority in PRIORITY_CLASSES}
+        self.running: Dict[str, QueuedJob] = {}
+
+    def add(self, job: QueuedJob):
+        self.queues[job.priority].append(job)
+
+    def remove(self, job_id: str) -> Optional[QueuedJob]:
+        """Remove job that has not started yet from queue."""
+        for queue in self.queues.values():
+            for job in queue:
+                if job.job_id == job_id:
+                    queue.remove(job)
+                    return job
+        return None
+
+    def finish(self, job_id: str):
+        self.running.pop(job_id, None)
+
+    def _runnable(self, job: QueuedJob, running_by_class: Dict[str, int], running_by_user: Dict[str, int]) -> bool:
+        if job.priority == PRIORITY_CRITICAL:
+            return True
+        running = running_by_class[PRIORITY_INTERACTIVE] + running_by_class[PRIORITY_BULK]
+        if running >= self.max_running:
+            return False
+        if (
+            job.priority == PRIORITY_BULK
+            and running_by_class[PRIORITY_BULK] >= self.max_running - self.reserved_interactive
+        ):
+            return False
+        if self.max_per_user and running_by_user[job.scheduled_by] >= self.max_per_user:
+            return False
+        function_limit = self.function_limits.get(job.function_name)
+        if function_limit is not None:
+            if sum(1 for x in self.running.values() if x.function_name == job.function_name) >= function_limit:
+                return False
+        return True
+
+    def next_job(self) -> Optional[QueuedJob]:
+        """Remove and return the next job that can start now, or None."""
+        running_by_class: Dict[str, int] = defaultdict(int)
+        running_by_user: Dict[str, int] = defaultdict(int)
+        for job in self.running.values():
+            running_by_class[job.priority] += 1
+            if job.priority != PRIORITY_CRITICAL:
+                running_by_user[job.scheduled_by] += 1
+        for priority in PRIORITY_CLASSES:
+            # Fair share: users with fewest running jobs first, then oldest job first
+            candidates = sorted(self.queues[priority], key=lambda x: (running_by_user[x.scheduled_by], x.queued_time))
+            for job in candidates:
+                if self._runnable(job, running_by_class, running_by_user):
+                    self.queues[priority].remove(job)
+                    self.running[job.job_id] = job
+                    return job
+        return None
+
+    def state(self) -> dict:
+        """Return JSON serializable state of queues and running jobs."""
+        now = time.time()
+        queued = []
+        for priority in PRIORITY_CLASSES:
+            for job in sorted(self.queues[priority], key=lambda x: x.queued_time):
+                queued.append(
+                    {
+                        "job_id": int(job.job_id) if job.job_id.isdigit() else job.job_id,
+                        "priority": job.priority,
+                        "function_name": job.function_name,
+                        "scheduled_by": job.scheduled_by,
+                        "wait_time": round(now - job.queued_time, 1),
+                    }
+                )
+        return {
+            "time": now,
+            "depth": {priority: len(self.queues[priority]) for priority in PRIORITY_CLASSES},
+            "running": {
+                priority: sum(1 for x in self.running.values() if x.priority == priority)
+                for priority in PRIORITY_CLASSES
+            },
+            "max_wait_time": max([x["wait_time"] for x in queued], default=0),
+            "queued_jobs": queued,
+        }
+
+
+class JobQueueExecutor(BaseExecutor):
+    """APScheduler executor that starts jobs in order of a JobQueue."""
+
+    def __init__(self, job_queue: JobQueue):
+        super(JobQueueExecutor, self).__init__()
+        self.job_queue = job_queue
+        self._queue_lock = threading.RLock()
+        self._jobs: Dict[str, tuple] = {}
+        self._threads: Dict[str, threading.Thread] = {}
+        self._shutdown = False
+
+    def _do_submit_job(self, job, run_times):
+        function_name = job_function_name(job.name)
+        job_kwargs = job.kwargs.get("kwargs", {}) if isinstance(job.kwargs.get("kwargs"), dict) else {}
+        queued_job = QueuedJob(
+            job_id=str(job.id),
+            priority=job_priority(function_name, job_kwargs),
+            function_name=function_name,
+            scheduled_by=str(job.kwargs.get("scheduled_by", "unknown")),
+            queued_time=time.time(),
+        )
+        with self._queue_lock:
+            self._jobs[queued_job.job_id] = (job, run_times)
+            self.job_queue.add(queued_job)
+            self._dispatch()
+
+    def _dispatch(self):
+        while not self._shutdown:
+            queued_job = self.job_queue.next_job()
+            if not queued_job:
+                break
+            job, run_times = self._jobs.pop(queued_job.job_id)
+            wait_time = time.time() - queued_job.queued_time
+            if wait_time > 1:
+                self._logger.info(
+                    "Starting {} job {} ({}) after {:.1f} seconds in queue".format(
+                        queued_job.priority, queued_job.job_id, queued_job.function_name, wait_time
+                    )
+                )
+            # Time spent in queue is not a misfire, so move run times forward by that time
+            run_times = [run_time + datetime.timedelta(seconds=wait_time) for run_time in run_times]
+            thread = threading.Thread(
+                target=self._run, args=(job, run_times), name="job_{}".format(queued_job.job_id), daemon=True
+            )
+            self._threads[queued_job.job_id] = thread
+            thread.start()
+        self._save_state()
+
+    def _run(self, job, run_times):
+        try:
+            events = run_job(job, job._jobstore_alias, run_times, self._logger.name)
+        except BaseException as e:
+            self._job_done(job.id)
+            self._run_job_error(job.id, e, e.__traceback__)
+        else:
+            self._job_done(job.id)
+            self._run_job_success(job.id, events)
+
+    def _job_done(self, job_id):
+        with self._queue_lock:
+            self.job_queue.finish(str(job_id))
+            self._threads.pop(str(job_id), None)
+            self._dispatch()
+
+    def remove_queued_job(self, job_id) -> bool:
+        """Remove job that is waiting in queue, returns False if job was not queued."""
+        with self._queue_lock:
+            if not self.job_queue.remove(str(job_id)):
+                return False
+            self._jobs.pop(str(job_id), None)
+            self._save_state()
+        with self._lock:
+            self._instances[str(job_id)] -= 1
+            if self._instances[str(job_id)] <= 0:
+                del self._instances[str(job_id)]
+        return True
+
+    def _save_state(self):
+        state = self.job_queue.state()
+        try:
+            with redis_session() as redis:
+                redis.set(QUEUE_STATE_KEY, json.dumps(state))
+        except RedisError as e:
+            get_logger().debug("Unable to save job queue state: {}".format(e))
+
+    def shutdown(self, wait=True):
+        with self._queue_lock:
+            self._shutdown = True
+            threads = list(self._threads.values())
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+def get_queue_state() -> Optional[dict]:
+    """Get last saved state of the job queue, or None if no scheduler has saved it."""
+    with redis_session() as redis:
+        data = redis.get(QUEUE_STATE_KEY)
+    if not data:
+        return None
+    state = json.loads(data)
+    # Wait times keep growing after the state was saved
+    age = max(time.time() - state.pop("time"), 0)
+    for job in state["queued_jobs"]:
+        job["wait_time"] = round(job["wait_time"] + age, 1)
+    if state["queued_jobs"]:
+        state["max_wait_time"] = max(x["wait_time"] for x in state["queued_jobs"])
+    return state
@@ -0,0 +1,125 @@
+"""Live progress of jobs that run tasks on many devices.
+
+Progress is kept in redis while the job is running: a list of finished
+hostnames and a hash with counters. The list of finished devices is saved
+to the job in the database once, when the job finishes.
+"""
+
+import time
+from typing import List, Optional
+
+from nornir.core import Nornir
+from nornir.core.inventory import Host
+from nornir.core.task import AggregatedResult, MultiResult, Task
+
+from cnaas_nms.db.session import redis_session
+
+# Keep progress of jobs that never finished (crashed mule etc) for one day
+PROGRESS_EXPIRE_SECONDS = 24 * 3600
+
+
+def _finished_key(job_id: int) -> str:
+    return "finished_devices_{}".format(job_id)
+
+
+def _progress_key(job_id: int) -> str:
+    return "job_progress_{}".format(job_id)
+
+
+def start_progress(job_id: int, total: int):
+    """Start tracking progress for job with total number of selected devices."""
+    with redis_session() as redis:
+        pipe = redis.pipeline()
+        pipe.delete(_finished_key(job_id))
+        pipe.hset(_progress_key(job_id), mapping={"total": total, "done": 0, "failed": 0, "start_time": time.time()})
+        pipe.expire(_progress_key(job_id), PROGRESS_EXPIRE_SECONDS)
+        pipe.execute()
+
+
+def device_finished(job_id: int, *hostnames: str):
+    """Report devices as successfully finished in job."""
+    if not hostnames:
+        return
+    with redis_session() as redis:
+        pipe = redis.pipeline()
+        pipe.rpush(_finished_key(job_id), *hostnames)
+        pipe.expire(_finished_key(job_id), PROGRESS_EXPIRE_SECONDS)
+        pipe.hincrby(_progress_key(job_id), "done", len(hostnames))
+        pipe.execute()
+
+
+def device_failed(job_id: int, *hostnames: str):
+    """Report devices as failed in job."""
+    if not hostnames:
+        return
+    with redis_session() as redis:
+        redis.hincrby(_progress_key(job_id), "failed", len(hostnames))
+
+
+def get_finished_devices(job_id: int) -> List[str]:
+    with redis_session() as redis:
+        return redis.lrange(_finished_key(job_id), 0, -1)
+
+
+def pop_finished_devices(job_id: int) -> List[str]:
+    """Get and remove finished devices and progress counters of job."""
+    with redis_session() as redis:
+        pipe = redis.pipeline(transaction=True)
+        pipe.lrange(_finished_key(job_id), 0, -1)
+        pipe.delete(_finished_key(job_id), _progress_key(job_id))
+        finished_devices, _ = pipe.execute()
+    return finished_devices
+
+
+def get_progress(job_id: int) -> Optional[dict]:
+    """Get progress counters of a running job.
+
+    Returns:
+        Dict with total, done and failed device counts, rate in devices
+        per second and estimated seconds left (eta), or None if the job
+        does not report progress
+    """
+    with redis_session() as redis:
+        data = redis.hgetall(_progress_key(job_id))
+    if not data:
+        return None
+    total, done, failed = int(data["total"]), int(data["done"]), int(data["failed"])
+    elapsed = max(time.time() - float(data["start_time"]), 0.001)
+    rate = (done + failed) / elapsed
+    eta = None
+    if rate > 0:
+        eta = round(max(total - done - failed, 0) / rate, 1)
+    return {"total": total, "done": done, "failed": failed, "rate": round(rate, 3), "eta": eta}
+
+
+class JobProgressProcessor:
+    """Nornir processor that reports devices that failed a task as failed in job progress."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+
+    def task_started(self, task: Task) -> None:
+        pass
+
+    def task_completed(self, task: Task, result: AggregatedResult) -> None:
+        pass
+
+    def task_instance_started(self, task: Task, host: Host) -> None:
+        pass
+
+    def task_instance_completed(self, task: Task, host: Host, result: MultiResult) -> None:
+        if result.failed:
+            device_failed(self.job_id, host.name)
+
+    def subtask_instance_started(self, task: Task, host: Host) -> None:
+        pass
+
+    def subtask_instance_completed(self, task: Task, host: Host, result: MultiResult) -> None:
+        pass
+
+
+def with_job_progress(nr: Nornir, job_id: Optional[int]) -> Nornir:
+    """Return Nornir object that reports failed devices to progress of job, if job_id is set."""
+    if not job_id:
+        return nr
+    return nr.with_processors([JobProgressProcessor(job_id)])
@@ -6,15 +6,15 @@ import os
 from types import FunctionType
 from typing import Optional, Union
 
-from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from pytz import utc
 
-from cnaas_nms.app_settings import app_settings
+from cnaas_nms.app_settings import api_settings, app_settings
 from cnaas_nms.db.job import Job
 from cnaas_nms.db.session import sqla_session
+from cnaas_nms.scheduler.job_queue import JobQueue, JobQueueExecutor
 from cnaas_nms.tools.log import get_logger
 
 logger = get_logger()
@@ -31,8 +31,9 @@ class SingletonType(type):
 
 class Scheduler(object, metaclass=SingletonType):
     def __init__(self):
-        threads = 10
+        threads = api_settings.JOB_THREADS
         self.is_mule = False
+        self._executor: Optional[JobQueueExecutor] = None
         # If scheduler is already started, use uwsgi ipc to send job to mule process
         self.lock_f = open("/tmp/scheduler.lock", "w")
         try:
@@ -50,7 +51,7 @@ class Scheduler(object, metaclass=SingletonType):
         if caller == "api":
             sqlalchemy_url = app_settings.POSTGRES_DSN
             self._scheduler = BackgroundScheduler(
-                executors={"default": ThreadPoolExecutor(threads)},
+                executors={"default": self.create_executor(threads)},
                 jobstores={"default": SQLAlchemyJobStore(url=sqlalchemy_url)},
                 job_defaults={},
                 timezone=utc,
@@ -59,7 +60,7 @@ class Scheduler(object, metaclass=SingletonType):
         elif caller == "mule":
             sqlalchemy_url = app_settings.POSTGRES_DSN
             self._scheduler = BackgroundScheduler(
-                executors={"default": ThreadPoolExecutor(threads)},
+                executors={"default": self.create_executor(threads)},
                 jobstores={"default": SQLAlchemyJobStore(url=sqlalchemy_url)},
                 job_defaults={},
                 timezone=utc,
@@ -71,7 +72,7 @@ class Scheduler(object, metaclass=SingletonType):
             self._scheduler = None
         else:
             self._scheduler = BackgroundScheduler(
-                executors={"default": ThreadPoolExecutor(threads)},
+                executors={"default": self.create_executor(threads)},
                 jobstores={"default": MemoryJobStore()},
                 job_defaults={},
                 timezone=utc,
@@ -87,6 +88,18 @@ class Scheduler(object, metaclass=SingletonType):
     def get_scheduler(self):
         return self._scheduler
 
+    def create_executor(self, threads: int) -> JobQueueExecutor:
+        """Create executor that starts jobs by priority class and concurrency limits."""
+        self._executor = JobQueueExecutor(
+            JobQueue(
+                max_running=threads,
+                reserved_interactive=api_settings.JOB_RESERVED_INTERACTIVE,
+                max_per_user=api_settings.JOB_MAX_PER_USER,
+                function_limits=api_settings.JOB_FUNCTION_LIMITS,
+            )
+        )
+        return self._executor
+
     def get_caller(self, caller):
         """Check if API main run was the caller."""
         frameinfo = inspect.getframeinfo(caller.f_back.f_back)
@@ -115,7 +128,9 @@ class Scheduler(object, metaclass=SingletonType):
         return self._scheduler.add_job(func, **kwargs)
 
     def remove_local_job(self, job_id):
-        """Remove job from local scheduler."""
+        """Remove job from local scheduler, or from the queue of jobs waiting to start."""
+        if self._executor and self._executor.remove_queued_job(job_id):
+            return
         return self._scheduler.remove_job(str(job_id))
 
     def shutdown_mule(self):
@@ -0,0 +1,65 @@
+import unittest
+
+from cnaas_nms.scheduler.job_queue import (
+    PRIORITY_BULK,
+    PRIORITY_CRITICAL,
+    PRIORITY_INTERACTIVE,
+    JobQueue,
+    QueuedJob,
+    job_priority,
+)
+
+
+class JobQueueTests(unittest.TestCase):
+    @staticmethod
+    def queued_job(job_id: int, priority: str, scheduled_by: str = "admin", function_name: str = "sync_devices"):
+        return QueuedJob(str(job_id), priority, function_name, scheduled_by, float(job_id))
+
+    def test_job_priority(self):
+        self.assertEqual(job_priority("confirm_devices", {"hostnames": ["a", "b"]}), PRIORITY_CRITICAL)
+        self.assertEqual(job_priority("sync_devices", {"hostnames": ["eosaccess"]}), PRIORITY_INTERACTIVE)
+        self.assertEqual(job_priority("sync_devices", {"hostnames": ["eosaccess", "eosdist1"]}), PRIORITY_BULK)
+        self.assertEqual(job_priority("sync_devices", {"group": "ACCESS"}), PRIORITY_BULK)
+        self.assertEqual(job_priority("update_facts", {"hostname": "eosaccess"}), PRIORITY_INTERACTIVE)
+        self.assertEqual(job_priority("init_device_step2", {"device_id": 1}), PRIORITY_INTERACTIVE)
+        self.assertEqual(job_priority("device_upgrade", {"hostname": "eosaccess"}), PRIORITY_BULK)
+
+    def test_reserved_interactive(self):
+        job_queue = JobQueue(max_running=3, reserved_interactive=1)
+        for job_id in range(1, 5):
+            job_queue.add(self.queued_job(job_id, PRIORITY_BULK))
+        self.assertEqual(job_queue.next_job().job_id, "1")
+        self.assertEqual(job_queue.next_job().job_id, "2")
+        # Last thread is reserved for interactive jobs
+        self.assertIsNone(job_queue.next_job())
+        job_queue.add(self.queued_job(5, PRIORITY_INTERACTIVE))
+        self.assertEqual(job_queue.next_job().job_id, "5")
+        # Critical jobs start even when all threads are busy
+        job_queue.add(self.queued_job(6, PRIORITY_CRITICAL, function_name="confirm_devices"))
+        self.assertEqual(job_queue.next_job().job_id, "6")
+        self.assertIsNone(job_queue.next_job())
+        job_queue.finish("1")
+        self.assertEqual(job_queue.next_job().job_id, "3")
+        self.assertEqual(job_queue.state()["depth"], {PRIORITY_CRITICAL: 0, PRIORITY_INTERACTIVE: 0, PRIORITY_BULK: 1})
+
+    def test_fair_share_and_limits(self):
+        job_queue = JobQueue(max_running=10, max_per_user=2, function_limits={"device_upgrade": 1})
+        job_queue.add(self.queued_job(1, PRIORITY_BULK, "alice"))
+        job_queue.add(self.queued_job(2, PRIORITY_BULK, "alice"))
+        job_queue.add(self.queued_job(3, PRIORITY_BULK, "alice"))
+        job_queue.add(self.queued_job(4, PRIORITY_BULK, "bob"))
+        job_queue.add(self.queued_job(5, PRIORITY_BULK, "bob", "device_upgrade"))
+        job_queue.add(self.queued_job(6, PRIORITY_BULK, "carol", "device_upgrade"))
+        started = []
+        while True:
+            job = job_queue.next_job()
+            if not job:
+                break
+            started.append(job.job_id)
+        self.assertEqual(started, ["1", "4", "6", "2"])
+        self.assertEqual(job_queue.remove("5").job_id, "5")
+        self.assertIsNone(job_queue.remove("5"))
+
+
+if __name__ == "__main__":
+    unittest.main()
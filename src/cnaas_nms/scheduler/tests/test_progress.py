@@ -0,0 +1,38 @@
+import unittest
+
+import pytest
+
+from cnaas_nms.scheduler.progress import (
+    device_failed,
+    device_finished,
+    get_finished_devices,
+    get_progress,
+    pop_finished_devices,
+    start_progress,
+)
+
+
+@pytest.mark.integration
+class ProgressTests(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def requirements(self, redis):
+        """Ensures the required pytest fixtures are loaded implicitly for all these tests"""
+        pass
+
+    def test_progress(self):
+        job_id = 999999
+        start_progress(job_id, 4)
+        device_finished(job_id, "eosaccess")
+        device_finished(job_id, "eosdist1", "eosdist2")
+        device_failed(job_id, "eoscore")
+        progress = get_progress(job_id)
+        self.assertEqual((progress["total"], progress["done"], progress["failed"]), (4, 3, 1))
+        self.assertEqual(progress["eta"], 0)
+        self.assertEqual(get_finished_devices(job_id), ["eosaccess", "eosdist1", "eosdist2"])
+        self.assertEqual(pop_finished_devices(job_id), ["eosaccess", "eosdist1", "eosdist2"])
+        self.assertEqual(get_finished_devices(job_id), [])
+        self.assertIsNone(get_progress(job_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,8 @@ import pytest
 from cnaas_nms.db.job import Job, JobStatus
 from cnaas_nms.db.session import sqla_session
 from cnaas_nms.scheduler.jobresult import DictJobResult
-from cnaas_nms.scheduler.wrapper import job_wrapper
+from cnaas_nms.scheduler.progress import device_finished, start_progress
+from cnaas_nms.scheduler.wrapper import PROGRESS_FUNCTIONS, job_wrapper
 
 
 @job_wrapper
@@ -20,6 +21,29 @@ def job_testfunc_exception(text="", job_id=None, scheduled_by=None):
     raise Exception("testfunc_exception raised exception")
 
 
+def update_facts(job_id=None, scheduled_by=None):
+    """Stand-in for the update_facts job, reporting progress for many devices."""
+    start_progress(job_id, 2)
+    device_finished(job_id, "eosaccess", "eosdist1")
+    return DictJobResult(result={"status": "success"})
+
+
+@pytest.mark.integration
+def test_progress_finished_devices(postgresql, redis):
+    assert "update_facts" in PROGRESS_FUNCTIONS
+    assert "update_interfacedb" in PROGRESS_FUNCTIONS
+    with sqla_session() as session:
+        job = Job()
+        session.add(job)
+        session.flush()
+        job_id = job.id
+    job_wrapper(update_facts)(job_id=job_id, scheduled_by="test_user")
+    with sqla_session() as session:
+        job = session.query(Job).filter(Job.id == job_id).one()
+        assert job.status == JobStatus.FINISHED
+        assert job.finished_devices == ["eosaccess", "eosdist1"]
+
+
 @pytest.mark.integration
 def test_add_schedule(postgresql, scheduler):
     job1_id = scheduler.add_onetime_job(
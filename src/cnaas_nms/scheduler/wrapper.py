@@ -1,15 +1,19 @@
-import threading
 import traceback
 from typing import Optional
 
 from cnaas_nms.db.job import Job
-from cnaas_nms.db.session import redis_session, sqla_session
+from cnaas_nms.db.session import sqla_session
 from cnaas_nms.scheduler.jobresult import JobResult
+from cnaas_nms.scheduler.progress import pop_finished_devices
 from cnaas_nms.scheduler.thread_data import set_thread_data, thread_data
+from cnaas_nms.tools.event import flush_events
 from cnaas_nms.tools.log import get_logger
 
 logger = get_logger()
 
+# Jobs that report progress, finished devices are saved to the job when it finishes
+PROGRESS_FUNCTIONS = ["sync_devices", "device_upgrade", "confirm_devices", "update_facts", "update_interfacedb"]
+
 
 def find_nextjob(result: JobResult) -> Optional[int]:
     if isinstance(result, JobResult):
@@ -23,26 +27,10 @@ def insert_job_id(result: JobResult, job_id: int) -> JobResult:
     return result
 
 
-def update_device_progress(job_id: int):
-    new_finished_devices = []
-    with redis_session() as db:
-        while db.llen("finished_devices_" + str(job_id)) != 0:
-            last_finished = db.lpop("finished_devices_" + str(job_id))
-            new_finished_devices.append(last_finished)
-
-    if new_finished_devices:
-        with sqla_session() as session:
-            job = session.query(Job).filter(Job.id == job_id).one_or_none()
-            if not job:
-                raise ValueError("Could not find Job with ID {}".format(job_id))
-            finished_devices = job.finished_devices + new_finished_devices
-            job.finished_devices = finished_devices
-
-
-def update_device_progress_thread(stop_event: threading.Event, job_id: int):
-    while not stop_event.wait(2):
-        update_device_progress(job_id)
-    update_device_progress(job_id)  # update one last time before exiting thread
+def flush_job_logs(job_id: int):
+    """Make sure job logs are sent to the events stream before the job is finished."""
+    if not flush_events():
+        logger.warning("Timeout while sending logs for job {} to events stream".format(job_id))
 
 
 def job_wrapper(func):
@@ -53,7 +41,6 @@ def job_wrapper(func):
             errmsg = "Missing job_id when starting job for {}".format(func.__name__)
             logger.error(errmsg)
             raise ValueError(errmsg)
-        progress_funcitons = ["sync_devices", "device_upgrade", "confirm_devices"]
         with sqla_session() as session:
             job = session.query(Job).filter(Job.id == job_id).one_or_none()
             if not job:
@@ -66,10 +53,6 @@ def job_wrapper(func):
             if job.function_name == "wrapper":
                 function_name = func.__name__
             job.start_job(function_name=function_name)
-            if func.__name__ in progress_funcitons:
-                stop_event = threading.Event()
-                device_thread = threading.Thread(target=update_device_progress_thread, args=(stop_event, job_id))
-                device_thread.start()
         try:
             set_thread_data(job_id)
             # kwargs is contained in an item called kwargs because of the apscheduler.add_job call
@@ -80,27 +63,28 @@ def job_wrapper(func):
         except Exception as e:
             tb = traceback.format_exc()
             logger.debug("Exception traceback in job_wrapper: {}".format(tb))
+            flush_job_logs(job_id)
             with sqla_session() as session:
                 job = session.query(Job).filter(Job.id == job_id).one_or_none()
                 if not job:
                     errmsg = "Could not find job_id {} in database".format(job_id)
                     logger.error(errmsg)
                     raise ValueError(errmsg)
-                if func.__name__ in progress_funcitons:
-                    stop_event.set()
+                if func.__name__ in PROGRESS_FUNCTIONS:
+                    job.finished_devices = pop_finished_devices(job_id)
                 job.finish_exception(e, tb)
                 session.commit()
             raise e
         else:
-            if func.__name__ in progress_funcitons:
-                stop_event.set()
-                device_thread.join()
+            flush_job_logs(job_id)
             with sqla_session() as session:
                 job = session.query(Job).filter(Job.id == job_id).one_or_none()
                 if not job:
                     errmsg = "Could not find job_id {} in database".format(job_id)
                     logger.error(errmsg)
                     raise ValueError(errmsg)
+                if func.__name__ in PROGRESS_FUNCTIONS:
+                    job.finished_devices = pop_finished_devices(job_id)
                 job.finish_success(res, find_nextjob(res))
                 session.commit()
             return res
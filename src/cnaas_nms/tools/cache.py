@@ -1,8 +1,16 @@
+import copy
+import enum
+import inspect
 import json
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from typing import Callable, Hashable, Optional
 
 from redis.exceptions import RedisError
+from redis_lru import RedisLRU
+from redis_lru.lru import ArgsUnhashable
 
 from cnaas_nms.db.session import redis_session
 from cnaas_nms.tools.log import get_logger
@@ -44,3 +52,178 @@ def put_token_info_in_cache(token: Token, token_info) -> bool:
     except (TypeError, KeyError) as e:
         logger.debug("Error while getting userinfo cache: {}".format(str(e)))
     return False
+
+
+class GenerationCounter:
+    """Counter in redis that is incremented every time some cached data
+    becomes outdated, so that all processes (API workers and mule) can tell
+    when to drop their local copies.
+
+    Redis is checked at most once every check_interval seconds per process.
+    """
+
+    def __init__(self, key: str, check_interval: float = 1.0):
+        self.key = key
+        self.check_interval = check_interval
+        self._generation: Optional[int] = None
+        self._checked_at: float = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, refresh: bool = False) -> Optional[int]:
+        """Get current generation, returns None if redis is not reachable.
+
+        Args:
+            refresh: Always check redis instead of using the last known value
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not refresh and self._generation is not None and now - self._checked_at < self.check_interval:
+                return self._generation
+            try:
+                with redis_session() as redis:
+                    value = redis.get(self.key)
+                self._generation = int(value) if value else 0
+            except (RedisError, ValueError) as e:
+                logger.debug("Could not get generation {} from redis: {}".format(self.key, str(e)))
+                self._generation = None
+            self._checked_at = now
+            return self._generation
+
+    def bump(self) -> Optional[int]:
+        """Increment generation, invalidating data cached in all processes."""
+        with self._lock:
+            try:
+                with redis_session() as redis:
+                    self._generation = int(redis.incr(self.key))
+            except RedisError as e:
+                logger.error("Could not increment generation {} in redis: {}".format(self.key, str(e)))
+                self._generation = None
+            self._checked_at = time.monotonic()
+            return self._generation
+
+
+class LocalLRUCache:
+    """Bounded in-process LRU cache decorator, valid for one generation.
+
+    All cached values are dropped when the generation counter changes.
+    Every call returns a deep copy of the cached value, so callers can modify
+    the returned value. Calls with unhashable arguments are not cached.
+    """
+
+    def __init__(self, generation: GenerationCounter, max_size: int = 1024):
+        self.generation = generation
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+        self._data_generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __call__(self, func: Callable) -> Callable:
+        @wraps(func)
+        def inner(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            try:
+                value = self.get(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            except KeyError:
+                value = func(*args, **kwargs)
+                self.set(key, copy.deepcopy(value))
+                return value
+            return copy.deepcopy(value)
+
+        return inner
+
+    def _check_generation(self):
+        generation = self.generation.get()
+        if generation is None or generation != self._data_generation:
+            self._data.clear()
+            self._data_generation = generation
+
+    def get(self, key: Hashable):
+        with self._lock:
+            self._check_generation()
+            value = self._data[key]
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            if self._data_generation is None:
+                # Redis not reachable, can't tell when data becomes outdated
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._data_generation = None
+
+
+@lru_cache(maxsize=None)
+def _get_signature(func: Callable) -> inspect.Signature:
+    return inspect.signature(func)
+
+
+def _escape_pattern(value: str) -> str:
+    """Escape glob-style special characters for redis SCAN MATCH."""
+    for char in "\\*?[]":
+        value = value.replace(char, "\\" + char)
+    return value
+
+
+class StableKeyRedisLRU(RedisLRU):
+    """RedisLRU using cache keys made from argument names and values.
+
+    Plain RedisLRU builds keys from repr() of the positional and keyword
+    arguments. The default repr of objects, like ORM objects, includes the
+    memory address and is not stable between processes. The same call also
+    gets different keys depending on whether values are passed by position
+    or by keyword, and in which order keywords are given. Entries then can't
+    be shared between processes or be found again to invalidate them. Here
+    values are bound to argument names first. Only arguments of type str,
+    int, bool, enum or None are supported, other calls are not cached.
+    """
+
+    @staticmethod
+    def _key_value(value) -> str:
+        if isinstance(value, enum.Enum):
+            return value.name
+        elif value is None or isinstance(value, (str, int, bool)):
+            return json.dumps(value)
+        raise ArgsUnhashable()
+
+    def _func_key(self, func: Callable) -> str:
+        func = inspect.unwrap(func)
+        return "{}:{}:{}".format(self.key_prefix, func.__module__, func.__qualname__)
+
+    def _decorator_key(self, func: Callable, *args, **kwargs) -> str:
+        try:
+            bound = _get_signature(func).bind(*args, **kwargs)
+        except TypeError:
+            raise ArgsUnhashable()
+        bound.apply_defaults()
+        arguments = ",".join(["{}={}".format(k, self._key_value(v)) for k, v in bound.arguments.items()])
+        return "{}({})".format(self._func_key(func), arguments)
+
+    def delete_matching(self, func: Callable, **kwargs) -> int:
+        """Delete all cached results of func called with the specified
+        argument values, regardless of the values of other arguments.
+
+        Returns:
+            Number of deleted cache entries
+        """
+        func = inspect.unwrap(func)
+        arguments = []
+        for name in _get_signature(func).parameters.keys():
+            if name in kwargs:
+                arguments.append("{}={}".format(name, _escape_pattern(self._key_value(kwargs[name]))))
+            else:
+                arguments.append("{}=*".format(name))
+        match = "{}({})".format(_escape_pattern(self._func_key(func)), ",".join(arguments))
+        keys = list(self.client.scan_iter(match, count=1000))
+        if keys:
+            self.client.delete(*keys)
+        return len(keys)
@@ -1,7 +1,39 @@
-from typing import Optional
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
 
+from cnaas_nms.app_settings import api_settings
 from cnaas_nms.db.session import redis_session
 
+# Maximum number of queued events waiting to be sent by the event sender thread
+EVENT_QUEUE_SIZE = 10000
+# Maximum number of events sent to redis in one pipeline
+EVENT_BATCH_SIZE = 500
+
+
+def _event_data(
+    message: Optional[str] = None,
+    event_type: str = "log",
+    level: str = "INFO",
+    update_type: Optional[str] = None,
+    json_data: Optional[str] = None,
+    job_id: Optional[int] = None,
+) -> dict:
+    send_data = {"type": event_type, "level": level}
+    if event_type == "log":
+        send_data["message"] = message
+        if job_id is not None:
+            send_data["job_id"] = job_id
+    elif event_type == "update":
+        send_data["update_type"] = update_type
+        send_data["json"] = json_data
+    elif event_type == "sync":
+        send_data["json"] = json_data
+    return send_data
+
 
 def add_event(
     message: Optional[str] = None,
@@ -24,14 +56,119 @@ def add_event(
     """
     with redis_session() as redis:
         try:
-            send_data = {"type": event_type, "level": level}
-            if event_type == "log":
-                send_data["message"] = message
-            elif event_type == "update":
-                send_data["update_type"] = update_type
-                send_data["json"] = json_data
-            elif event_type == "sync":
-                send_data["json"] = json_data
-            redis.xadd("events", send_data, maxlen=100)
+            send_data = _event_data(message, event_type, level, update_type, json_data)
+            redis.xadd("events", send_data, maxlen=api_settings.EVENTS_STREAM_MAXLEN, approximate=True)
         except Exception as e:
             print("Error in add_event: {}".format(e))
+
+
+class EventSender:
+    """Send events to the redis events stream in batches from a background thread.
+
+    Queueing an event never blocks, if the queue is full the event is dropped
+    and counted instead.
+    """
+
+    def __init__(self, max_queue_size: int = EVENT_QUEUE_SIZE, batch_size: int = EVENT_BATCH_SIZE):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.dropped_count = 0
+        self._unreported_drops = 0
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+
+    def _get_queue(self) -> queue.Queue:
+        # Threads don't survive fork, start a new sender thread in each process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.max_queue_size)
+                    thread = threading.Thread(target=self._run, args=(self._queue,), name="event-sender", daemon=True)
+                    thread.start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def put(self, send_data: dict):
+        try:
+            self._get_queue().put_nowait(send_data)
+        except queue.Full:
+            with self._lock:
+                self.dropped_count += 1
+                self._unreported_drops += 1
+
+    def _run(self, event_queue: queue.Queue):
+        while True:
+            batch: List[dict] = [event_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(event_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send(batch)
+            finally:
+                for _ in batch:
+                    event_queue.task_done()
+
+    def _send(self, batch: List[dict]):
+        with self._lock:
+            dropped = self._unreported_drops
+            self._unreported_drops = 0
+        if dropped:
+            batch = batch + [
+                _event_data(
+                    "{} log messages were dropped because event queue was full".format(dropped), level="WARNING"
+                )
+            ]
+        try:
+            with redis_session() as redis:
+                pipe = redis.pipeline(transaction=False)
+                for send_data in batch:
+                    pipe.xadd("events", send_data, maxlen=api_settings.EVENTS_STREAM_MAXLEN, approximate=True)
+                pipe.execute()
+        except Exception as e:
+            print("Error in EventSender: {}".format(e))
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until all queued events have been sent.
+
+        Returns:
+            False if there were still unsent events after timeout
+        """
+        event_queue = self._queue
+        if event_queue is None or self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        with event_queue.all_tasks_done:
+            while event_queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                event_queue.all_tasks_done.wait(remaining)
+        return True
+
+
+event_sender = EventSender()
+atexit.register(event_sender.flush)
+
+
+def queue_event(
+    message: Optional[str] = None,
+    event_type: str = "log",
+    level: str = "INFO",
+    update_type: Optional[str] = None,
+    json_data: Optional[str] = None,
+    job_id: Optional[int] = None,
+):
+    """Like add_event, but the event is queued and sent from a background thread.
+
+    Args:
+        job_id: used for type "log", id of job that logged the message
+    """
+    event_sender.put(_event_data(message, event_type, level, update_type, json_data, job_id))
+
+
+def flush_events(timeout: float = 10.0) -> bool:
+    """Wait for queued events to be sent, returns False on timeout."""
+    return event_sender.flush(timeout)
@@ -1,18 +1,23 @@
 import logging
+from typing import Optional
 
 from flask import current_app
 
 from cnaas_nms.scheduler.thread_data import thread_data
-from cnaas_nms.tools.event import add_event
+from cnaas_nms.tools.event import queue_event
 
 
 class WebsocketHandler(logging.StreamHandler):
-    def __init__(self):
+    """Send log records to the events stream, without waiting for redis.
+    Use flush_events to wait for queued records to be sent."""
+
+    def __init__(self, job_id: Optional[int] = None):
         logging.StreamHandler.__init__(self)
+        self.job_id = job_id
 
     def emit(self, record):
         msg = self.format(record)
-        add_event(msg, level=record.levelname)
+        queue_event(msg, level=record.levelname, job_id=self.job_id)
 
 
 def get_logger():
@@ -27,7 +32,7 @@ def get_logger():
             handler.setFormatter(formatter)
             logger.addHandler(handler)
             # websocket logging
-            handler = WebsocketHandler()
+            handler = WebsocketHandler(job_id=thread_data.job_id)
             handler.setFormatter(formatter)
             logger.addHandler(handler)
     elif current_app:
@@ -0,0 +1,31 @@
+import os
+import stat
+from pathlib import Path
+from typing import Union
+
+from cnaas_nms.tools.log import get_logger
+
+
+def make_private_dir(path: Union[str, Path]) -> bool:
+    """Create a directory that only the current user can access, or check an existing one.
+
+    Cache directories hold data that is loaded with marshal or executed, so
+    they must not be writable by other users.
+
+    Returns:
+        True if path is a directory owned by the current user without
+        permissions for group or others, False otherwise
+    """
+    logger = get_logger()
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError as e:
+        logger.warning("Unable to create cache directory {}: {}".format(path, str(e)))
+        return False
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        logger.warning(
+            "Not using cache directory {}: must be a directory owned by uid {} with mode 0700".format(path, os.getuid())
+        )
+        return False
+    return True
@@ -0,0 +1,31 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the process pool used for CPU bound work like rendering templates
+    and computing settings, so that it does not compete for the GIL with
+    worker threads."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # forkserver avoids forking a process that has running threads
+            # and open database/redis connections
+            mp_context = multiprocessing.get_context("forkserver")
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp_context)
+        return _process_pool
+
+
+def reset_process_pool():
+    """Shut down the process pool, a new pool is started on next use."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
@@ -0,0 +1,63 @@
+import unittest
+
+import pytest
+
+from cnaas_nms.tools.cache import GenerationCounter, LocalLRUCache
+
+
+class LocalLRUCacheTests(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def requirements(self, redis):
+        """Ensures the required pytest fixtures are loaded implicitly for all these tests"""
+        pass
+
+    def setUp(self):
+        self.generation = GenerationCounter("test_generation", check_interval=0)
+        self.calls = 0
+
+    def cached_func(self, cache: LocalLRUCache):
+        @cache
+        def func(arg):
+            self.calls += 1
+            return {"arg": arg}
+
+        return func
+
+    @pytest.mark.integration
+    def test_cache_hit(self):
+        func = self.cached_func(LocalLRUCache(self.generation))
+        self.assertEqual(func("a"), {"arg": "a"})
+        self.assertEqual(func("a"), {"arg": "a"})
+        self.assertEqual(self.calls, 1)
+
+    @pytest.mark.integration
+    def test_returns_copy(self):
+        func = self.cached_func(LocalLRUCache(self.generation))
+        func("a").pop("arg")
+        func("a").pop("arg")
+        self.assertEqual(func("a"), {"arg": "a"})
+        self.assertEqual(self.calls, 1)
+
+    @pytest.mark.integration
+    def test_max_size(self):
+        func = self.cached_func(LocalLRUCache(self.generation, max_size=2))
+        func("a")
+        func("b")
+        func("a")
+        func("c")  # evicts b, the least recently used
+        func("a")
+        self.assertEqual(self.calls, 3)
+        func("b")
+        self.assertEqual(self.calls, 4)
+
+    @pytest.mark.integration
+    def test_generation_bump(self):
+        func = self.cached_func(LocalLRUCache(self.generation))
+        func("a")
+        GenerationCounter("test_generation").bump()
+        func("a")
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import stat
+import tempfile
+import unittest
+
+from cnaas_nms.tools.private_dir import make_private_dir
+
+
+class PrivateDirTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_create(self):
+        path = os.path.join(self.tmpdir.name, "cache", "templates")
+        self.assertTrue(make_private_dir(path))
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o700)
+        self.assertTrue(make_private_dir(path))
+
+    def test_reject_shared(self):
+        path = os.path.join(self.tmpdir.name, "shared")
+        os.mkdir(path)
+        os.chmod(path, 0o777)
+        self.assertFalse(make_private_dir(path))
+        link = os.path.join(self.tmpdir.name, "link")
+        os.mkdir(os.path.join(self.tmpdir.name, "target"), 0o700)
+        os.symlink(os.path.join(self.tmpdir.name, "target"), link)
+        self.assertFalse(make_private_dir(link))
+
+
+if __name__ == "__main__":
+    unittest.main()
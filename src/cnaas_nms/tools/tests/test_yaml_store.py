@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from cnaas_nms.app_settings import api_settings
+from cnaas_nms.tools.yaml_store import load_yaml_file
+
+
+class YamlStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.orig_cache_dir = api_settings.YAML_CACHE_DIR
+        api_settings.YAML_CACHE_DIR = os.path.join(self.tmpdir.name, "cache")
+        self.filename = os.path.join(self.tmpdir.name, "test.yml")
+
+    def tearDown(self):
+        api_settings.YAML_CACHE_DIR = self.orig_cache_dir
+        self.tmpdir.cleanup()
+
+    def write_file(self, content: str):
+        with open(self.filename, "w") as f:
+            f.write(content)
+
+    def test_load_and_modify(self):
+        self.write_file("ntp_servers:\n  - host: 10.0.0.1\n")
+        data = load_yaml_file(self.filename)
+        self.assertEqual(data, {"ntp_servers": [{"host": "10.0.0.1"}]})
+        data["ntp_servers"].clear()
+        # Modifying returned data should not affect the next read
+        self.assertEqual(load_yaml_file(self.filename), {"ntp_servers": [{"host": "10.0.0.1"}]})
+        self.assertEqual(len(os.listdir(api_settings.YAML_CACHE_DIR)), 1)
+
+    def test_shared_cache_dir(self):
+        os.mkdir(api_settings.YAML_CACHE_DIR)
+        os.chmod(api_settings.YAML_CACHE_DIR, 0o777)
+        self.write_file("vlan_id: 100\n")
+        self.assertEqual(load_yaml_file(self.filename), {"vlan_id": 100})
+        # Directory that others can write to is not used
+        self.assertEqual(os.listdir(api_settings.YAML_CACHE_DIR), [])
+
+    def test_changed_file(self):
+        self.write_file("vlan_id: 100\n")
+        self.assertEqual(load_yaml_file(self.filename), {"vlan_id": 100})
+        self.write_file("vlan_id: 200\nvlan_name: test\n")
+        self.assertEqual(load_yaml_file(self.filename), {"vlan_id": 200, "vlan_name": "test"})
+
+    def test_not_marshalable(self):
+        self.write_file("date: 2024-01-01\n")
+        data = load_yaml_file(self.filename)
+        self.assertEqual(str(data["date"]), "2024-01-01")
+        self.assertEqual(load_yaml_file(self.filename), data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""Store of parsed YAML documents keyed by file content hash.
+
+Parsed documents are serialized with marshal and saved in a directory on
+local disk that is shared by all processes (API workers and mule), so a
+file only has to be parsed once per content version. Reading a file that
+has not changed since the last read in the same process only costs a stat.
+The directory and the files in it are only used if they are owned by the
+current user and the directory is not accessible by others, since marshal
+data is not safe to load from untrusted sources.
+"""
+
+import copy
+import marshal
+import os
+import stat
+import tempfile
+import threading
+from hashlib import sha256
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import yaml
+
+from cnaas_nms.app_settings import api_settings
+from cnaas_nms.tools.log import get_logger
+from cnaas_nms.tools.private_dir import make_private_dir
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+class _Document(NamedTuple):
+    stat_key: Tuple[int, int, int]
+    digest: str
+    data: Any  # marshal serialized data, or parsed data if it's not serializable
+    marshaled: bool
+
+
+_documents: Dict[str, _Document] = {}
+_documents_lock = threading.Lock()
+# Result of the private directory check per cache directory
+_store_dirs: Dict[str, bool] = {}
+
+
+def _stat_key(filename: str) -> Tuple[int, int, int]:
+    stat = os.stat(filename)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _store_path(digest: str) -> str:
+    # marshal format can change between python versions
+    return os.path.join(api_settings.YAML_CACHE_DIR, "{}.{}.marshal".format(digest, marshal.version))
+
+
+def _store_usable() -> bool:
+    """Create cache directory if needed, and check that it's private to this user."""
+    directory = str(api_settings.YAML_CACHE_DIR)
+    usable = _store_dirs.get(directory)
+    if usable is None:
+        usable = make_private_dir(directory)
+        _store_dirs[directory] = usable
+    return usable
+
+
+def _read_store(digest: str) -> Optional[bytes]:
+    if not _store_usable():
+        return None
+    try:
+        fd = os.open(_store_path(digest), os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return None
+    with os.fdopen(fd, "rb") as f:
+        st = os.fstat(f.fileno())
+        if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid():
+            return None
+        try:
+            return f.read()
+        except OSError:
+            return None
+
+
+def _write_store(digest: str, serialized: bytes):
+    logger = get_logger()
+    if not _store_usable():
+        return
+    try:
+        # Write to temporary file and rename, so other processes never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=api_settings.YAML_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(serialized)
+        os.replace(tmp_path, _store_path(digest))
+    except OSError as e:
+        logger.debug("Could not save parsed YAML to {}: {}".format(api_settings.YAML_CACHE_DIR, e))
+
+
+def _load(document: _Document) -> Any:
+    if document.marshaled:
+        return marshal.loads(document.data)
+    else:
+        return copy.deepcopy(document.data)
+
+
+def load_yaml_file(filename: str) -> Any:
+    """Return parsed contents of a YAML file, like yaml.safe_load.
+
+    Every call returns a new copy of the parsed data, so it's safe to modify.
+
+    Raises:
+        OSError: File could not be read
+        yaml.YAMLError: File could not be parsed
+    """
+    filename = os.path.abspath(filename)
+    stat_key = _stat_key(filename)
+    with _documents_lock:
+        document = _documents.get(filename)
+    if document and document.stat_key == stat_key:
+        return _load(document)
+
+    with open(filename, "rb") as f:
+        content = f.read()
+    digest = sha256(content).hexdigest()
+    if document and document.digest == digest:
+        document = document._replace(stat_key=stat_key)
+    else:
+        serialized = _read_store(digest)
+        if serialized is not None:
+            document = _Document(stat_key, digest, serialized, True)
+        else:
+            data = yaml.load(content, Loader=SafeLoader)  # noqa: S506
+            try:
+                serialized = marshal.dumps(data)
+            except ValueError:
+                # Not serializable with marshal, for example dates
+                document = _Document(stat_key, digest, data, False)
+            else:
+                _write_store(digest, serialized)
+                document = _Document(stat_key, digest, serialized, True)
+    with _documents_lock:
+        _documents[filename] = document
+    return _load(document)